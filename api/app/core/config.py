@@ -4,7 +4,7 @@ import json
 import logging
 import os
 
-from pydantic import AnyHttpUrl, field_validator, PostgresDsn
+from pydantic import AnyHttpUrl, field_validator, model_validator, PostgresDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 logger = logging.getLogger(__name__)
@@ -68,6 +68,9 @@ class Settings(BaseSettings):
     # Security - generate a secure key if not provided
     SECRET_KEY: str = os.environ.get("SECRET_KEY", secrets.token_urlsafe(32) if os.environ.get("ENVIRONMENT") == "production" else "PLEASE_CHANGE_ME_IN_PRODUCTION_ENV")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    # Keyed HMAC pepper for the indexed invite code lookup column (falls back to SECRET_KEY).
+    # Must be stable across processes and restarts, or stored lookups stop matching.
+    INVITE_CODE_PEPPER: Optional[str] = os.environ.get("INVITE_CODE_PEPPER")
     
     # External API Keys
     OPENAI_API_KEY: Optional[str] = None
@@ -94,10 +97,31 @@ class Settings(BaseSettings):
     PINECONE_UPSERT_TIMEOUT: float = float(os.environ.get("PINECONE_UPSERT_TIMEOUT", "60.0"))  # 60 seconds default
     PINECONE_INDEX_STATS_TIMEOUT: float = float(os.environ.get("PINECONE_INDEX_STATS_TIMEOUT", "15.0"))  # 15 seconds default
     
+    # Maximum number of sources ingested at once by a batch ingestion request
+    INGEST_CONCURRENCY: int = int(os.environ.get("INGEST_CONCURRENCY", "4"))
+    
     # Query cache settings
     QUERY_CACHE_SIZE: int = int(os.environ.get("QUERY_CACHE_SIZE", "100"))  # 100 entries default
     QUERY_CACHE_TTL: int = int(os.environ.get("QUERY_CACHE_TTL", "300"))  # 5 minutes TTL default
     
+    # Gmail classification/summary cache settings
+    EMAIL_ANALYSIS_CACHE_SIZE: int = int(os.environ.get("EMAIL_ANALYSIS_CACHE_SIZE", "4096"))  # 4096 entries default
+    EMAIL_ANALYSIS_CACHE_TTL: int = int(os.environ.get("EMAIL_ANALYSIS_CACHE_TTL", "3600"))  # 1 hour TTL default
+    
+    # OCR result cache settings
+    OCR_CACHE_SIZE: int = int(os.environ.get("OCR_CACHE_SIZE", "256"))  # 256 documents default
+    OCR_CACHE_TTL: int = int(os.environ.get("OCR_CACHE_TTL", str(30 * 86400)))  # 30 days TTL default
+    
+    # Shortened text-embedding-3-large vectors (must match the Pinecone index dimension); unset keeps 3072
+    EMBEDDING_DIMENSIONS: Optional[int] = int(os.environ["EMBEDDING_DIMENSIONS"]) if os.environ.get("EMBEDDING_DIMENSIONS") else None
+    
+    # Optional on-disk cache of document embeddings keyed by chunk text, so re-ingesting
+    # the same content skips the OpenAI embedding calls
+    EMBEDDING_CACHE_DIR: Optional[str] = os.environ.get("EMBEDDING_CACHE_DIR")
+    
+    # Optional local Bloom filter of breached password hashes (built by scripts/build_hibp_bloom.py)
+    HIBP_BLOOM_PATH: Optional[str] = os.environ.get("HIBP_BLOOM_PATH")
+    
     # Chat memory settings
     MEMORY_WINDOW: int = int(os.environ.get("MEMORY_WINDOW", "20"))  # Increased from 10 to 20 for better conversation recall
     
@@ -148,5 +172,17 @@ class Settings(BaseSettings):
              logger.warning("Security Risk: SECRET_KEY is using the default placeholder. Set a strong secret key in .env or environment variables.")
         return v
 
+    @model_validator(mode='after')
+    def check_invite_code_pepper_production(self):
+        # In production an unset SECRET_KEY is a fresh random value per process, which
+        # would make invite code lookups minted elsewhere (other workers, the
+        # create_invite script, before a restart) never match
+        secret_key_configured = 'SECRET_KEY' in self.model_fields_set or 'SECRET_KEY' in os.environ
+        if self.ENVIRONMENT.lower() == 'production' and not self.INVITE_CODE_PEPPER and not secret_key_configured:
+            msg = "CRITICAL: Neither INVITE_CODE_PEPPER nor SECRET_KEY is set for production environment! Set one of them in .env or environment variables."
+            logger.error(msg)
+            raise ValueError(msg)
+        return self
+
 # Initialize settings
 settings = Settings() 
\ No newline at end of file
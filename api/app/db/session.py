@@ -1,5 +1,4 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from fastapi import Request
 from ..core.config import settings
 import os
@@ -44,6 +43,20 @@ max_overflow = int(os.environ.get("DB_MAX_OVERFLOW", "10" if is_production else
 pool_timeout = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
 pool_recycle = int(os.environ.get("DB_POOL_RECYCLE", "1800"))  # 30 minutes
 
+# Server-side prepared statements for hot queries (chat memory, auth lookups).
+# psycopg prepares a query after it has run this many times on a connection;
+# asyncpg keeps this many prepared statements per connection. Set to 0 to disable,
+# e.g. behind a transaction-pooling PgBouncer.
+prepare_threshold = int(os.environ.get("DB_PREPARE_THRESHOLD", "2"))
+statement_cache_size = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "100"))
+
+if DATABASE_URL.startswith("postgresql+asyncpg://"):
+    connect_args = {"prepared_statement_cache_size": statement_cache_size}
+elif DATABASE_URL.startswith("postgresql+psycopg://"):
+    connect_args = {"prepare_threshold": prepare_threshold or None}
+else:
+    connect_args = {}
+
 # Configure connection pool for better performance 
 engine = create_async_engine(
     DATABASE_URL, 
@@ -53,10 +66,11 @@ engine = create_async_engine(
     pool_timeout=pool_timeout,  # Seconds to wait before timing out on getting a connection from the pool
     pool_recycle=pool_recycle,  # Recycle connections after 30 minutes
     pool_pre_ping=True,  # Enable connection health checks
+    connect_args=connect_args,
 )
 
 # Create session factory
-async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+async_session = async_sessionmaker(engine, expire_on_commit=False)
 
 def get_db_connection_string() -> str:
     """
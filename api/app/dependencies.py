@@ -3,10 +3,13 @@ API dependency injection module.
 Contains singletons and dependency functions for FastAPI dependency injection.
 """
 from .services.cosmos_connector import CosmosConnector
+from .core.config import settings
 import logging
 from typing import Optional, AsyncGenerator
 from langchain_pinecone import Pinecone
 from langchain_openai import OpenAIEmbeddings
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
 import os
 from functools import lru_cache
 
@@ -30,7 +33,17 @@ def get_embeddings_singleton():
                 return None
                 
             logger.info("Initializing OpenAI Embeddings singleton")
-            _embeddings_instance = OpenAIEmbeddings(model="text-embedding-3-large")
+            embeddings = OpenAIEmbeddings(model="text-embedding-3-large", dimensions=settings.EMBEDDING_DIMENSIONS)
+            if settings.EMBEDDING_CACHE_DIR:
+                # Only document embeddings are cached; queries still go to OpenAI
+                logger.info(f"Caching document embeddings in {settings.EMBEDDING_CACHE_DIR}")
+                embeddings = CacheBackedEmbeddings.from_bytes_store(
+                    embeddings,
+                    LocalFileStore(settings.EMBEDDING_CACHE_DIR),
+                    # LocalFileStore keys only allow [a-zA-Z0-9_.-/], so no ':' separators
+                    namespace=f"{embeddings.model}_{settings.EMBEDDING_DIMENSIONS or 'full'}_"
+                )
+            _embeddings_instance = embeddings
             logger.info("OpenAI Embeddings singleton initialized successfully")
         except Exception as e:
             logger.exception(f"Failed to initialize OpenAI Embeddings: {e}")
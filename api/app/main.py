@@ -19,6 +19,7 @@ from .dependencies import get_vector_store_singleton, get_embeddings_singleton
 from .db.session import init_models, engine
 from .workers.cleanup import run_cleanup
 from .utils.memory import ChatMemoryManager
+from .services.user_service import close_hibp_session
 
 # Set up logging
 logging.basicConfig(
@@ -117,6 +118,10 @@ async def shutdown_event():
     scheduler.shutdown()
     logger.info("Background scheduler shut down")
     
+    # Close shared outbound HTTP sessions
+    await close_hibp_session()
+    logger.info("HIBP client session closed")
+    
     # Close database connection pool
     if engine:
         logger.info("Closing database connection pool")
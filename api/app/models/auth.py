@@ -1,9 +1,11 @@
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, JSON, Text, ARRAY, TIMESTAMP, func
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, JSON, Text, ARRAY, TIMESTAMP, Index, func, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import expression
 import datetime
 from datetime import timezone
 import secrets
+import hmac
+import hashlib
 from passlib.hash import pbkdf2_sha256
 
 Base = declarative_base()
@@ -17,6 +19,7 @@ class InviteCode(Base):
     
     id = Column(Integer, primary_key=True)
     code_hash = Column(Text, nullable=False)
+    code_lookup = Column(String(64), nullable=True, index=True)
     email = Column(String, nullable=True, index=True)
     created_by = Column(String, nullable=True)
     created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
@@ -24,6 +27,15 @@ class InviteCode(Base):
     is_active = Column(Boolean, server_default=expression.true(), nullable=False)
     redemption_count = Column(Integer, server_default='0', nullable=False)
     
+    # Partial index over live codes only; the cleanup job deactivates expired ones
+    __table_args__ = (
+        Index(
+            "ix_invite_codes_active_email_lookup",
+            "email", "code_lookup",
+            postgresql_where=text("is_active = true"),
+        ),
+    )
+    
     @classmethod
     def generate(cls, email=None, expires_days=30, max_redemptions=None):
         """Generate a new invite code with secure hashing"""
@@ -36,12 +48,24 @@ class InviteCode(Base):
         
         expires_at = get_utc_now() + datetime.timedelta(days=expires_days) if expires_days else None
         
+        # Store emails normalized so lookups can compare against the plain indexed column
+        if email:
+            email = email.strip().lower()
+        
         return cls(
             code_hash=code_hash,
+            code_lookup=cls.compute_lookup(plain_code),
             email=email,
             expires_at=expires_at
         ), plain_code
     
+    @classmethod
+    def compute_lookup(cls, code):
+        """Keyed, non-reversible digest of a code used for indexed lookups"""
+        from ..core.config import settings
+        pepper = settings.INVITE_CODE_PEPPER or settings.SECRET_KEY
+        return hmac.new(pepper.encode(), code.encode(), hashlib.sha256).hexdigest()
+    
     @classmethod
     def verify_code(cls, code, hashed_code):
         """Verify a code against its hash"""
@@ -22,6 +22,11 @@ class URLRequest(BaseModel):
     chunk_size: int = Field(512, description="The size of each text chunk")
     chunk_overlap: int = Field(50, description="The overlap between adjacent chunks")
 
+class URLBatchRequest(BaseModel):
+    urls: List[str] = Field(..., min_length=1, max_length=20, description="Web page and/or YouTube URLs to process")
+    chunk_size: int = Field(512, description="The size of each text chunk")
+    chunk_overlap: int = Field(50, description="The overlap between adjacent chunks")
+
 # Timing info model
 class TimingInfo(BaseModel):
     chain_init: float = Field(..., description="Time taken to initialize the chain (seconds)")
@@ -49,6 +54,12 @@ class URLProcessResponse(ProcessDocumentResponse):
     # document_id will typically be the URL itself
     pass
 
+class URLBatchItemResponse(ProcessDocumentResponse):
+    url: str = Field(..., description="The URL this result is for")
+
+class URLBatchResponse(BaseModel):
+    results: List[URLBatchItemResponse] = Field(..., description="Per-URL results, in request order")
+
 # Add response model for image processing
 class ImageProcessResponse(ProcessDocumentResponse):
     # Inherits fields from ProcessDocumentResponse
@@ -1,6 +1,7 @@
 from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Text, TIMESTAMP, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import expression
+from sqlalchemy.orm import relationship
 from passlib.hash import pbkdf2_sha256
 from .auth import Base, get_utc_now
 from typing import Optional
@@ -22,6 +23,7 @@ class User(Base):
     
     # Relationship to invite code
     invite_code_id = Column(Integer, ForeignKey("invite_codes.id"), nullable=True)
+    invite_code = relationship("InviteCode")
     
     @classmethod
     def create_user(cls, email: str, password: str, display_name: Optional[str] = None, terms_accepted: bool = False) -> "User":
@@ -35,7 +37,7 @@ class User(Base):
         access_key = str(uuid.uuid4())
         
         return cls(
-            email=email.lower(),
+            email=email.strip().lower(),
             display_name=display_name,
             access_key=access_key,
             password_hash=password_hash,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..db.session import get_db
 from ..models.auth import InviteCode, Session
@@ -82,6 +82,7 @@ class InviteCodeListResponse(BaseModel):
 @router.post("/invite-codes", response_model=InviteCodeResponse)
 async def create_invite_code(
     data: InviteCodeCreate,
+    background_tasks: BackgroundTasks,
     _: bool = Depends(admin_required),
     db: AsyncSession = Depends(get_db)
 ):
@@ -119,24 +120,20 @@ async def create_invite_code(
         # Send email if email address is provided
         if data.email:
             try:
-                from ..services.email_service import send_invite_code_email
-                from ..email_templates.invite_code_email import calculate_days_remaining, format_date
+                from ..services.email_service import deliver_invite_code_email
                 
-                # Calculate values for the template
-                days_remaining = calculate_days_remaining(invite_obj.expires_at)
-                formatted_expiry = format_date(invite_obj.expires_at)
-
-                # Send the email using Resend SDK
-                await send_invite_code_email(
+                # Send the email using Resend SDK after the response has been returned
+                background_tasks.add_task(
+                    deliver_invite_code_email,
                     to_email=data.email,
                     invite_code=plain_code,
                     expires_at=invite_obj.expires_at,
                     redemption_count=invite_obj.redemption_count
                 )
                 
-                logger.info(f"Invite code email sent to {data.email}")
+                logger.info(f"Invite code email queued for {data.email}")
             except Exception as e:
-                logger.error(f"Failed to send invite code email: {str(e)}")
+                logger.error(f"Failed to queue invite code email: {str(e)}")
                 # Continue even if email sending fails
         
         # Return the plain code in the response - this is the only time it's available
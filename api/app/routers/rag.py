@@ -2,12 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, s
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.concurrency import run_in_threadpool
 from typing import Optional, Dict, List, Any
+import asyncio
 import logging
 from concurrent.futures import ThreadPoolExecutor
 import uuid
-import psycopg
 from langchain.schema.messages import SystemMessage
-from langchain_postgres import PostgresChatMessageHistory
 
 from ..models.rag import (
     QueryRequest,
@@ -16,15 +15,16 @@ from ..models.rag import (
     ProcessDocumentResponse,
     URLRequest,
     URLProcessResponse,
+    URLBatchRequest,
+    URLBatchResponse,
     SourceInfoResponse,
     ImageProcessResponse,
 )
 from ..services.cosmos_connector import CosmosConnector
 from ..dependencies import get_cosmos_connector, get_vector_store_singleton
-from ..utils.timeout import run_with_timeout
 from ..core.config import settings
 from ..utils.memory import ChatMemoryManager
-from ..db.session import get_db, get_db_connection_string
+from ..db.session import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
@@ -56,29 +56,13 @@ async def query_documents(
             if session_id:
                 try:
                     # Use a special SystemMessage to mark this in chat history
-                    connection_string = get_db_connection_string()
-                    connection = psycopg.connect(connection_string)
-                    
-                    # Create a proper SystemMessage instead of a dictionary
                     system_message = SystemMessage(
                         content=request.query,
                         additional_kwargs={"is_topic_reset": True}
                     )
                     
-                    # Initialize the history object
-                    history = PostgresChatMessageHistory(
-                        "chat_message_history",
-                        session_id,
-                        sync_connection=connection
-                    )
-                    
-                    # Add directly to history
-                    history.add_message(system_message)
+                    await ChatMemoryManager.store_messages(session_id, [system_message])
                     logger.info(f"Stored system message in chat history for session: {session_id}")
-                    
-                    # Close connection
-                    if connection:
-                        connection.close()
                 except Exception as e:
                     logger.error(f"Error storing system message: {str(e)}")
             
@@ -432,6 +416,41 @@ async def process_url(
             detail=f"An unexpected error occurred processing URL: {str(e)}"
         )
 
+@router.post("/urls", response_model=URLBatchResponse)
+async def process_urls(
+    request: URLBatchRequest,
+    vector_store = Depends(get_vector_store_singleton),
+    cosmos: CosmosConnector = Depends(get_cosmos_connector)
+) -> Dict[str, Any]:
+    """
+    Process and store several web pages and/or YouTube videos in one request.
+    Sources are ingested concurrently; each one's success or failure is reported separately.
+    """
+    try:
+        # Check if vector store is available
+        if vector_store is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Vector store connection not available. Please check your configuration."
+            )
+
+        results = await cosmos.ingest_sources(
+            vector_store=vector_store,
+            urls=request.urls,
+            chunk_size=request.chunk_size,
+            chunk_overlap=request.chunk_overlap
+        )
+        return {"results": results}
+    except HTTPException as he:
+        # Re-raise HTTPExceptions directly
+        raise he
+    except Exception as e:
+        logger.exception(f"API Error during /urls processing: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected error occurred processing URLs: {str(e)}"
+        )
+
 @router.get("/sources", response_model=SourceInfoResponse)
 async def get_source_info(
     vector_store = Depends(get_vector_store_singleton),
@@ -498,10 +517,9 @@ async def health_check(
     if vector_store:
         try:
             # Check if we can access Pinecone stats with timeout
-            index_stats = await run_with_timeout(
-                run_in_threadpool,
-                settings.PINECONE_INDEX_STATS_TIMEOUT,
-                vector_store.client.describe_index_stats
+            index_stats = await asyncio.wait_for(
+                run_in_threadpool(vector_store.client.describe_index_stats),
+                timeout=settings.PINECONE_INDEX_STATS_TIMEOUT
             )
             # Add count to health
             result["vector_count"] = index_stats.get('total_vector_count', 0)
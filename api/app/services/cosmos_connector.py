@@ -1,24 +1,125 @@
 import sys
 from pathlib import Path
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, List
 import importlib.util
 import logging
 import importlib
 import io
 import asyncio
 import hashlib
+import time
+import threading
 import json
 import base64
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from fastapi import HTTPException, status
 from fastapi.concurrency import run_in_threadpool
 from mistralai import Mistral, SDKError
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception
 from ..core.config import settings
-from ..utils.timeout import run_with_timeout
 from googleapiclient.errors import HttpError as GoogleHttpError
 
 logger = logging.getLogger(__name__)
 
+MISTRAL_OCR_MODEL = "mistral-ocr-latest"
+MISTRAL_OCR_ENDPOINT = "https://api.mistral.ai/v1/ocr"
+
+# Pooled HTTP session for the Mistral REST fallback so repeat calls reuse TLS connections
+_mistral_http_session = requests.Session()
+_mistral_http_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+
+class CircuitBreaker:
+    """Minimal thread-safe circuit breaker for an upstream dependency.
+
+    Trips open after ``fail_max`` consecutive failures and fails fast until
+    ``reset_timeout`` seconds have passed, then lets a single trial call
+    through (half-open) to decide whether to close again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name: str, fail_max: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._fail_count = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _set_state(self, new_state: str):
+        if new_state != self._state:
+            logger.warning(f"Circuit breaker '{self.name}' state change: {self._state} -> {new_state}")
+            self._state = new_state
+
+    def allow_request(self) -> bool:
+        """Return False while the breaker is open and the cool-down has not elapsed"""
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(self.HALF_OPEN)
+                return True
+            if self._state == self.HALF_OPEN:
+                # Only one trial call at a time while half-open
+                return False
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._fail_count = 0
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._fail_count += 1
+            if self._state == self.HALF_OPEN or self._fail_count >= self.fail_max:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "state": self._state, "consecutive_failures": self._fail_count}
+
+
+mistral_breaker = CircuitBreaker("mistral_ocr", fail_max=5, reset_timeout=30)
+
+
+def _is_transient_mistral_error(exc: BaseException) -> bool:
+    """Retry only on connection drops, rate limits and upstream 5xx responses"""
+    if isinstance(exc, requests.exceptions.ConnectionError) and not isinstance(exc, requests.exceptions.Timeout):
+        return True
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=1, max=16),
+    retry=retry_if_exception(_is_transient_mistral_error),
+    reraise=True,
+)
+def _post_mistral_ocr(headers: Dict[str, str], payload: Dict[str, Any]) -> requests.Response:
+    """POST to the Mistral OCR REST endpoint with bounded, jittered retries"""
+    # orjson serializes the multi-MB base64 document far faster than the stdlib encoder
+    response = _mistral_http_session.post(
+        MISTRAL_OCR_ENDPOINT,
+        headers=headers,
+        data=orjson.dumps(payload),
+        timeout=60  # Use a reasonable timeout
+    )
+    response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
+    return response
+
 # Simple in-memory cache for query results with TTL
 class QueryCache:
     def __init__(self, max_size=100, ttl_seconds=300):
@@ -93,6 +194,44 @@ class QueryCache:
         self.access_times.clear()
         logger.info("Query cache cleared")
 
+# Simple in-memory cache for content-addressed results (email analysis, OCR) with TTL
+class ContentCache:
+    def __init__(self, max_size=4096, ttl_seconds=3600):
+        self.cache = {}
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+    def _generate_key(self, operation, *content_parts):
+        """Generate a key from the operation name and a digest of the content"""
+        digest = hashlib.blake2b("\x00".join(content_parts).encode(), digest_size=16).hexdigest()
+        return f"{operation}:{digest}"
+
+    def get(self, operation, *content_parts):
+        """Retrieve a cached result or None if not found/expired"""
+        key = self._generate_key(operation, *content_parts)
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+
+        entry_time, result = entry
+        if time.time() - entry_time > self.ttl_seconds:
+            self.cache.pop(key, None)
+            return None
+
+        logger.info(f"Content cache hit for operation: {operation}")
+        return result
+
+    def set(self, operation, result, *content_parts):
+        """Store a result in the cache"""
+        key = self._generate_key(operation, *content_parts)
+        self.cache[key] = (time.time(), result)
+
+        # Entries are inserted in time order, so drop the oldest 10% when full
+        if len(self.cache) > self.max_size:
+            entries_to_remove = max(1, int(len(self.cache) * 0.1))
+            for old_key in list(self.cache)[:entries_to_remove]:
+                del self.cache[old_key]
+
 class CosmosConnector:
     """
     Service to connect the API with the underlying COSMOS functionality.
@@ -119,7 +258,19 @@ class CosmosConnector:
             max_size=settings.QUERY_CACHE_SIZE if hasattr(settings, 'QUERY_CACHE_SIZE') else 100,
             ttl_seconds=settings.QUERY_CACHE_TTL if hasattr(settings, 'QUERY_CACHE_TTL') else 300
         )
+
+        # Initialize Gmail classification/summary cache (message bodies are immutable)
+        self.email_analysis_cache = ContentCache(
+            max_size=getattr(settings, 'EMAIL_ANALYSIS_CACHE_SIZE', 4096),
+            ttl_seconds=getattr(settings, 'EMAIL_ANALYSIS_CACHE_TTL', 3600)
+        )
         
+        # Initialize OCR result cache (keyed by document hash, so entries never go stale)
+        self.ocr_cache = ContentCache(
+            max_size=getattr(settings, 'OCR_CACHE_SIZE', 256),
+            ttl_seconds=getattr(settings, 'OCR_CACHE_TTL', 30 * 86400)
+        )
+
         # Import Gmail agent if available
         try:
             self.gmail_logic = self._import_module("core.agents.gmail_logic")
@@ -201,11 +352,9 @@ class CosmosConnector:
             # Run synchronous retriever.invoke in threadpool with timeout
             try:
                 # Apply timeout to the Pinecone query operation
-                relevant_docs = await run_with_timeout(
-                    run_in_threadpool,
-                    settings.PINECONE_QUERY_TIMEOUT,
-                    retriever.invoke, 
-                    query
+                relevant_docs = await asyncio.wait_for(
+                    run_in_threadpool(retriever.invoke, query),
+                    timeout=settings.PINECONE_QUERY_TIMEOUT
                 )
                 retrieval_time = time.time() - retrieval_start
                 logger.info(f"Retrieved {len(relevant_docs)} documents in {retrieval_time:.2f}s")
@@ -388,11 +537,9 @@ class CosmosConnector:
             # Run synchronous retriever.invoke in threadpool with timeout
             try:
                 # Apply timeout to the Pinecone query operation
-                relevant_docs = await run_with_timeout(
-                    run_in_threadpool,
-                    settings.PINECONE_QUERY_TIMEOUT,
-                    retriever.invoke, 
-                    query
+                relevant_docs = await asyncio.wait_for(
+                    run_in_threadpool(retriever.invoke, query),
+                    timeout=settings.PINECONE_QUERY_TIMEOUT
                 )
                 retrieval_time = time.time() - retrieval_start
                 logger.info(f"Retrieved {len(relevant_docs)} documents in {retrieval_time:.2f}s")
@@ -488,6 +635,14 @@ class CosmosConnector:
             logger.exception(f"Error during stream_query_documents: {e}")
             yield f"I'm sorry, but an error occurred while processing your query: {str(e)}"
     
+    async def _stored_chunk_count(self, vector_store, source_id: str) -> int:
+        """Chunks already stored for source_id; 0 if none or the lookup fails (ingest then proceeds)."""
+        try:
+            return await run_in_threadpool(self.vector_store.get_source_chunk_count, vector_store, source_id)
+        except Exception as e:
+            logger.warning(f"Error checking for existing source {source_id}: {e}")
+            return 0
+
     async def process_document(self, vector_store, content: bytes, filename: str, chunk_size: int, 
                               chunk_overlap: int) -> Dict[str, Any]:
         """Process and store a document in the vector database"""
@@ -503,20 +658,34 @@ class CosmosConnector:
 
             # Extract based on filename extension
             lower_filename = filename.lower()
+            if not lower_filename.endswith((".pdf", ".txt", ".md")):
+                 # Add other file types (e.g., .docx, .pptx) if needed in core.data_extraction
+                 return {"success": False, "message": f"Unsupported file type: {filename}"}
+
+            # The content hash is the source ID, so re-uploads can be skipped before any
+            # extraction, chunking or embedding work
+            content_hash = await run_in_threadpool(lambda: hashlib.sha256(content).hexdigest())
+            existing_chunks = await self._stored_chunk_count(vector_store, content_hash)
+            if existing_chunks > 0:
+                logger.info(f"Document {filename} ({content_hash}) already exists with {existing_chunks} chunks")
+                return {
+                    "success": True,
+                    "document_id": content_hash,
+                    "chunk_count": existing_chunks,
+                    "message": "Document already processed. Skipping."
+                }
+
             if lower_filename.endswith(".pdf"):
                 # Handle PDF
                 text, doc_id = await run_in_threadpool(self.data_extraction.extract_text_from_pdf, io.BytesIO(content))
                 source_type = "pdf"
-            elif lower_filename.endswith((".txt", ".md")):
+            else:
                  try:
                      text = content.decode('utf-8') # Simple text decode
                  except UnicodeDecodeError:
                      text = content.decode('latin-1', errors='ignore') # Fallback encoding
-                 doc_id = self.data_extraction.hash_generator.compute_sha256(content) # Use hash as ID
+                 doc_id = content_hash # Use hash as ID
                  source_type = "text"
-            # Add other file types (e.g., .docx, .pptx) if needed in core.data_extraction
-            else:
-                 return {"success": False, "message": f"Unsupported file type: {filename}"}
             
             if not text or (isinstance(text, str) and text.startswith("Error")):
                 error_message = text if (isinstance(text, str) and text.startswith("Error")) else "Failed to extract text"
@@ -540,12 +709,9 @@ class CosmosConnector:
             # Use the provided vector_store with timeout
             try:
                 # Apply timeout to the Pinecone upsert operation
-                await run_with_timeout(
-                    run_in_threadpool, 
-                    settings.PINECONE_UPSERT_TIMEOUT,
-                    vector_store.add_documents, 
-                    chunks, 
-                    ids=chunk_ids
+                await asyncio.wait_for(
+                    self.vector_store.add_chunks_to_vector_store_async(vector_store, chunks, chunk_ids),
+                    timeout=settings.PINECONE_UPSERT_TIMEOUT
                 )
                 logger.info(f"Successfully added {len(chunks)} chunks to vector store")
             except asyncio.TimeoutError:
@@ -572,42 +738,26 @@ class CosmosConnector:
                 return {"success": False, "message": "Error: Vector store is not available."}
                 
             # Extract video_id first to check if it's already processed
-            video_id = None
-            if "v=" in url:
-                video_id = url.split("v=")[1].split("&")[0]
-            elif "youtu.be/" in url:
-                video_id = url.split("youtu.be/")[1].split("?")[0]
+            video_id = self.data_extraction.extract_video_id(url)
             
             if not video_id:
                 return {"success": False, "message": "Invalid YouTube URL format."}
                 
-            # Create the search filter to check for existing video
             youtube_source_id = f"youtube_{video_id}"
-            filter_query = {"source_id": youtube_source_id}
             
-            # Use retriever to check if any documents exist for this video
-            retriever = vector_store.as_retriever(
-                search_type="similarity",
-                search_kwargs={"filter": filter_query, "k": 1}  # Just need to check if any exist
-            )
-            
-            # Check if video already exists in database
-            try:
-                existing_docs = await run_in_threadpool(retriever.invoke, "test query")
-                if existing_docs and len(existing_docs) > 0:
-                    logger.info(f"Video {video_id} already exists in the database with {len(existing_docs)} chunks")
-                    return {
-                        "success": True,
-                        "video_id": youtube_source_id,
-                        "chunk_count": len(existing_docs),
-                        "message": "Video already processed. Skipping."
-                    }
-            except Exception as e:
-                # If there's an error checking, log it but continue processing
-                logger.warning(f"Error checking for existing video {video_id}: {e}")
+            # Check if video already exists in database (ID lookup, no query embedding)
+            existing_chunks = await self._stored_chunk_count(vector_store, youtube_source_id)
+            if existing_chunks > 0:
+                logger.info(f"Video {video_id} already exists in the database with {existing_chunks} chunks")
+                return {
+                    "success": True,
+                    "video_id": youtube_source_id,
+                    "chunk_count": existing_chunks,
+                    "message": "Video already processed. Skipping."
+                }
                 
             # Extract transcript
-            transcript, video_id = await run_in_threadpool(self.data_extraction.extract_transcript_details, url)
+            transcript, video_id = await self.data_extraction.extract_transcript_details_async(url)
             
             if not transcript or transcript.startswith("Error"):
                 return {"success": False, "message": transcript}
@@ -625,7 +775,7 @@ class CosmosConnector:
                 return {"success": False, "message": "YouTube processing resulted in no chunks."}
 
             # Add the chunks to the vector store
-            await run_in_threadpool(vector_store.add_documents, chunks, ids=chunk_ids)
+            await self.vector_store.add_chunks_to_vector_store_async(vector_store, chunks, chunk_ids)
             
             return {
                 "success": True,
@@ -638,13 +788,20 @@ class CosmosConnector:
     
     # --- Gmail Agent Functions ---
     
+    def _invalidate_gmail_service(self) -> None:
+        """Drop gmail_logic's cached service so the next call re-reads the token."""
+        if self.has_gmail:
+            self.gmail_logic.reset_gmail_service()
+
     async def _get_gmail_service_wrapper(self) -> Optional[Any]:
         """Internal helper to get the Gmail service using threadpool."""
         if not self.has_gmail:
             logger.error("Attempted to get Gmail service, but module is not loaded.")
             return None
+        
         try:
             # get_gmail_service handles caching, token loading/refreshing internally
+            # (including the locked early refresh), so there is no second cache here
             service = await run_in_threadpool(self.gmail_logic.get_gmail_service)
             if not service:
                  logger.warning("get_gmail_service returned None. Authentication might be required.")
@@ -687,6 +844,7 @@ class CosmosConnector:
             success = await run_in_threadpool(self.gmail_logic.handle_oauth_callback, code)
             
             if success:
+                self._invalidate_gmail_service()
                 logger.info("Gmail OAuth callback handled successfully by core logic.")
                 return {"success": True, "message": "Gmail authentication successful."}
             else:
@@ -717,6 +875,7 @@ class CosmosConnector:
             detail = f"Google API error: {e.resp.status} - {e.reason}"
             status_code = status.HTTP_502_BAD_GATEWAY # Error from upstream service
             if e.resp.status == 401:
+                 self._invalidate_gmail_service()
                  status_code = status.HTTP_401_UNAUTHORIZED
                  detail = "Gmail authentication error. Please re-authenticate."
             elif e.resp.status == 403:
@@ -749,6 +908,7 @@ class CosmosConnector:
             detail = f"Google API error: {e.resp.status} - {e.reason}"
             status_code = status.HTTP_502_BAD_GATEWAY
             if e.resp.status == 401:
+                 self._invalidate_gmail_service()
                  status_code = status.HTTP_401_UNAUTHORIZED
                  detail = "Gmail authentication error. Please re-authenticate."
             elif e.resp.status == 403:
@@ -779,17 +939,18 @@ class CosmosConnector:
             # Return neutral result for empty content
             return {"success": True, "classification": "Unknown (empty content)"}
         
+        cached_classification = self.email_analysis_cache.get("classify", email_subject, email_body)
+        if cached_classification:
+            return {"success": True, "classification": cached_classification}
+        
         try:
-            # Call OpenAI API via core logic in threadpool
-            classification = await run_in_threadpool(
-                self.gmail_logic.classify_email, 
-                email_body, 
-                email_subject
-            )
+            # Call OpenAI API via the core logic's shared async client
+            classification = await self.gmail_logic.classify_email_async(email_body, email_subject)
             if classification.startswith("Error:"):
                  logger.error(f"Core logic failed to classify email {email_id}: {classification}")
                  raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=classification)
                  
+            self.email_analysis_cache.set("classify", classification, email_subject, email_body)
             return {"success": True, "classification": classification}
         except ValueError as e: # Catch config errors from core logic (e.g., API key)
              logger.error(f"Configuration error during email classification: {e}")
@@ -815,12 +976,16 @@ class CosmosConnector:
             logger.warning(f"[Email ID: {email_id}] Email body is too short ({len(email_body)} chars) to summarize meaningfully.")
             return {"success": True, "summary": "(Email content too short to summarize)"}
             
+        cached_summary = self.email_analysis_cache.get("summarize", email_body)
+        if cached_summary:
+            return {"success": True, "summary": cached_summary}
+            
         try:
             # Log the exact body being sent to the core summarization function
             logger.info(f"[Email ID: {email_id}] Sending body to core summarization (length: {len(email_body)}): '{email_body[:200]}...'")
             
-            # Call OpenAI API via core logic in threadpool
-            summary = await run_in_threadpool(self.gmail_logic.summarize_email, email_body)
+            # Call OpenAI API via the core logic's shared async client
+            summary = await self.gmail_logic.summarize_email_async(email_body)
             
             # Log the exact summary received from the core function
             logger.info(f"[Email ID: {email_id}] Received summary from core logic (length: {len(summary)}): '{summary}'")
@@ -829,6 +994,7 @@ class CosmosConnector:
                  logger.error(f"[Email ID: {email_id}] Core logic failed to summarize email: {summary}")
                  raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=summary)
                  
+            self.email_analysis_cache.set("summarize", summary, email_body)
             return {"success": True, "summary": summary}
         except ValueError as e:
              logger.error(f"Configuration error during email summarization: {e}")
@@ -849,10 +1015,9 @@ class CosmosConnector:
         sender_name = sender_header.split('<')[0].strip() if '<' in sender_header else sender_header.strip()
 
         try:
-            # Call OpenAI API via core logic in threadpool
-            reply_text = await run_in_threadpool(
-                self.gmail_logic.generate_reply,
-                email_body, email_subject, sender_name, 
+            # Call OpenAI API via the core logic's shared async client
+            reply_text = await self.gmail_logic.generate_reply_async(
+                email_body, email_subject, sender_name,
                 tone, style, length, context
             )
             if reply_text.startswith("Error:"):
@@ -922,6 +1087,7 @@ class CosmosConnector:
             detail = f"Google API error: {e.resp.status} - {e.reason}"
             status_code = status.HTTP_502_BAD_GATEWAY
             if e.resp.status == 401:
+                 self._invalidate_gmail_service()
                  status_code = status.HTTP_401_UNAUTHORIZED
                  detail = "Gmail authentication error. Please re-authenticate."
             elif e.resp.status == 403:
@@ -964,6 +1130,7 @@ class CosmosConnector:
             detail = f"Google API error: {e.resp.status} - {e.reason}"
             status_code = status.HTTP_502_BAD_GATEWAY
             if e.resp.status == 401:
+                 self._invalidate_gmail_service()
                  status_code = status.HTTP_401_UNAUTHORIZED
                  detail = "Gmail authentication error. Please re-authenticate."
             elif e.resp.status == 403:
@@ -981,6 +1148,26 @@ class CosmosConnector:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error marking email as read: {str(e)}")
 
     # Add after process_document method
+    async def ingest_sources(self, vector_store, urls: List[str], chunk_size: int,
+                             chunk_overlap: int) -> List[Dict[str, Any]]:
+        """
+        Ingest several web pages and/or YouTube videos concurrently.
+        Each source runs its own extract -> chunk -> upsert pipeline; at most
+        INGEST_CONCURRENCY run at once. Results are returned in input order.
+        """
+        semaphore = asyncio.Semaphore(settings.INGEST_CONCURRENCY)
+
+        async def _ingest(url: str) -> Dict[str, Any]:
+            async with semaphore:
+                if "youtube.com/" in url or "youtu.be/" in url:
+                    result = await self.process_youtube(vector_store, url, chunk_size, chunk_overlap)
+                    result.setdefault("document_id", result.get("video_id"))
+                else:
+                    result = await self.process_url(vector_store, url, chunk_size, chunk_overlap)
+                return {"url": url, **result}
+
+        return await asyncio.gather(*(_ingest(url) for url in urls))
+
     async def process_url(self, vector_store, url: str, chunk_size: int, 
                          chunk_overlap: int) -> Dict[str, Any]:
         """Process and store content from a URL in the vector database"""
@@ -990,8 +1177,19 @@ class CosmosConnector:
                 logger.error("Vector store is not available.")
                 return {"success": False, "message": "Error: Vector store is not available."}
                 
+            # The URL is the source ID; skip the fetch entirely if it's already stored
+            existing_chunks = await self._stored_chunk_count(vector_store, url)
+            if existing_chunks > 0:
+                logger.info(f"URL {url} already exists in the database with {existing_chunks} chunks")
+                return {
+                    "success": True,
+                    "document_id": url,
+                    "chunk_count": existing_chunks,
+                    "message": "URL already processed. Skipping."
+                }
+
             # Extract text from URL
-            text, url_id = await run_in_threadpool(self.data_extraction.extract_text_from_url, url)
+            text, url_id = await self.data_extraction.extract_text_from_url_async(url)
             
             if not text or text.startswith("Error"):
                 return {"success": False, "message": text}
@@ -1010,7 +1208,7 @@ class CosmosConnector:
                 return {"success": False, "message": "URL processing resulted in no chunks."}
 
             # Use the provided vector_store
-            await run_in_threadpool(vector_store.add_documents, chunks, ids=chunk_ids) # Pass chunk_ids
+            await self.vector_store.add_chunks_to_vector_store_async(vector_store, chunks, chunk_ids)
             
             return {
                 "success": True,
@@ -1021,6 +1219,30 @@ class CosmosConnector:
             logger.exception(f"Error in process_url for {url}: {e}")
             return {"success": False, "message": str(e)}
     
+    def _compute_content_hash(self, content: bytes) -> str:
+        """SHA-256 of raw document bytes, used as the stable document ID"""
+        if self.use_cpp_hash:
+            # Use C++ implementation for hashing if available
+            try:
+                return self.hash_generator_cpp.compute_sha256(content)
+            except Exception as e:
+                logger.error(f"Error using C++ hash generator: {e}")
+        # Use Python implementation
+        return hashlib.sha256(content).hexdigest()
+    
+    async def _ocr_with_cache(self, content: bytes, content_type: str, doc_id: str) -> str:
+        """Run Mistral OCR in the threadpool, reusing cached text for identical documents"""
+        extracted_text = self.ocr_cache.get("ocr", str(doc_id), content_type, MISTRAL_OCR_MODEL)
+        if not extracted_text:
+            extracted_text = await run_in_threadpool(
+                self._process_with_mistral_ocr,
+                content,
+                content_type
+            )
+            if extracted_text and not extracted_text.startswith("Error"):
+                self.ocr_cache.set("ocr", extracted_text, str(doc_id), content_type, MISTRAL_OCR_MODEL)
+        return extracted_text
+    
     async def process_image(self, vector_store, content: bytes, filename: str, content_type: str,
                           chunk_size: int, chunk_overlap: int) -> Dict[str, Any]:
         """Process and store an image in the vector database using Mistral OCR"""
@@ -1030,28 +1252,15 @@ class CosmosConnector:
                 logger.error("Vector store is not available.")
                 return {"success": False, "message": "Error: Vector store is not available."}
             
-            # Generate a hash for the image content to use as the document ID
-            doc_id = None
-            if self.use_cpp_hash:
-                # Use C++ implementation for hashing if available
-                try:
-                    doc_id = self.hash_generator_cpp.compute_sha256(content)
-                except Exception as e:
-                    logger.error(f"Error using C++ hash generator: {e}")
-                    doc_id = hashlib.sha256(content).hexdigest()
-            else:
-                # Use Python implementation
-                doc_id = hashlib.sha256(content).hexdigest()
+            # Generate a hash for the image content to use as the document ID.
+            # Hashing a large upload is CPU-bound, so keep it off the event loop.
+            doc_id = await run_in_threadpool(self._compute_content_hash, content)
             
             source_type = "image"
             logger.info(f"Processing {filename} of type {content_type}")
             
-            # Process the image with Mistral OCR
-            extracted_text = await run_in_threadpool(
-                self._process_with_mistral_ocr,
-                content,
-                content_type
-            )
+            # Process the image with Mistral OCR, reusing the result for identical uploads
+            extracted_text = await self._ocr_with_cache(content, content_type, doc_id)
             
             # Better error handling for OCR results
             if not extracted_text:
@@ -1096,12 +1305,9 @@ class CosmosConnector:
             # Use the provided vector_store with timeout
             try:
                 # Apply timeout to the vector store upsert operation
-                await run_with_timeout(
-                    run_in_threadpool, 
-                    settings.PINECONE_UPSERT_TIMEOUT,
-                    vector_store.add_documents, 
-                    chunks, 
-                    ids=chunk_ids
+                await asyncio.wait_for(
+                    self.vector_store.add_chunks_to_vector_store_async(vector_store, chunks, chunk_ids),
+                    timeout=settings.PINECONE_UPSERT_TIMEOUT
                 )
                 logger.info(f"Successfully added {len(chunks)} chunks to vector store from image")
             except asyncio.TimeoutError:
@@ -1120,12 +1326,19 @@ class CosmosConnector:
     
     def _process_with_mistral_ocr(self, document_content: bytes, content_type: str) -> str:
         """Process an image or PDF with Mistral OCR using the mistralai SDK"""
+        # Built once and shared with the REST fallback; base64 of a large PDF is costly
+        document_payload = None
         try:
             # Check if API key is configured
             if not settings.MISTRAL_API_KEY:
                 logger.error("Mistral API key is not configured")
                 return "Error: Mistral API key is not configured. Please set MISTRAL_API_KEY in your environment."
             
+            # Fail fast while Mistral is known to be down instead of tying up a worker on timeouts
+            if not mistral_breaker.allow_request():
+                logger.warning(f"Mistral OCR circuit breaker is {mistral_breaker.state}; skipping OCR call")
+                return "Error: OCR service temporarily unavailable. Please try again shortly."
+            
             # Initialize Mistral client
             client = Mistral(api_key=settings.MISTRAL_API_KEY)
             
@@ -1150,13 +1363,13 @@ class CosmosConnector:
             # Note: The SDK itself might handle retries/timeouts internally, 
             # but we add a general exception handling layer.
             ocr_response = client.ocr.process(
-                model="mistral-ocr-latest",
+                model=MISTRAL_OCR_MODEL,
                 document=document_payload,
                 # include_image_base64=False # Default is False, we only need text
             )
             
             # Combine markdown text from all pages
-            full_markdown_text = "\n\n".join([page.markdown for page in ocr_response.pages])
+            full_markdown_text = "\n\n".join(page.markdown for page in ocr_response.pages)
             
             if not full_markdown_text or not full_markdown_text.strip():
                 logger.warning(f"SDK OCR processing returned empty text for content type {content_type}. Will attempt REST fallback.")
@@ -1164,6 +1377,7 @@ class CosmosConnector:
             else:
                 # Only return success if text was actually extracted
                 logger.info(f"SDK: Successfully extracted {len(full_markdown_text)} characters via OCR.")
+                mistral_breaker.record_success()
                 return full_markdown_text # Success using SDK
             
         except SDKError as e:
@@ -1178,9 +1392,6 @@ class CosmosConnector:
         # --- Attempt 2: Use REST API with requests as fallback ---    
         logger.warning("SDK processing failed. Attempting Mistral OCR processing using REST API fallback...")
         try:
-            # Encode the document content as base64 (might be redundant, but safe)
-            encoded_content = base64.b64encode(document_content).decode('utf-8')
-            
             headers = {
                 "Authorization": f"Bearer {settings.MISTRAL_API_KEY}",
                 "Content-Type": "application/json",
@@ -1188,38 +1399,32 @@ class CosmosConnector:
             }
             
             # Use the /v1/ocr endpoint for the fallback, as used by the SDK
-            endpoint_url = "https://api.mistral.ai/v1/ocr"
-            
-            # Determine document type for the API call
-            doc_type_param = "document_url" if content_type == "application/pdf" else "image_url"
-            data_uri = f"data:{content_type};base64,{encoded_content}"
-            document_payload = {
-                "type": doc_type_param,
-                doc_type_param: data_uri
-            }
+            endpoint_url = MISTRAL_OCR_ENDPOINT
+            
+            # Reuse the SDK attempt's encoded document unless it failed before building it
+            if document_payload is None:
+                doc_type_param = "document_url" if content_type == "application/pdf" else "image_url"
+                encoded_content = base64.b64encode(document_content).decode('ascii')
+                document_payload = {
+                    "type": doc_type_param,
+                    doc_type_param: f"data:{content_type};base64,{encoded_content}"
+                }
             
             payload = {
-                "model": "mistral-ocr-latest",
+                "model": MISTRAL_OCR_MODEL,
                 "document": document_payload
             }
             
             logger.info(f"Calling Mistral OCR REST endpoint: {endpoint_url}")
             
-            # Make the API request using requests
-            response = requests.post(
-                endpoint_url,
-                headers=headers,
-                json=payload,
-                timeout=60  # Use a reasonable timeout
-            )
-            
-            # Check response status
-            response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
+            # Make the API request; transient 429/5xx/connection errors are retried with backoff
+            response = _post_mistral_ocr(headers, payload)
+            mistral_breaker.record_success()
             
-            result = response.json()
+            result = orjson.loads(response.content)
             
             # Combine markdown text from all pages (assuming same structure as SDK)
-            full_markdown_text = "\n\n".join([page["markdown"] for page in result.get("pages", [])])
+            full_markdown_text = "\n\n".join(page["markdown"] for page in result.get("pages", ()))
             
             if not full_markdown_text or not full_markdown_text.strip():
                 logger.error(f"REST fallback OCR processing returned empty text for content type {content_type}. The document might be empty or unreadable.")
@@ -1229,17 +1434,24 @@ class CosmosConnector:
             return full_markdown_text # Success using REST fallback
             
         except requests.exceptions.Timeout:
+            mistral_breaker.record_failure()
             logger.error("Mistral OCR REST API request timed out")
             return "Error: OCR processing (fallback) timed out."
         except requests.exceptions.ConnectionError as e:
+            mistral_breaker.record_failure()
             logger.error(f"Mistral OCR REST API connection error: {e}")
             return "Error: OCR processing (fallback) failed: Could not connect to the OCR service."
         except requests.exceptions.HTTPError as e:
              # Handle HTTP errors from raise_for_status()
              status_code = e.response.status_code
+             if status_code == 429 or status_code >= 500:
+                 mistral_breaker.record_failure()
+             else:
+                 # Client errors mean the service is reachable; don't trip the breaker on bad input
+                 mistral_breaker.record_success()
              try: # Try to get JSON error detail
-                 error_detail = e.response.json().get("message", e.response.text)
-             except ValueError:
+                 error_detail = orjson.loads(e.response.content).get("message", e.response.text)
+             except (ValueError, AttributeError):
                  error_detail = e.response.text
              error_message = f"HTTP error {status_code}: {error_detail}"
              logger.error(f"Mistral OCR REST API error: {error_message}")
@@ -1251,5 +1463,6 @@ class CosmosConnector:
                  return f"Error: OCR processing (fallback) failed: {error_message}"
         except Exception as e:
             # Catch any other unexpected errors during fallback
+            mistral_breaker.record_failure()
             logger.exception(f"Unexpected error during Mistral OCR REST fallback processing: {e}")
             return f"Error: An unexpected error occurred during OCR processing (fallback): {str(e)}"
\ No newline at end of file
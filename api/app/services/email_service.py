@@ -1,5 +1,7 @@
 import logging
 import resend
+from fastapi.concurrency import run_in_threadpool
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_result
 from ..core.config import settings
 from ..email_templates.invite_code_email import get_invite_code_email_html, get_invite_code_email_text
 
@@ -54,6 +56,59 @@ def send_email_with_resend(to_email, subject, html_content=None, text_content=No
         logger.exception(f"Failed to send email: {str(e)}")
         return {"error": str(e)}
 
+def _build_invite_code_email(to_email, invite_code, expires_at, redemption_count=0):
+    """Build the subject, HTML and plain text bodies for an invite code email"""
+    subject = "Your COSMOS Invitation Code"
+    html_content = get_invite_code_email_html(
+        invite_code=invite_code,
+        email=to_email,
+        expires_at=expires_at,
+        redemption_count=redemption_count
+    )
+    text_content = get_invite_code_email_text(
+        invite_code=invite_code,
+        email=to_email,
+        expires_at=expires_at,
+        redemption_count=redemption_count
+    )
+    return subject, html_content, text_content
+
+def _is_retryable_send_error(response):
+    """Retry failed sends, except when Resend is not configured at all"""
+    return isinstance(response, dict) and "error" in response and bool(settings.RESEND_API_KEY)
+
+@retry(
+    stop=stop_after_attempt(4),
+    wait=wait_random_exponential(multiplier=1, max=30),
+    retry=retry_if_result(_is_retryable_send_error),
+    retry_error_callback=lambda retry_state: retry_state.outcome.result()
+)
+def deliver_invite_code_email(to_email, invite_code, expires_at, redemption_count=0):
+    """
+    Send an invite code email, retrying transient failures with jittered exponential backoff.
+    
+    This is a blocking call intended to run off the request path, e.g. as a
+    FastAPI background task, so the HTTP response does not wait on Resend.
+    
+    Args:
+        to_email: Recipient email address
+        invite_code: The invite code
+        expires_at: Expiry date of the invite code
+        redemption_count: Current number of redemptions (default: 0)
+    
+    Returns:
+        dict: Response from Resend API (from the last attempt)
+    """
+    subject, html_content, text_content = _build_invite_code_email(
+        to_email, invite_code, expires_at, redemption_count
+    )
+    return send_email_with_resend(
+        to_email=to_email,
+        subject=subject,
+        html_content=html_content,
+        text_content=text_content
+    )
+
 async def send_invite_code_email(to_email, invite_code, expires_at, redemption_count=0):
     """
     Send an email with invite code details
@@ -68,22 +123,13 @@ async def send_invite_code_email(to_email, invite_code, expires_at, redemption_c
         dict: Response from Resend API
     """
     # Get email content
-    subject = "Your COSMOS Invitation Code"
-    html_content = get_invite_code_email_html(
-        invite_code=invite_code,
-        email=to_email,
-        expires_at=expires_at,
-        redemption_count=redemption_count
-    )
-    text_content = get_invite_code_email_text(
-        invite_code=invite_code,
-        email=to_email,
-        expires_at=expires_at,
-        redemption_count=redemption_count
+    subject, html_content, text_content = _build_invite_code_email(
+        to_email, invite_code, expires_at, redemption_count
     )
     
-    # Send the email
-    return send_email_with_resend(
+    # The Resend SDK is synchronous; run it in the threadpool so the event loop isn't blocked
+    return await run_in_threadpool(
+        send_email_with_resend,
         to_email=to_email,
         subject=subject,
         html_content=html_content,
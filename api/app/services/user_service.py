@@ -1,15 +1,61 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from ..models.user import User
 from ..models.auth import InviteCode, get_utc_now
 from typing import Optional, Tuple
 import logging
 import hashlib
+import asyncio
 import aiohttp
 from ..utils.input_validator import InputValidator
+from ..utils.bloom_filter import BloomFilter
+from ..core.config import settings
 
 logger = logging.getLogger(__name__)
 
+HIBP_RANGE_URL = "https://api.pwnedpasswords.com/range/"
+
+# Shared HTTP session for the HIBP API so TLS connections are reused between checks
+_hibp_session: Optional[aiohttp.ClientSession] = None
+
+# Local Bloom filter of breached SHA-1 hashes; False once loading has failed or is disabled
+_hibp_bloom = None
+
+def get_hibp_bloom() -> Optional[BloomFilter]:
+    """Load the HIBP Bloom filter configured by HIBP_BLOOM_PATH on first use."""
+    global _hibp_bloom
+    if _hibp_bloom is None:
+        _hibp_bloom = False
+        if settings.HIBP_BLOOM_PATH:
+            try:
+                _hibp_bloom = BloomFilter.load(settings.HIBP_BLOOM_PATH)
+                logger.info(f"Loaded HIBP Bloom filter from {settings.HIBP_BLOOM_PATH}")
+                if not _hibp_bloom.complete:
+                    logger.warning("HIBP Bloom filter holds only part of the corpus; every check still uses the API")
+            except Exception as e:
+                logger.error(f"Could not load HIBP Bloom filter, using the API for every check: {str(e)}")
+    return _hibp_bloom or None
+
+def get_hibp_session() -> aiohttp.ClientSession:
+    """Return the process-wide HIBP client session, creating it on first use."""
+    global _hibp_session
+    if _hibp_session is None or _hibp_session.closed:
+        _hibp_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=50, ttl_dns_cache=300, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=5),
+            headers={"User-Agent": "COSMOS-Auth-Service"}
+        )
+    return _hibp_session
+
+async def close_hibp_session() -> None:
+    """Close the shared HIBP client session (called on application shutdown)."""
+    global _hibp_session
+    if _hibp_session is not None and not _hibp_session.closed:
+        await _hibp_session.close()
+    _hibp_session = None
+
 class UserService:
     """Service for user-related operations."""
     
@@ -55,25 +101,32 @@ class UserService:
                 logger.warning(f"Invalid invite code format in registration attempt for email: {email}")
                 return None, "invalid_invite"
             
-            # Next, check if email already exists
-            email_check = await self.get_user_by_email(email)
-            if email_check:
-                logger.warning(f"Attempt to create user with existing email: {email}")
-                return None, "email_exists"
-            
-            # Check if terms were accepted
-            if not terms_accepted:
-                logger.warning(f"Attempt to create user without accepting terms: {email}")
-                return None, "terms_not_accepted"
-            
-            # Next, validate the invite code
-            invite = await self._validate_invite_code(invite_code, email)
-            if not invite:
-                logger.warning(f"Invalid invite code used in registration attempt for email: {email}")
-                return None, "invalid_invite"
+            # Start the HIBP lookup now so it overlaps the DB checks below (it doesn't touch
+            # the DB session); a rejection before its result is needed cancels it
+            hibp_check = asyncio.create_task(self.check_password_compromised(password))
+            try:
+                # Next, check if email already exists
+                email_check = await self.get_user_by_email(email)
+                if email_check:
+                    logger.warning(f"Attempt to create user with existing email: {email}")
+                    return None, "email_exists"
+                
+                # Check if terms were accepted
+                if not terms_accepted:
+                    logger.warning(f"Attempt to create user without accepting terms: {email}")
+                    return None, "terms_not_accepted"
+                
+                # Next, validate the invite code
+                invite = await self._validate_invite_code(invite_code, email)
+                if not invite:
+                    logger.warning(f"Invalid invite code used in registration attempt for email: {email}")
+                    return None, "invalid_invite"
+                
+                is_compromised = await hibp_check
+            finally:
+                hibp_check.cancel()  # No-op once the check has finished
             
-            # Check if password has been compromised
-            is_compromised = await self.check_password_compromised(password)
+            # Reject passwords found in the HIBP breach corpus
             if is_compromised:
                 logger.warning(f"Compromised password detected during registration for email: {email}")
                 return None, "compromised_password"
@@ -101,8 +154,8 @@ class UserService:
             logger.error(f"Error creating user: {str(e)}")
             return None, "system_error"
     
-    async def get_user_by_email(self, email: str) -> Optional[User]:
-        """Get a user by their email address."""
+    async def get_user_by_email(self, email: str, with_invite: bool = False) -> Optional[User]:
+        """Get a user by their email address, optionally joining their invite code."""
         try:
             # Validate email format first
             is_valid, _ = InputValidator.validate_email(email)
@@ -117,6 +170,8 @@ class UserService:
                     User.is_active == True
                 )
             )
+            if with_invite:
+                stmt = stmt.options(joinedload(User.invite_code))
             result = await self.db.execute(stmt)
             return result.scalars().first()
         except Exception as e:
@@ -152,8 +207,8 @@ class UserService:
             logger.warning(f"Invalid email format in authentication attempt: {email}")
             return None
             
-        # Get user securely with parameterized query
-        user = await self.get_user_by_email(email)
+        # Get user and their invite code in one parameterized query
+        user = await self.get_user_by_email(email, with_invite=True)
         
         if not user:
             logger.debug(f"Authentication attempt for non-existent user: {email}")
@@ -166,10 +221,7 @@ class UserService:
         # Check if the invite code used to create this account is still valid
         if user.invite_code_id:
             try:
-                # Query the invite code
-                stmt = select(InviteCode).where(InviteCode.id == user.invite_code_id)
-                result = await self.db.execute(stmt)
-                invite_code = result.scalars().first()
+                invite_code = user.invite_code
                 
                 # Check if the invite code is still active and not expired
                 if invite_code and (not invite_code.is_active or 
@@ -180,9 +232,17 @@ class UserService:
                 # Log the error but don't block the login - this is a secondary check
                 logger.error(f"Error checking invite code validity: {str(e)}")
         
-        # Update last login time
-        user.last_login = get_utc_now()
+        # Update last login time with a targeted UPDATE instead of flushing the ORM object
+        login_time = get_utc_now()
+        await self.db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(last_login=login_time)
+            .execution_options(synchronize_session=False)
+        )
         await self.db.commit()
+        # Reflect the new value on the loaded instance without marking it dirty
+        set_committed_value(user, "last_login", login_time)
         
         logger.info(f"User authenticated successfully: {email}")
         return user
@@ -231,25 +291,34 @@ class UserService:
             logger.warning(f"Invalid email format in invite code validation: {email}")
             return None
             
-        # Find all active, non-expired codes for this email
-        stmt = select(InviteCode).where(
-            and_(
-                InviteCode.is_active == True,
-                InviteCode.email == email.lower(),
-                or_(
-                    InviteCode.expires_at == None,
-                    InviteCode.expires_at > get_utc_now()
-                )
+        active_filter = and_(
+            InviteCode.is_active == True,
+            InviteCode.email == email.lower(),
+            or_(
+                InviteCode.expires_at == None,
+                InviteCode.expires_at > get_utc_now()
             )
         )
         
         try:
+            # Indexed lookup by the keyed digest, then verify only the matching row
+            stmt = select(InviteCode).where(
+                and_(active_filter, InviteCode.code_lookup == InviteCode.compute_lookup(code))
+            )
             result = await self.db.execute(stmt)
-            invite_codes = result.scalars().all()
+            invite_code = result.scalars().first()
+            if invite_code and InviteCode.verify_code(code, invite_code.code_hash):
+                return invite_code
             
-            # Check each code (since codes are hashed)
-            for invite_code in invite_codes:
+            # Codes created before code_lookup existed, or whose lookup was computed under
+            # a different pepper, can only be matched by hash. Invite emails are unique,
+            # so this verifies at most a handful of rows.
+            stmt = select(InviteCode).where(active_filter)
+            result = await self.db.execute(stmt)
+            for invite_code in result.scalars().all():
                 if InviteCode.verify_code(code, invite_code.code_hash):
+                    if invite_code.code_lookup is not None:
+                        logger.warning(f"Invite code {invite_code.id} matched by hash but not by lookup; check INVITE_CODE_PEPPER is the same everywhere")
                     return invite_code
             
             return None
@@ -261,36 +330,41 @@ class UserService:
         """
         Check if a password has been compromised using the HIBP API.
         Only the first 5 characters of the SHA-1 hash are sent to the API.
+        A local Bloom filter, if configured and built from the whole corpus, skips the API
+        for its misses; its hits are always confirmed by the API, since they may be false positives.
         
         Returns:
             bool: True if the password has been compromised, False otherwise
         """
         try:
             # Generate SHA-1 hash of the password
-            password_hash = hashlib.sha1(password.encode('utf-8')).hexdigest().upper()
+            password_digest = hashlib.sha1(password.encode('utf-8')).digest()
+            password_hash = password_digest.hex().upper()
+            
+            bloom = get_hibp_bloom()
+            # Built from the whole corpus, a miss is a definite "not breached"; a hit may be
+            # a false positive, so it falls through to the API like every other case
+            if bloom is not None and bloom.complete and password_digest not in bloom:
+                return False
             
             # Split the hash into prefix and suffix
             prefix = password_hash[:5]
             suffix = password_hash[5:]
             
             # Query the HIBP API with only the prefix
-            url = f"https://api.pwnedpasswords.com/range/{prefix}"
+            url = f"{HIBP_RANGE_URL}{prefix}"
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    url, 
-                    headers={"User-Agent": "COSMOS-Auth-Service"}
-                ) as response:
-                    if response.status != 200:
-                        logger.error(f"HIBP API error: HTTP {response.status}")
-                        return False  # Fail open - don't block registration if the API is down
-                    
-                    # Check if our suffix is in the response
-                    data = await response.text()
-                    for line in data.splitlines():
-                        # Each line is in format: HASH_SUFFIX:COUNT
-                        if line.split(':')[0] == suffix:
-                            return True  # Password has been compromised
+            async with get_hibp_session().get(url) as response:
+                if response.status != 200:
+                    logger.error(f"HIBP API error: HTTP {response.status}")
+                    return False  # Fail open - don't block registration if the API is down
+                
+                # Each line is in format: HASH_SUFFIX:COUNT, so a single substring
+                # search for "\nSUFFIX:" finds our suffix without splitting every line
+                data = await response.read()
+                needle = f"\n{suffix}:".encode('ascii')
+                if needle in b"\n" + data:
+                    return True  # Password has been compromised
             
             return False  # Password not found in HIBP database
             
@@ -0,0 +1,77 @@
+import math
+import mmap
+import struct
+from typing import Union
+
+# File layout: magic, bit count (m), hash count (k), flags, then the raw bit array.
+# CBF1 files predate the flags field and are read as having none set.
+_MAGIC = b"CBF2"
+_MAGIC_V1 = b"CBF1"
+_HEADER = struct.Struct("<4sQII")
+_HEADER_V1 = struct.Struct("<4sQI")
+
+# Set when every hash of the source corpus was added, so a miss means "not breached"
+FLAG_COMPLETE = 1
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter keyed on SHA-1 digests.
+
+    The keys are already uniformly distributed hashes, so the k bit positions
+    are derived from the digest bytes with double hashing instead of rehashing.
+    Saved filters are memory-mapped read-only on load so several workers share
+    the same pages. `complete` records whether the filter holds the whole corpus
+    (only then is a miss meaningful) or just a subset such as the top-N hashes.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: Union[bytearray, mmap.mmap, None] = None, offset: int = 0,
+                 complete: bool = False):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.complete = complete
+        self._offset = offset
+        self._bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float = 0.001) -> "BloomFilter":
+        """Size a new filter for the expected number of items and false positive rate"""
+        num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, digest: bytes):
+        for pos in self._positions(digest):
+            self._bits[self._offset + (pos >> 3)] |= 1 << (pos & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits, offset = self._bits, self._offset
+        return all(bits[offset + (pos >> 3)] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            flags = FLAG_COMPLETE if self.complete else 0
+            f.write(_HEADER.pack(_MAGIC, self.num_bits, self.num_hashes, flags))
+            f.write(self._bits)
+
+    @classmethod
+    def load(cls, path: str) -> "BloomFilter":
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = mapped[:4]
+        if magic == _MAGIC:
+            _, num_bits, num_hashes, flags = _HEADER.unpack_from(mapped, 0)
+            offset = _HEADER.size
+        elif magic == _MAGIC_V1:
+            _, num_bits, num_hashes = _HEADER_V1.unpack_from(mapped, 0)
+            flags, offset = 0, _HEADER_V1.size
+        else:
+            mapped.close()
+            raise ValueError(f"Not a bloom filter file: {path}")
+        return cls(num_bits, num_hashes, bits=mapped, offset=offset, complete=bool(flags & FLAG_COMPLETE))
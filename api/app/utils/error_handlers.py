@@ -4,6 +4,52 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Field-name substrings checked in order; the first match wins
+FIELD_ORDER = ("password", "email", "display_name", "invite_code", "terms_accepted")
+
+# Per-field {pydantic v2 error type: message} maps plus the fallback message.
+# Pydantic reports exact error codes, so a dict lookup replaces substring scans.
+_EMAIL_FORMAT = "Please enter a valid email address."
+_DISPLAY_NAME_FORMAT = "Display name can only contain letters, numbers, spaces, and underscores."
+
+FIELD_MESSAGES = {
+    "password": (
+        {
+            "value_error": "Your password must be at least 8 characters and include both letters and numbers.",
+            "string_too_short": "Your password is too short. It must be at least 8 characters.",
+            "missing": "Please enter your password.",
+        },
+        "Your password doesn't meet our security requirements.",
+    ),
+    "email": (
+        {
+            "value_error": _EMAIL_FORMAT,
+            "string_pattern_mismatch": _EMAIL_FORMAT,
+            "missing": "Please enter your email address.",
+        },
+        "There's an issue with your email address.",
+    ),
+    "display_name": (
+        {
+            "value_error": _DISPLAY_NAME_FORMAT,
+            "string_pattern_mismatch": _DISPLAY_NAME_FORMAT,
+            "string_too_short": "Display name is too short. It must be at least 3 characters.",
+            "string_too_long": "Display name is too long. It must be at most 50 characters.",
+        },
+        "There's an issue with your display name.",
+    ),
+    "invite_code": (
+        {"missing": "Please enter an invite code."},
+        "This invite code is invalid.",
+    ),
+    "terms_accepted": (
+        {},
+        "You must accept the terms and conditions to continue.",
+    ),
+}
+
+LOGIN_PASSWORD_MESSAGE = "Please enter your password."
+
 def format_validation_error(error: Union[ValidationError, ValueError]) -> Dict[str, Any]:
     """
     Formats Pydantic validation errors into user-friendly messages.
@@ -38,51 +84,19 @@ def format_validation_error(error: Union[ValidationError, ValueError]) -> Dict[s
                 field = loc[0] if loc else "unknown"
                 error_type = err.get("type", "")
                 
-                # Map different error types to user-friendly messages
-                if "password" in str(field).lower():
-                    # Check if this is coming from a login form context
-                    if is_login_form:
-                        # For login form errors, don't suggest format requirements
-                        field_errors[field] = "Please enter your password."
-                    elif "value_error" in error_type:
-                        field_errors[field] = "Your password must be at least 8 characters and include both letters and numbers."
-                    elif "string_too_short" in error_type:
-                        field_errors[field] = "Your password is too short. It must be at least 8 characters."
-                    elif "missing" in error_type:
-                        field_errors[field] = "Please enter your password."
-                    else:
-                        field_errors[field] = "Your password doesn't meet our security requirements."
-                
-                elif "email" in str(field).lower():
-                    if "value_error" in error_type or "pattern" in error_type:
-                        field_errors[field] = "Please enter a valid email address."
-                    elif "missing" in error_type:
-                        field_errors[field] = "Please enter your email address."
-                    else:
-                        field_errors[field] = "There's an issue with your email address."
+                field_lower = str(field).lower()
+                matched = next((key for key in FIELD_ORDER if key in field_lower), None)
                 
-                elif "display_name" in str(field).lower():
-                    if "value_error" in error_type or "pattern" in error_type:
-                        field_errors[field] = "Display name can only contain letters, numbers, spaces, and underscores."
-                    elif "string_too_short" in error_type:
-                        field_errors[field] = "Display name is too short. It must be at least 3 characters."
-                    elif "string_too_long" in error_type:
-                        field_errors[field] = "Display name is too long. It must be at most 50 characters."
-                    else:
-                        field_errors[field] = "There's an issue with your display name."
-                
-                elif "invite_code" in str(field).lower():
-                    if "missing" in error_type:
-                        field_errors[field] = "Please enter an invite code."
-                    else:
-                        field_errors[field] = "This invite code is invalid."
-                
-                elif "terms_accepted" in str(field).lower():
-                    field_errors[field] = "You must accept the terms and conditions to continue."
-                
-                else:
+                if matched is None:
                     # Default message for other fields
                     field_errors[field] = err.get("msg", "Invalid input")
+                elif matched == "password" and is_login_form:
+                    # For login form errors, don't suggest format requirements
+                    field_errors[field] = LOGIN_PASSWORD_MESSAGE
+                else:
+                    # Map different error types to user-friendly messages
+                    messages, default = FIELD_MESSAGES[matched]
+                    field_errors[field] = messages.get(error_type, default)
             
             # Log the original error for debugging
             logger.debug(f"Transformed validation error into field errors: {list(field_errors.keys())}")
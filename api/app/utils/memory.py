@@ -3,24 +3,115 @@ import logging
 import json
 import uuid
 import traceback
+from sqlalchemy import Boolean, bindparam, column, insert, table, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from langchain_postgres import PostgresChatMessageHistory
-import psycopg
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, messages_from_dict, message_to_dict
 
 # Get memory window from config
 from ..core.config import settings
-from ..db.session import get_db_connection_string
+from ..db.session import engine, async_session
 
 logger = logging.getLogger(__name__)
 
+# Settings are loaded once at startup, so resolve the window size once too
+_MEMORY_WINDOW: int = int(getattr(settings, "MEMORY_WINDOW", 25))
+
+# Newest messages first, with the session's total message count on every row.
+# The count is a separate scalar subquery (answerable from the session_id index)
+# rather than count(*) OVER (), which would buffer every row of the session.
+# Only the newest :window rows carry the full message; older rows just project
+# their type so pair extraction never transfers or parses payloads it discards.
+RECENT_MESSAGES_QUERY = text("""
+    SELECT id,
+           message->>'type' AS mtype,
+           (SELECT count(*) FROM chat_message_history WHERE session_id = :session_id) AS total,
+           CASE WHEN row_number() OVER (ORDER BY id DESC) <= :window THEN message END AS message
+    FROM chat_message_history
+    WHERE session_id = :session_id
+    ORDER BY id DESC
+    LIMIT :limit
+""")
+
+# Full payloads for the older human/AI pairs picked from the type-only rows
+MESSAGES_BY_ID_QUERY = text("""
+    SELECT message
+    FROM chat_message_history
+    WHERE session_id = :session_id AND id IN :ids
+    ORDER BY id
+""").bindparams(bindparam("ids", expanding=True))
+
+# Most recent topic reset marker; served by the partial index on is_topic_reset
+LAST_RESET_QUERY = text("""
+    SELECT id
+    FROM chat_message_history
+    WHERE session_id = :session_id AND is_topic_reset
+    ORDER BY id DESC
+    LIMIT 1
+""")
+
+# Newest messages after a given message id
+MESSAGES_AFTER_QUERY = text("""
+    SELECT message
+    FROM chat_message_history
+    WHERE session_id = :session_id AND id > :after_id
+    ORDER BY id DESC
+    LIMIT :limit
+""")
+
+# Lightweight table construct so inserts compile to a single multi-row VALUES statement
+chat_message_history_table = table(
+    "chat_message_history",
+    column("session_id"),
+    column("message", JSONB),
+    column("is_topic_reset", Boolean),
+)
+
+# Same schema PostgresChatMessageHistory.create_tables uses, plus the reset marker column
+# and a (session_id, id DESC) index in place of the plain session_id one
+CREATE_TABLE_STATEMENTS = (
+    text("""
+        CREATE TABLE IF NOT EXISTS chat_message_history (
+            id SERIAL PRIMARY KEY,
+            session_id UUID NOT NULL,
+            message JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """),
+    text(
+        "CREATE INDEX IF NOT EXISTS idx_chat_message_history_session_id_id "
+        "ON chat_message_history (session_id, id DESC)"
+    ),
+    text("ALTER TABLE chat_message_history ADD COLUMN IF NOT EXISTS is_topic_reset BOOLEAN NOT NULL DEFAULT FALSE"),
+    text(
+        "CREATE INDEX IF NOT EXISTS idx_chat_message_history_topic_reset "
+        "ON chat_message_history (session_id, id) WHERE is_topic_reset"
+    ),
+)
+
+
+def _load_message(value: Any) -> dict:
+    """JSONB arrives as a dict from psycopg but as a string from asyncpg"""
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _is_topic_reset(message: BaseMessage) -> bool:
+    """System messages flagged as, or mentioning, a topic reset start a new context segment"""
+    if message.type != "system":
+        return False
+    if message.additional_kwargs.get("is_topic_reset", False):
+        return True
+    return isinstance(message.content, str) and "reset" in message.content.lower()
+
+
 class ChatMemoryManager:
     """
-    Manages chat message history in PostgreSQL database using LangChain's PostgresChatMessageHistory.
+    Manages chat message history in PostgreSQL, stored in the same format as
+    LangChain's PostgresChatMessageHistory.
     
     This implementation is:
     1. Error-tolerant: Falls back gracefully if DB operations fail
-    2. Fast: Reuses existing DB connections
+    2. Fast: Uses the application's pooled async engine instead of a new connection per call
     3. Configurable: Respects MEMORY_WINDOW from settings
     """
     
@@ -30,15 +121,10 @@ class ChatMemoryManager:
         Ensures the chat_message_history table exists in the database.
         This should be called during application startup.
         """
-        connection = None
         try:
-            connection_string = get_db_connection_string()
-            
-            # Use a temporary connection to create the table
-            connection = psycopg.connect(connection_string)
-            
-            # Create the table using the PostgresChatMessageHistory helper
-            PostgresChatMessageHistory.create_tables(connection, "chat_message_history")
+            async with engine.begin() as conn:
+                for statement in CREATE_TABLE_STATEMENTS:
+                    await conn.execute(statement)
             
             logger.info("Chat message history table created or verified")
             return True
@@ -46,13 +132,6 @@ class ChatMemoryManager:
             logger.error(f"Error ensuring chat message history table exists: {str(e)}")
             logger.error(traceback.format_exc())
             return False
-        finally:
-            if connection:
-                try:
-                    connection.close()
-                    logger.debug("Database connection closed successfully")
-                except Exception as e:
-                    logger.error(f"Error closing database connection: {str(e)}")
     
     @staticmethod
     async def get_memory(db: AsyncSession, session_id: str) -> List[BaseMessage]:
@@ -70,93 +149,88 @@ class ChatMemoryManager:
             logger.debug("No session_id provided, returning empty chat history")
             return []
             
-        connection = None
         try:
             logger.info(f"Retrieving chat memory for session: {session_id}")
-            connection_string = get_db_connection_string()
             
-            # Create a new connection for this operation
-            connection = psycopg.connect(connection_string)
-            
-            # Initialize the history object with table_name, session_id, and sync_connection
-            history = PostgresChatMessageHistory(
-                "chat_message_history",
-                session_id,
-                sync_connection=connection
-            )
+            # Apply memory window based on settings but ensure we capture more context if needed
+            memory_window = _MEMORY_WINDOW
             
-            # Get all messages to ensure nothing is missing
-            all_messages = history.get_messages()
-            total_messages = len(all_messages)
-            logger.info(f"Retrieved {total_messages} messages from chat history for session: {session_id}")
+            # Only the newest 2*memory_window rows (plus two so a pair straddling the
+            # boundary is complete) are ever used, so let Postgres apply the window instead
+            # of loading and deserializing the whole session.
+            # The request's session is reused rather than opening a dedicated connection.
+            rows = (await db.execute(
+                RECENT_MESSAGES_QUERY,
+                {"session_id": session_id, "window": memory_window, "limit": memory_window * 2 + 2}
+            )).all()
+            total_messages = rows[0][2] if rows else 0
+            logger.info(f"Retrieved {len(rows)} of {total_messages} messages from chat history for session: {session_id}")
             
-            # Apply memory window based on settings but ensure we capture more context if needed
-            memory_window = getattr(settings, "MEMORY_WINDOW", 25)
+            # Rows come back newest first; raw dicts are only turned into message
+            # objects for the rows that end up in the returned context
+            recent_rows = rows[:memory_window]
             
             # Smart context selection: 
             # 1. Always include at least the most recent memory_window messages
             # 2. For older important conversations, include message pairs up to 2*memory_window
             # 3. If total messages <= memory_window, just return all
             if total_messages <= memory_window:
-                result = all_messages
+                # Short conversation: the single query above already returned everything,
+                # so skip the reset lookup and pair extraction entirely
+                result = messages_from_dict([_load_message(row[3]) for row in reversed(rows)])
             else:
-                # Check for topic reset markers in the conversation
-                reset_indices = []
-                for i, msg in enumerate(all_messages):
-                    # Check for system messages that indicate topic resets
-                    if msg.type == "system" and hasattr(msg, "additional_kwargs"):
-                        kwargs = getattr(msg, "additional_kwargs", {})
-                        if kwargs.get("is_topic_reset", False) or "reset" in msg.content.lower():
-                            reset_indices.append(i)
-                            logger.debug(f"Found topic reset at message {i}: {msg.content}")
+                # Check for topic reset markers anywhere in the conversation
+                reset_row = (await db.execute(LAST_RESET_QUERY, {"session_id": session_id})).first()
                 
-                # If we found reset markers, use the most recent conversation segment
-                if reset_indices and len(reset_indices) > 0:
-                    # Get the last reset index
-                    last_reset = reset_indices[-1]
+                # If we found a reset marker, use the most recent conversation segment
+                if reset_row:
+                    last_reset_id = reset_row[0]
                     
                     # Use messages after the last reset, or if there aren't enough, 
                     # use the memory window
-                    if last_reset + 1 < total_messages:
-                        post_reset_messages = all_messages[last_reset + 1:]
-                        if len(post_reset_messages) > memory_window:
-                            # If we have a lot of messages after reset, use the last memory_window
-                            result = post_reset_messages[-memory_window:]
-                        else:
-                            # Otherwise use all post-reset messages
-                            result = post_reset_messages
+                    if rows[0][0] != last_reset_id:
+                        post_reset_rows = (await db.execute(
+                            MESSAGES_AFTER_QUERY,
+                            {"session_id": session_id, "after_id": last_reset_id, "limit": memory_window}
+                        )).all()
+                        # At most the last memory_window messages after the reset
+                        result = messages_from_dict([_load_message(row[0]) for row in reversed(post_reset_rows)])
                         
-                        logger.debug(f"Using {len(result)} messages after topic reset at index {last_reset}")
+                        logger.debug(f"Using {len(result)} messages after topic reset (message id {last_reset_id})")
                     else:
                         # Default to recent context if reset was the last message
-                        result = all_messages[-memory_window:]
+                        result = messages_from_dict([_load_message(row[3]) for row in reversed(recent_rows)])
                 else:
                     # Extract recent context (last memory_window messages)
-                    recent_context = all_messages[-memory_window:]
+                    recent_context = messages_from_dict([_load_message(row[3]) for row in reversed(recent_rows)])
                     
-                    # For long conversations, analyze the rest to find relevant context
-                    if total_messages > memory_window:
-                        # Find pairs of human/AI messages that might contain relevant topic information
-                        # Scan by pairs (user query + AI response)
-                        older_messages = all_messages[:-memory_window]
-                        relevant_older_pairs = []
-                        
-                        # Process message pairs (user + assistant)
-                        for i in range(0, len(older_messages) - 1, 2):
-                            if i+1 < len(older_messages):
-                                if older_messages[i].type == "human" and older_messages[i+1].type == "ai":
-                                    relevant_older_pairs.append(older_messages[i])
-                                    relevant_older_pairs.append(older_messages[i+1])
-                        
-                        # Only include up to memory_window older messages to avoid context length issues
-                        if relevant_older_pairs:
-                            if len(relevant_older_pairs) > memory_window:
-                                # If too many, include the most recent pairs
-                                relevant_older_pairs = relevant_older_pairs[-memory_window:]
-                            
-                            result = relevant_older_pairs + recent_context
+                    # Find pairs of human/AI messages that might contain relevant topic information.
+                    # Walk the older rows newest-first with a one-message lookahead: an AI reply at an
+                    # odd position (pairs are aligned to the session start) is kept together with the
+                    # human message right before it, stopping once memory_window messages are found.
+                    # Only ids and types are inspected here.
+                    older_pair_ids = []
+                    pending_ai_id = None
+                    for offset, row in enumerate(rows[memory_window:]):
+                        position = total_messages - 1 - memory_window - offset
+                        if position % 2 == 1:
+                            pending_ai_id = row[0] if row[1] == "ai" else None
                         else:
-                            result = recent_context
+                            if pending_ai_id is not None and row[1] == "human":
+                                older_pair_ids.append(pending_ai_id)
+                                older_pair_ids.append(row[0])
+                                if len(older_pair_ids) >= memory_window:
+                                    break
+                            pending_ai_id = None
+                    
+                    # Only include up to memory_window older messages to avoid context length issues
+                    if older_pair_ids:
+                        older_rows = (await db.execute(
+                            MESSAGES_BY_ID_QUERY,
+                            {"session_id": session_id, "ids": older_pair_ids[:memory_window]}
+                        )).all()
+                        older_pairs = [_load_message(row[0]) for row in older_rows]
+                        result = messages_from_dict(older_pairs) + recent_context
                     else:
                         result = recent_context
             
@@ -170,15 +244,28 @@ class ChatMemoryManager:
         except Exception as e:
             logger.error(f"Error retrieving chat memory: {str(e)}")
             logger.error(traceback.format_exc())
+            # Don't leave the request's session in a failed transaction
+            await db.rollback()
             # Return empty list as fallback
             return []
-        finally:
-            if connection:
-                try:
-                    connection.close()
-                    logger.debug("Database connection closed successfully")
-                except Exception as e:
-                    logger.error(f"Error closing database connection: {str(e)}")
+    
+    @staticmethod
+    async def store_messages(session_id: str, messages: List[BaseMessage]) -> None:
+        """
+        Inserts messages for a session in one round trip on a pooled connection.
+        Raises on failure; callers decide how to degrade.
+        """
+        statement = insert(chat_message_history_table).values([
+            {
+                "session_id": session_id,
+                "message": message_to_dict(message),
+                "is_topic_reset": _is_topic_reset(message),
+            }
+            for message in messages
+        ])
+        async with async_session() as session:
+            await session.execute(statement)
+            await session.commit()
     
     @staticmethod
     async def add_messages(db: AsyncSession, session_id: str, 
@@ -187,7 +274,8 @@ class ChatMemoryManager:
         Adds user query and bot response to PostgreSQL chat history.
         
         Args:
-            db: SQLAlchemy AsyncSession connection
+            db: SQLAlchemy AsyncSession connection (unused; a pooled session is used because
+                this runs after streaming responses, when the request's session is closed)
             session_id: Unique identifier for the chat session
             query: User's question text
             response: AI's response text
@@ -199,27 +287,14 @@ class ChatMemoryManager:
             logger.warning("No session_id provided, skipping message storage")
             return False
             
-        connection = None
         try:
             logger.info(f"Adding messages to chat memory for session: {session_id}")
-            connection_string = get_db_connection_string()
-            
-            # Create a new connection for this operation
-            connection = psycopg.connect(connection_string)
             
             # Create message objects
             user_message = HumanMessage(content=query)
             ai_message = AIMessage(content=response)
             
-            # Initialize the history object with table_name, session_id, and sync_connection
-            history = PostgresChatMessageHistory(
-                "chat_message_history",
-                session_id,
-                sync_connection=connection
-            )
-            
-            # Add the messages
-            history.add_messages([user_message, ai_message])
+            await ChatMemoryManager.store_messages(session_id, [user_message, ai_message])
             logger.info(f"Successfully added 2 messages to chat memory for session: {session_id}")
             
             return True
@@ -227,10 +302,3 @@ class ChatMemoryManager:
             logger.error(f"Error saving chat memory: {str(e)}")
             logger.error(traceback.format_exc())
             return False
-        finally:
-            if connection:
-                try:
-                    connection.close()
-                    logger.debug("Database connection closed successfully")
-                except Exception as e:
-                    logger.error(f"Error closing database connection: {str(e)}") 
\ No newline at end of file
@@ -13,33 +13,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def _run_in_own_session(cleanup_func) -> int:
+    """Run a cleanup step on its own session; an AsyncSession can't be shared between concurrent tasks"""
+    async with async_session() as session:
+        try:
+            return await cleanup_func(session)
+        except Exception:
+            # Ensure the session is rolled back on error
+            await session.rollback()
+            raise
+
 async def run_cleanup():
     """Run all cleanup tasks"""
     start_time = time.time()
     logger.info("Starting cleanup of expired sessions and invite codes")
     
     try:
-        async with async_session() as session:
-            try:
-                # Clean up expired sessions
-                sessions_cleaned = await cleanup_expired_sessions(session)
-                logger.info(f"Cleaned up {sessions_cleaned} expired sessions")
-                
-                # Clean up expired invite codes
-                codes_cleaned = await cleanup_expired_invite_codes(session)
-                logger.info(f"Deactivated {codes_cleaned} expired invite codes")
-                
-                # Calculate execution time
-                execution_time = time.time() - start_time
-                logger.info(f"Cleanup completed in {execution_time:.2f} seconds")
-                
-            except Exception as e:
-                logger.error(f"Error during cleanup: {str(e)}")
-                # Ensure the session is rolled back on error
-                await session.rollback()
-                raise
+        # The two steps touch different tables and commit independently, so run them
+        # concurrently on separate connections
+        sessions_cleaned, codes_cleaned = await asyncio.gather(
+            _run_in_own_session(cleanup_expired_sessions),
+            _run_in_own_session(cleanup_expired_invite_codes),
+        )
+        logger.info(f"Cleaned up {sessions_cleaned} expired sessions")
+        logger.info(f"Deactivated {codes_cleaned} expired invite codes")
+        
+        # Calculate execution time
+        execution_time = time.time() - start_time
+        logger.info(f"Cleanup completed in {execution_time:.2f} seconds")
     except Exception as e:
-        logger.error(f"Failed to create database session: {str(e)}")
+        logger.error(f"Error during cleanup: {str(e)}")
         return 1
     
     return 0
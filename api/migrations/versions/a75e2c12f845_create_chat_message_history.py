@@ -21,7 +21,8 @@ depends_on = None
 def upgrade():
     """Create chat_message_history table for storing conversation history."""
     bind = op.get_bind()
-    if not bind.dialect.has_table(bind, 'chat_message_history'):
+    inspector = inspect(bind)
+    if not inspector.has_table('chat_message_history'):
         op.create_table(
             'chat_message_history',
             sa.Column('id', sa.Integer(), nullable=False, primary_key=True),
@@ -31,7 +32,6 @@ def upgrade():
                      server_default=sa.text('now()'), nullable=False)
         )
     else:
-        inspector = inspect(bind)
         indexes = inspector.get_indexes('chat_message_history')
         index_exists = any(idx['name'] == 'idx_chat_message_history_session_id' for idx in indexes)
         
@@ -42,5 +42,6 @@ def upgrade():
 
 def downgrade():
     """Drop the chat_message_history table and its index."""
-    op.drop_index('idx_chat_message_history_session_id', table_name='chat_message_history')
+    # Dropping the table drops whichever session_id index it has (index=True names it
+    # ix_..., the else branch above idx_...), so don't drop one by a fixed name first
     op.drop_table('chat_message_history') 
\ No newline at end of file
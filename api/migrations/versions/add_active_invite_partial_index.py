@@ -0,0 +1,32 @@
+"""Add partial index on active invite codes
+
+Revision ID: e2b6c9d4f831
+Revises: d7e3a5f1c260
+Create Date: 2025-07-04 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b6c9d4f831'
+down_revision = 'd7e3a5f1c260'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Invite validation only ever looks at active codes, which are a small
+    # fraction of the table once old codes have been deactivated
+    op.create_index(
+        'ix_invite_codes_active_email_lookup',
+        'invite_codes',
+        ['email', 'code_lookup'],
+        unique=False,
+        postgresql_where=sa.text('is_active = true')
+    )
+
+
+def downgrade():
+    op.drop_index('ix_invite_codes_active_email_lookup', table_name='invite_codes')
@@ -0,0 +1,37 @@
+"""Add (session_id, id DESC) index to chat_message_history
+
+Revision ID: a8c1e4f7b392
+Revises: f5a9d3c7e214
+Create Date: 2025-07-06 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8c1e4f7b392'
+down_revision = 'f5a9d3c7e214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # get_memory reads "WHERE session_id = ? ORDER BY id DESC LIMIT n"; the composite
+    # index serves that without a sort and also covers plain session_id lookups
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_message_history_session_id_id "
+            "ON chat_message_history (session_id, id DESC)"
+        )
+        # The single-column index is now redundant (name depends on how the table was created)
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_chat_message_history_session_id")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chat_message_history_session_id")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_message_history_session_id "
+            "ON chat_message_history (session_id)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_chat_message_history_session_id_id")
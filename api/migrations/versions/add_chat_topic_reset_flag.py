@@ -0,0 +1,47 @@
+"""Add is_topic_reset flag and partial index to chat_message_history
+
+Revision ID: f5a9d3c7e214
+Revises: e2b6c9d4f831
+Create Date: 2025-07-05 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a9d3c7e214'
+down_revision = 'e2b6c9d4f831'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('chat_message_history',
+        sa.Column('is_topic_reset', sa.Boolean(), server_default=sa.text('false'), nullable=False)
+    )
+
+    # Backfill with the same rule get_memory used to apply to the JSON messages
+    op.execute("""
+        UPDATE chat_message_history
+        SET is_topic_reset = true
+        WHERE message->>'type' = 'system'
+          AND (
+              message->'data'->'additional_kwargs'->>'is_topic_reset' = 'true'
+              OR position('reset' in lower(message->'data'->>'content')) > 0
+          )
+    """)
+
+    # Reset markers are rare, so a partial index keeps the per-turn lookup tiny
+    op.create_index(
+        'idx_chat_message_history_topic_reset',
+        'chat_message_history',
+        ['session_id', 'id'],
+        unique=False,
+        postgresql_where=sa.text('is_topic_reset')
+    )
+
+
+def downgrade():
+    op.drop_index('idx_chat_message_history_topic_reset', table_name='chat_message_history')
+    op.drop_column('chat_message_history', 'is_topic_reset')
@@ -0,0 +1,28 @@
+"""Add indexed code_lookup column to invite_codes
+
+Revision ID: c4d81e2a9b17
+Revises: b5a01c47e89f
+Create Date: 2025-07-02 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d81e2a9b17'
+down_revision = 'b5a01c47e89f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nullable: existing codes are only stored as salted hashes, so their lookup
+    # digest cannot be backfilled; they keep being matched by hash verification
+    op.add_column('invite_codes', sa.Column('code_lookup', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_invite_codes_code_lookup'), 'invite_codes', ['code_lookup'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_invite_codes_code_lookup'), table_name='invite_codes')
+    op.drop_column('invite_codes', 'code_lookup')
@@ -7,7 +7,6 @@ Create Date: 2025-05-20 14:30:00.000000
 """
 from alembic import op
 import sqlalchemy as sa
-from sqlalchemy.sql import expression
 
 
 # revision identifiers, used by Alembic.
@@ -18,16 +17,14 @@ depends_on = None
 
 
 def upgrade():
-    # Add terms_accepted column to users table
-    op.add_column('users', sa.Column('terms_accepted', sa.Boolean(), server_default=expression.false(), nullable=False))
+    # Add terms_accepted column to users table (a constant default is metadata-only on PG 11+)
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('terms_accepted', sa.Boolean(), server_default=sa.text('false'), nullable=False))
 
-    # Optional: Create an index for faster querying
-    op.create_index(op.f('ix_users_terms_accepted'), 'users', ['terms_accepted'], unique=False)
+    # No index: nothing filters users by terms_accepted, and a two-valued btree would
+    # only add write overhead (see drop_users_terms_accepted_index for existing databases)
 
 
 def downgrade():
-    # Drop index
-    op.drop_index(op.f('ix_users_terms_accepted'), table_name='users')
-    
-    # Drop column
+    # Drop column (any leftover ix_users_terms_accepted index goes with it)
     op.drop_column('users', 'terms_accepted') 
\ No newline at end of file
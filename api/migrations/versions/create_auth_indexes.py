@@ -0,0 +1,38 @@
+"""Create authentication table indexes
+
+Revision ID: e8a2d6b4f197
+Revises: d3f7a9c2e584
+Create Date: 2025-07-09 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a2d6b4f197'
+down_revision = 'd3f7a9c2e584'
+branch_labels = None
+depends_on = None
+
+
+# The table-creation revision already builds these indexes, hence if_not_exists;
+# this revision gives bulk loads an unindexed window instead: downgrade to
+# d3f7a9c2e584 to drop them, COPY the rows, then upgrade to rebuild each index
+# with a single table scan.
+def upgrade():
+    op.create_index(op.f('idx_invite_codes_email'), 'invite_codes', ['email'], unique=False,
+                    if_not_exists=True)
+    op.create_index(op.f('idx_invite_codes_expiry'), 'invite_codes', ['expires_at'], unique=False,
+                    postgresql_where=sa.text('expires_at IS NOT NULL'), if_not_exists=True)
+    op.create_index(op.f('idx_sessions_user_identifier'), 'sessions', ['user_identifier'], unique=False,
+                    if_not_exists=True)
+    op.create_index(op.f('idx_sessions_expiry'), 'sessions', ['expires_at'], unique=False,
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index(op.f('idx_sessions_expiry'), table_name='sessions', if_exists=True)
+    op.drop_index(op.f('idx_sessions_user_identifier'), table_name='sessions', if_exists=True)
+    op.drop_index(op.f('idx_invite_codes_expiry'), table_name='invite_codes', if_exists=True)
+    op.drop_index(op.f('idx_invite_codes_email'), table_name='invite_codes', if_exists=True)
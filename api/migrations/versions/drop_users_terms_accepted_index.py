@@ -0,0 +1,28 @@
+"""Drop the users.terms_accepted index
+
+Revision ID: d3f7a9c2e584
+Revises: b6d2f8a1c953
+Create Date: 2025-07-08 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f7a9c2e584'
+down_revision = 'b6d2f8a1c953'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A btree on a boolean is never selective enough for the planner, and no query
+    # filters on terms_accepted, so the index only costs writes to users
+    with op.get_context().autocommit_block():
+        op.execute(sa.text('DROP INDEX CONCURRENTLY IF EXISTS ix_users_terms_accepted'))
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute(sa.text('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_terms_accepted ON users (terms_accepted)'))
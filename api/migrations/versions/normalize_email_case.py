@@ -0,0 +1,46 @@
+"""Normalize stored email addresses to lowercase
+
+Revision ID: d7e3a5f1c260
+Revises: c4d81e2a9b17
+Create Date: 2025-07-03 09:00:00.000000
+
+"""
+import logging
+
+from alembic import context, op
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e3a5f1c260'
+down_revision = 'c4d81e2a9b17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lookups compare the indexed column against a lowercased value, so any
+    # mixed-case rows were unreachable (and forced no index-friendly match).
+    # Both tables have a unique index on email, so only rows whose normalized
+    # value is unique across the whole table are rewritten; case variants of one
+    # address (e.g. A@x.com and a@X.com) are left as-is and reported for cleanup.
+    for table in ('invite_codes', 'users'):
+        op.execute(
+            f"UPDATE {table} SET email = lower(trim(email)) "
+            "WHERE email IS NOT NULL AND email <> lower(trim(email)) "
+            f"AND lower(trim(email)) IN (SELECT lower(trim(email)) FROM {table} "
+            "WHERE email IS NOT NULL GROUP BY lower(trim(email)) HAVING count(*) = 1)"
+        )
+        if not context.is_offline_mode():
+            skipped = op.get_bind().exec_driver_sql(
+                f"SELECT id, email FROM {table} "
+                "WHERE email IS NOT NULL AND email <> lower(trim(email)) ORDER BY id"
+            ).fetchall()
+            for row_id, email in skipped:
+                logger.warning(f"Left {table}.id={row_id} ({email}) unnormalized: another row shares its lowercased email")
+
+
+def downgrade():
+    # Original casing is not recoverable; nothing to undo
+    pass
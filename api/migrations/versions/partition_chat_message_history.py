@@ -0,0 +1,86 @@
+"""Hash-partition chat_message_history by session_id
+
+Revision ID: b6d2f8a1c953
+Revises: a8c1e4f7b392
+Create Date: 2025-07-07 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d2f8a1c953'
+down_revision = 'a8c1e4f7b392'
+branch_labels = None
+depends_on = None
+
+PARTITION_COUNT = 16
+
+
+def _id_sequence():
+    bind = op.get_bind()
+    return bind.execute(sa.text("SELECT pg_get_serial_sequence('chat_message_history', 'id')")).scalar()
+
+
+def _create_indexes():
+    op.execute(
+        "CREATE INDEX idx_chat_message_history_session_id_id "
+        "ON chat_message_history (session_id, id DESC)"
+    )
+    op.execute(
+        "CREATE INDEX idx_chat_message_history_topic_reset "
+        "ON chat_message_history (session_id, id) WHERE is_topic_reset"
+    )
+
+
+def upgrade():
+    # Every chat memory query filters on session_id equality, so each one is
+    # pruned to a single partition with its own small index
+    sequence = _id_sequence()
+
+    # Same columns, types and defaults (including the id sequence); the primary
+    # key must contain the partition key on a partitioned table
+    op.execute(
+        "CREATE TABLE chat_message_history_partitioned "
+        "(LIKE chat_message_history INCLUDING DEFAULTS, PRIMARY KEY (session_id, id)) "
+        "PARTITION BY HASH (session_id)"
+    )
+    for remainder in range(PARTITION_COUNT):
+        op.execute(
+            f"CREATE TABLE chat_message_history_p{remainder} "
+            f"PARTITION OF chat_message_history_partitioned "
+            f"FOR VALUES WITH (MODULUS {PARTITION_COUNT}, REMAINDER {remainder})"
+        )
+
+    op.execute("INSERT INTO chat_message_history_partitioned SELECT * FROM chat_message_history")
+
+    # Detach the sequence so dropping the old table doesn't take it along
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    op.execute("DROP TABLE chat_message_history")
+    op.execute("ALTER TABLE chat_message_history_partitioned RENAME TO chat_message_history")
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY chat_message_history.id")
+
+    _create_indexes()
+
+
+def downgrade():
+    sequence = _id_sequence()
+
+    op.execute(
+        "CREATE TABLE chat_message_history_unpartitioned "
+        "(LIKE chat_message_history INCLUDING DEFAULTS, PRIMARY KEY (id))"
+    )
+    op.execute("INSERT INTO chat_message_history_unpartitioned SELECT * FROM chat_message_history")
+
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    # Dropping the parent drops all of its partitions
+    op.execute("DROP TABLE chat_message_history")
+    op.execute("ALTER TABLE chat_message_history_unpartitioned RENAME TO chat_message_history")
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY chat_message_history.id")
+
+    _create_indexes()
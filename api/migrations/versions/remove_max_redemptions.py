@@ -1,7 +1,7 @@
 """Remove max_redemptions from invite_codes
 
 Revision ID: aef23c0bd792
-Revises: b32f45c9a123
+Revises: a75e2c12f845
 Create Date: 2025-06-15 14:00:00.000000
 
 """
@@ -0,0 +1,68 @@
+"""
+Build the local HIBP Bloom filter used by UserService.check_password_compromised.
+
+Input is a Pwned Passwords SHA-1 dump ("HASH:COUNT" per line), ideally the
+prevalence-ordered file so that --limit keeps the most common breached passwords.
+
+Usage:
+    python api/scripts/build_hibp_bloom.py pwned-passwords-sha1-ordered-by-count.txt /data/hibp.bloom --limit 10000000
+
+Then set HIBP_BLOOM_PATH=/data/hibp.bloom and restart the API. Re-run periodically
+to pick up newly breached passwords.
+
+If the whole dump fits within --limit the filter is marked complete, and the API
+trusts its misses (skipping the HIBP request). A top-N subset is marked partial:
+it skips no requests, and every check (including every hit) still goes to the API.
+"""
+import argparse
+import os
+import sys
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from api.app.utils.bloom_filter import BloomFilter
+
+
+def _hash_of(line: str) -> str:
+    """Return the SHA-1 hex of a HASH:COUNT line, or '' if the line holds none"""
+    sha1_hex = line.split(":", 1)[0].strip()
+    return sha1_hex if len(sha1_hex) == 40 else ""
+
+
+def build_bloom(source: str, output: str, limit: int, error_rate: float):
+    bloom = BloomFilter.for_capacity(limit, error_rate)
+    print(f"Building Bloom filter: {bloom.num_bits} bits, {bloom.num_hashes} hashes")
+
+    added = 0
+    complete = True
+    with open(source, "r", encoding="ascii", errors="ignore") as f:
+        for line in f:
+            sha1_hex = _hash_of(line)
+            if not sha1_hex:
+                continue
+            bloom.add(bytes.fromhex(sha1_hex))
+            added += 1
+            if added % 1_000_000 == 0:
+                print(f"  {added} hashes added")
+            if added >= limit:
+                # A dump with exactly --limit hashes is still complete; only another
+                # hash past the limit makes this a top-N subset
+                complete = not any(_hash_of(rest) for rest in f)
+                break
+    bloom.complete = complete
+
+    tmp_path = f"{output}.tmp"
+    bloom.save(tmp_path)
+    os.replace(tmp_path, output)  # Atomic swap so running workers never see a partial file
+    print(f"Wrote {added} hashes to {output} ({'complete' if bloom.complete else 'partial: top-N subset'})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a Bloom filter from a Pwned Passwords SHA-1 dump")
+    parser.add_argument("source", help="Path to the HASH:COUNT dump file")
+    parser.add_argument("output", help="Where to write the Bloom filter")
+    parser.add_argument("--limit", type=int, default=10_000_000, help="Number of hashes to include")
+    parser.add_argument("--error-rate", type=float, default=0.001, help="Target false positive rate")
+    args = parser.parse_args()
+    build_bloom(args.source, args.output, args.limit, args.error_rate)
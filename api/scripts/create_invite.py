@@ -1,39 +1,87 @@
-from api.app.models.auth import InviteCode
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 import asyncio
+import importlib.util
 import os
 import sys
+from typing import List, Optional
+
+# Add project root to Python path, once, before any project import; re-inserting an
+# existing entry would only add another prefix for every later import to scan
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
+from api.app.models.auth import InviteCode
+
+def _async_driver() -> str:
+    """Return the first installed async Postgres driver. psycopg2 is sync-only and
+    can't back an async engine, so it isn't a candidate."""
+    driver = next((d for d in ('asyncpg', 'psycopg') if importlib.util.find_spec(d)), None)
+    if not driver:
+        raise ImportError("No async Postgres driver installed (install asyncpg or psycopg)")
+    return driver
 
-# Add project root to Python path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+# Engine and session factory shared by every create_invite() call in this process,
+# so seeding several invites reuses one pool instead of reconnecting each time
+_engine: Optional[AsyncEngine] = None
+_sessionmaker: Optional[async_sessionmaker] = None
+_engine_lock = asyncio.Lock()
 
-async def create_invite():
+async def _get_sessionmaker(db_url: str) -> async_sessionmaker:
+    """Create the engine and session factory on first use and reuse them afterwards"""
+    global _engine, _sessionmaker
+    async with _engine_lock:
+        if _sessionmaker is None:
+            # Sequential single-transaction work: skip pre-ping and keep one connection
+            # Large invite batches go out as multi-row INSERT ... RETURNING, 1000 rows per statement
+            _engine = create_async_engine(
+                db_url, pool_size=1, max_overflow=0, pool_pre_ping=False, insertmanyvalues_page_size=1000
+            )
+            _sessionmaker = async_sessionmaker(_engine, expire_on_commit=False)
+        return _sessionmaker
+
+async def dispose_engine():
+    """Close the shared engine's pooled connections; call once before the event loop ends"""
+    global _engine, _sessionmaker
+    async with _engine_lock:
+        if _engine is not None:
+            await _engine.dispose()
+            _engine = None
+            _sessionmaker = None
+
+# Upper bound on invite emails being sent at once
+EMAIL_CONCURRENCY = 8
+
+async def _send_invite_email(semaphore: asyncio.Semaphore, email: str, invite: InviteCode, plain_code: str):
+    async with semaphore:
+        try:
+            from api.app.services.email_service import send_invite_code_email
+            await send_invite_code_email(
+                to_email=email,
+                invite_code=plain_code,
+                expires_at=invite.expires_at,
+                redemption_count=invite.redemption_count
+            )
+            print(f"Invite code email sent to {email}")
+        except Exception as e:
+            print(f"Failed to send invite code email to {email}: {str(e)}")
+            # Continue even if email sending fails
+
+async def create_invite(emails: Optional[List[str]] = None):
     # Get database URL from environment
     db_url = os.environ.get('DATABASE_URL', '')
     
-    # Handle URL format conversion - try multiple drivers
+    # Handle URL format conversion
     if db_url.startswith('postgres://'):
-        try:
-            # Try asyncpg driver first (most reliable for async)
-            db_url = db_url.replace('postgres://', 'postgresql+asyncpg://')
-            print(f"Using asyncpg driver")
-        except ImportError:
-            try:
-                # Try psycopg3
-                db_url = db_url.replace('postgres://', 'postgresql+psycopg://')
-                print(f"Using psycopg driver")
-            except ImportError:
-                # Fallback to psycopg2
-                db_url = db_url.replace('postgres://', 'postgresql+psycopg2://')
-                print(f"Using psycopg2 driver")
+        driver = _async_driver()
+        db_url = db_url.replace('postgres://', f'postgresql+{driver}://', 1)
+        print(f"Using {driver} driver")
     
     print(f"Connecting to database with URL scheme: {db_url.split('://')[0]}")
     
     # Create engine with more explicit error handling
     try:
-        engine = create_async_engine(db_url)
-        async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async_session = await _get_sessionmaker(db_url)
     except ImportError as e:
         print(f"Error importing database driver: {e}")
         print("Available drivers in sys.path:")
@@ -41,33 +89,43 @@ async def create_invite():
             print(f"  - {path}")
         raise
     
-    async with async_session() as session:
+    if not emails:
         # Get admin email, defaulting to empty string if not set
-        admin_email = os.environ.get('ADMIN_EMAILS', '').split(',')[0].strip()
+        admin_email = os.environ.get('ADMIN_EMAILS', '').partition(',')[0].strip()
         if not admin_email:
             admin_email = input("Enter admin email: ")
-            
-        # Generate invite code
-        invite, plain_code = InviteCode.generate(email=admin_email, expires_days=None)
-        session.add(invite)
-        await session.commit()
-        
-        # Send email with invite code details
-        if admin_email:
-            try:
-                from app.services.email_service import send_invite_code_email
-                await send_invite_code_email(
-                    to_email=admin_email,
-                    invite_code=plain_code,
-                    expires_at=invite.expires_at,
-                    redemption_count=invite.redemption_count
-                )
-                print(f"Invite code email sent to {admin_email}")
-            except Exception as e:
-                print(f"Failed to send invite code email: {str(e)}")
-                # Continue even if email sending fails
-        
-        print(f'Created admin invite code: {plain_code} for {admin_email}')
+        emails = [admin_email]
+    
+    # Generate every invite code and insert them in a single transaction; the
+    # begin() block flushes them as one batched INSERT and commits on exit
+    generated = [(email, *InviteCode.generate(email=email, expires_days=None)) for email in emails]
+    async with async_session.begin() as session:
+        session.add_all([invite for _, invite, _ in generated])
+    
+    # Send email with invite code details; sends overlap, bounded by EMAIL_CONCURRENCY
+    semaphore = asyncio.Semaphore(EMAIL_CONCURRENCY)
+    await asyncio.gather(*(
+        _send_invite_email(semaphore, email, invite, plain_code)
+        for email, invite, plain_code in generated
+        if email
+    ))
+    
+    for email, _, plain_code in generated:
+        print(f'Created admin invite code: {plain_code} for {email}')
+
+async def main(emails: Optional[List[str]] = None):
+    try:
+        await create_invite(emails)
+    finally:
+        # Close pooled connections before asyncio.run() tears down the loop
+        await dispose_engine()
 
 if __name__ == "__main__":
-    asyncio.run(create_invite())
\ No newline at end of file
+    # uvloop is in requirements on non-Windows platforms; fall back to the default loop otherwise
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    # Optional email addresses on the command line create one invite each
+    asyncio.run(main(sys.argv[1:] or None))
\ No newline at end of file
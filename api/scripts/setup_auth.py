@@ -7,16 +7,26 @@ Usage:
 1. Local: python scripts/setup_auth.py
 2. Heroku: heroku run python scripts/setup_auth.py
 3. Other clouds: Follow platform-specific instructions to run Python scripts
+
+Every prompt can be answered up front for non-interactive runs, e.g.
+    python scripts/setup_auth.py --email admin@example.com --days 30 --max-uses 1
+Database settings fall back to DATABASE_URL / DB_* environment variables. Prompts
+are only shown for missing values when stdin is a terminal.
 """
+import argparse
 import asyncio
 import sys
 import os
 import logging
 import getpass
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from typing import TYPE_CHECKING, Optional, Tuple
 import urllib.parse
 
+# SQLAlchemy and the app models are imported inside the functions that use them, so
+# --help and argument errors don't pay for loading them
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -26,8 +36,32 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
 sys.path.insert(0, parent_dir)
 
-# Import models after path setup
-from app.models.auth import InviteCode, Base
+# Engine and session factory shared by every setup_auth() call in this process, so a
+# caller seeding several invites doesn't pay for a new pool and handshake each time
+_engine: Optional["AsyncEngine"] = None
+_sessionmaker: Optional["async_sessionmaker"] = None
+_engine_lock = asyncio.Lock()
+
+async def _get_engine(database_url: str) -> Tuple["AsyncEngine", "async_sessionmaker"]:
+    """Create the engine and session factory on first use and reuse them afterwards"""
+    global _engine, _sessionmaker
+    async with _engine_lock:
+        if _engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+            
+            # The setup runs its steps one after another, so a single connection is enough
+            _engine = create_async_engine(database_url, pool_size=1, max_overflow=0)
+            _sessionmaker = async_sessionmaker(_engine, expire_on_commit=False)
+        return _engine, _sessionmaker
+
+async def dispose_engine():
+    """Close the shared engine's pooled connections; call once before the event loop ends"""
+    global _engine, _sessionmaker
+    async with _engine_lock:
+        if _engine is not None:
+            await _engine.dispose()
+            _engine = None
+            _sessionmaker = None
 
 def detect_platform():
     """Detect which platform we're running on"""
@@ -40,40 +74,88 @@ def detect_platform():
     else:
         return "local"
 
-async def setup_auth():
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Set up the COSMOS authentication system")
+    parser.add_argument("--email", help="Admin email address for the invite code")
+    parser.add_argument("--days", type=int, help="Expiration days (0 for no expiration) [30]")
+    parser.add_argument("--max-uses", type=int, help="Maximum number of uses (0 for unlimited) [1]")
+    parser.add_argument("--db-user", default=os.environ.get("DB_USER"), help="Database username [postgres]")
+    parser.add_argument("--db-host", default=os.environ.get("DB_HOST"), help="Database host [localhost]")
+    parser.add_argument("--db-port", default=os.environ.get("DB_PORT"), help="Database port [5432]")
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME"), help="Database name [auth_system]")
+    return parser.parse_args(argv)
+
+def _ask(value, prompt: str, default: str, interactive: bool) -> str:
+    """Use the given value, else prompt on a terminal, else fall back to the default"""
+    if value not in (None, ""):
+        return str(value)
+    if interactive:
+        return input(f"{prompt} [{default}]: ").strip() or default
+    return default
+
+def resolve_settings(args: argparse.Namespace, platform: str) -> Optional[argparse.Namespace]:
+    """
+    Fill in every setting before the event loop starts, so no input()/getpass()
+    call ever blocks it. Returns None if the settings are unusable.
+    """
+    interactive = sys.stdin.isatty()
+    
+    # Get database connection info
+    database_url = os.environ.get("DATABASE_URL")
+    
+    if not database_url:
+        logger.info("No DATABASE_URL found, using local connection parameters")
+        
+        # Only prompt for database credentials during local development
+        ask_db = interactive and platform == "local"
+        if platform != "local":
+            # Use sensible defaults for cloud environments without DATABASE_URL
+            logger.warning("No DATABASE_URL found in cloud environment!")
+        db_user = _ask(args.db_user, "Database username", "postgres", ask_db)
+        db_password = os.environ.get("DB_PASSWORD")
+        if db_password is None:
+            db_password = getpass.getpass("Database password (leave empty if using local auth): ") if ask_db else ""
+        db_host = _ask(args.db_host, "Database host", "localhost", ask_db)
+        db_name = _ask(args.db_name, "Database name", "auth_system", ask_db)
+        db_port = _ask(args.db_port, "Database port", "5432", ask_db)
+            
+        # URL encode the password to handle special characters
+        encoded_password = urllib.parse.quote_plus(db_password)
+        
+        # Create database URL
+        database_url = f"postgresql+asyncpg://{db_user}:{encoded_password}@{db_host}:{db_port}/{db_name}"
+    
+    # Get user input for creating the initial admin invite
+    if interactive and (args.email is None or args.days is None or args.max_uses is None):
+        print("\n== COSMOS AUTH SYSTEM SETUP ==\n")
+        print("This will create your initial admin invite code.")
+    if args.email is not None:
+        email = args.email.strip()
+    elif interactive:
+        email = input("Admin email address: ").strip()
+    else:
+        logger.error("--email is required when not running interactively")
+        return None
+    
+    try:
+        days = args.days if args.days is not None else int(_ask(None, "Expiration days (0 for no expiration)", "30", interactive))
+        max_uses = args.max_uses if args.max_uses is not None else int(_ask(None, "Maximum number of uses (0 for unlimited)", "1", interactive))
+    except ValueError:
+        logger.error("Invalid input: days and max uses must be numbers")
+        return None
+    
+    return argparse.Namespace(database_url=database_url, email=email, days=days, max_uses=max_uses)
+
+async def setup_auth(settings: argparse.Namespace, platform: str):
     """Set up authentication system in any environment"""
+    from sqlalchemy import text
+    # Import models after path setup
+    from app.models.auth import InviteCode, Base
+    
     try:
-        platform = detect_platform()
-        logger.info(f"Detected platform: {platform}")
+        database_url = settings.database_url
+        email, days, max_uses = settings.email, settings.days, settings.max_uses
         
-        # Get database connection info
-        database_url = os.environ.get("DATABASE_URL")
-        
-        if not database_url:
-            logger.info("No DATABASE_URL found, using local connection parameters")
-            
-            # For local development, we'll ask for database credentials
-            if platform == "local":
-                db_user = input("Database username [postgres]: ").strip() or "postgres"
-                db_password = getpass.getpass("Database password (leave empty if using local auth): ")
-                db_host = input("Database host [localhost]: ").strip() or "localhost"
-                db_name = input("Database name [auth_system]: ").strip() or "auth_system"
-                db_port = input("Database port [5432]: ").strip() or "5432"
-            else:
-                # Use sensible defaults for cloud environments without DATABASE_URL
-                logger.warning("No DATABASE_URL found in cloud environment!")
-                db_user = os.environ.get("DB_USER", "postgres")
-                db_password = os.environ.get("DB_PASSWORD", "")
-                db_host = os.environ.get("DB_HOST", "localhost")
-                db_name = os.environ.get("DB_NAME", "auth_system")
-                db_port = os.environ.get("DB_PORT", "5432")
-                
-            # URL encode the password to handle special characters
-            encoded_password = urllib.parse.quote_plus(db_password)
-            
-            # Create database URL
-            database_url = f"postgresql+asyncpg://{db_user}:{encoded_password}@{db_host}:{db_port}/{db_name}"
-            
         # Handle URL format conversion
         if database_url.startswith("postgres://"):
             database_url = database_url.replace("postgres://", "postgresql+asyncpg://", 1)
@@ -81,29 +163,19 @@ async def setup_auth():
         connection_info = database_url.split("@")[-1] if "@" in database_url else "database"
         logger.info(f"Connecting to database at {connection_info}")
         
-        # Create engine and session
-        engine = create_async_engine(database_url)
-        async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        # Get the shared engine and session factory
+        engine, async_session = await _get_engine(database_url)
         
         # Create tables if they don't exist
         async with engine.begin() as conn:
-            # Create tables if they don't exist
-            await conn.run_sync(Base.metadata.create_all)
-            logger.info("Database tables created/verified")
-        
-        # Get user input for creating the initial admin invite
-        print("\n== COSMOS AUTH SYSTEM SETUP ==\n")
-        print("This will create your initial admin invite code.")
-        email = input("Admin email address: ").strip()
-        days_input = input("Expiration days (0 for no expiration) [30]: ").strip() or "30"
-        max_uses_input = input("Maximum number of uses (0 for unlimited) [1]: ").strip() or "1"
-        
-        try:
-            days = int(days_input)
-            max_uses = int(max_uses_input)
-        except ValueError:
-            logger.error("Invalid input: days and max uses must be numbers")
-            return False
+            # A migrated database is owned by Alembic, so skip create_all's per-table
+            # catalog checks there and only bootstrap databases Alembic never touched
+            migrated = await conn.scalar(text("SELECT to_regclass('alembic_version')"))
+            if migrated:
+                logger.info("Database schema is managed by Alembic; skipping create_all")
+            else:
+                await conn.run_sync(Base.metadata.create_all)
+                logger.info("Database tables created/verified")
         
         async with async_session() as session:
             # Generate invite code
@@ -113,8 +185,9 @@ async def setup_auth():
                 max_redemptions=max_uses
             )
             
-            session.add(invite)
-            await session.commit()
+            # Insert and commit in one explicit transaction block
+            async with session.begin():
+                session.add(invite)
             
             # Send email with invite code details if email is provided
             if email:
@@ -175,9 +248,28 @@ async def setup_auth():
         print("Failed to set up authentication. Please check logs for more information.")
         return False
 
+async def main(settings: argparse.Namespace, platform: str) -> bool:
+    try:
+        return await setup_auth(settings, platform)
+    finally:
+        # Close pooled connections before asyncio.run() tears down the loop
+        await dispose_engine()
+
 if __name__ == "__main__":
+    # uvloop is in requirements on non-Windows platforms; fall back to the default loop otherwise
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    
     try:
-        success = asyncio.run(setup_auth())
+        platform = detect_platform()
+        logger.info(f"Detected platform: {platform}")
+        settings = resolve_settings(parse_args(), platform)
+        if settings is None:
+            sys.exit(1)
+        success = asyncio.run(main(settings, platform))
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
         print("\nOperation cancelled by user")
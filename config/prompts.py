@@ -20,9 +20,16 @@ Question: {question}
 """
 
 # --- Gmail Agent Prompts ---
+# Every Gmail request starts with the same system message followed by the email itself;
+# the task-specific instruction comes last so repeated calls on one email share a prompt
+# prefix the provider can serve from its cache.
+
+GMAIL_SYSTEM_PROMPT = """
+You are an email assistant. You will be shown an email, followed by a task to perform on it.
+"""
 
 GMAIL_CLASSIFY_PROMPT = """
-Please classify the following email into one of these categories:
+Please classify the email above into one of these categories:
 - Support (technical help, troubleshooting)
 - Sales (inquiries about purchasing, pricing questions)
 - Personal (non-business communication)
@@ -30,22 +37,11 @@ Please classify the following email into one of these categories:
 - Urgent (time-sensitive matters)
 - Other (anything that doesn't fit above)
 
-Subject: {email_subject}
-
-Email Body:
-{email_body}
-
 Return only the category name without any explanation.
 """
 
 GMAIL_GENERATE_REPLY_PROMPT = """
-Generate a reply to the following email:
-
-From: {sender_name}
-Subject: {email_subject}
-
-Email Body:
-{email_body}
+Generate a reply to the email above from {sender_name}.
 
 --- 
 Reply Parameters:
@@ -62,11 +58,26 @@ Write a complete, ready-to-send email response. Don't use placeholders and make
 """
 
 GMAIL_SUMMARIZE_PROMPT = """
-Please provide a concise summary of the key points from the following email content. 
+Please provide a concise summary of the key points from the email above. 
 Focus on the main topic, decisions made, and any action items mentioned.
 
-Email Content:
-{email_content}
-
 Summary:
-"""
\ No newline at end of file
+"""
+
+GMAIL_ANALYZE_PROMPT = """
+Classify the email above and summarize it.
+
+For the category, use exactly one of:
+- Support (technical help, troubleshooting)
+- Sales (inquiries about purchasing, pricing questions)
+- Personal (non-business communication)
+- Information (general information requests)
+- Urgent (time-sensitive matters)
+- Other (anything that doesn't fit above)
+
+For the summary, give a concise summary of the key points, focusing on the main topic,
+decisions made, and any action items mentioned.
+
+Respond with a JSON object with exactly two string fields: "category" (the category
+name only) and "summary".
+"""
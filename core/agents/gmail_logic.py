@@ -1,18 +1,48 @@
 import os
-import json
+import asyncio
 import base64
+import binascii
+import bisect
+import functools
+import hashlib
 import logging
 import threading
-from typing import Optional, Dict, Any, List, Tuple
+from typing import TYPE_CHECKING, Optional, Dict, Any, Iterable, Iterator, List, Tuple
 import email.utils
-import re
+import io
+import itertools
+from email import policy
+from email.generator import BytesGenerator
+from email.message import EmailMessage
+from html.parser import HTMLParser
+import tempfile
+import datetime
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+# lxml is already installed for article parsing (newspaper4k); the regex fallback
+# below is used if it isn't available
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+# Advisory file locking so several worker processes don't refresh the same token at once
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-import openai
+from googleapiclient.model import JsonModel
+import orjson
+# openai, the discovery client, the OAuth flow and the HTTP transports are imported
+# where they're first used: most entry points (auth URL, token checks) never touch them
+if TYPE_CHECKING:
+    import google_auth_httplib2
+    import openai
 # Assuming config.prompts is accessible via sys.path added by CosmosConnector
 import config.prompts as prompts
 
@@ -33,48 +63,169 @@ REDIRECT_URI = os.getenv('GMAIL_REDIRECT_URI', 'http://localhost:8090/')
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of calls Gmail accepts in one batch request
+GMAIL_BATCH_LIMIT = 100
+# Maximum page size users.messages.list returns
+GMAIL_LIST_PAGE_LIMIT = 500
+# Maximum number of message IDs users.messages.batchModify accepts per call
+GMAIL_BATCH_MODIFY_LIMIT = 1000
+
+# Partial-response masks: only the message fields the summary and detail views read.
+# Detail bodies include three levels of nested parts (e.g. alternative inside mixed).
+EMAIL_SUMMARY_FIELDS = 'id,threadId,snippet,labelIds,payload/headers'
+EMAIL_DETAIL_FIELDS = (
+    'id,threadId,snippet,labelIds,payload(headers,mimeType,body/data,'
+    'parts(mimeType,body/data,parts(mimeType,body/data,parts(mimeType,body/data))))'
+)
+
+# Refresh tokens this long before they expire, so requests never carry a token that
+# lapses mid-flight and concurrent callers don't all hit the 401 -> refresh path
+REFRESH_AHEAD = datetime.timedelta(minutes=5)
+TOKEN_LOCK_FILE = TOKEN_FILE + '.lock'
+
+# Parsed messages kept in memory (LRU); repeat opens of the same email only fetch its labels
+EMAIL_DETAILS_CACHE_SIZE = int(os.getenv('GMAIL_DETAILS_CACHE_SIZE', '256'))
+# Background threads fetching batches of full message details ahead of selection
+EMAIL_PREFETCH_WORKERS = int(os.getenv('GMAIL_PREFETCH_WORKERS', '4'))
+# Opt-in: download every listed body right after a fetch (so the list can be classified
+# up front) rather than only the one the user selects. Off by default since it spends
+# Gmail quota and OpenAI calls on emails the user may never open.
+EMAIL_PREFETCH_BODIES = os.getenv('GMAIL_PREFETCH_BODIES', 'false').lower() == 'true'
+# Concurrent OpenAI requests when preparing a whole fetched list at once
+EMAIL_LLM_CONCURRENCY = int(os.getenv('GMAIL_LLM_CONCURRENCY', '8'))
+# Chat models for the email tasks; classification is a one-word answer from a fixed
+# list, so a small model handles it at a fraction of the latency and cost
+EMAIL_LLM_MODEL = os.getenv('GMAIL_LLM_MODEL', 'gpt-4o')
+EMAIL_CLASSIFY_MODEL = os.getenv('GMAIL_CLASSIFY_MODEL', 'gpt-4o-mini')
+# Token-count bucket boundaries for batched LLM dispatch (at most len + 1 buckets)
+EMAIL_LENGTH_BUCKETS = (256, 1024, 4096)
+
 # --- Globals for Service Caching ---
 _gmail_service = None
 _service_lock = threading.Lock()
+# httplib2.Http isn't thread-safe, so each worker thread keeps its own long-lived
+# authorized connection (keep-alive, TLS session reused across API calls)
+_thread_http = threading.local()
+
+# Parsed token file keyed on its st_mtime_ns, so service lookups don't re-read and
+# re-parse an unchanged file. Separate lock: loads happen while _service_lock is held
+_token_cache = {'mtime': 0, 'creds': None}
+_token_cache_lock = threading.Lock()
+# OAuth client secrets (mtime, parsed config), shared by the auth URL and callback flows
+_client_config_cache: Optional[Tuple[int, Dict[str, Any]]] = None
+_client_config_lock = threading.Lock()
+
+_details_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_details_cache_lock = threading.Lock()
+
+_prefetch_executor: Optional[ThreadPoolExecutor] = None
+_prefetch_executor_lock = threading.Lock()
+
+# --- Globals for OpenAI Client Caching ---
+# One client per process keeps its HTTP connection pool (and TLS sessions) warm
+# across calls; rebuilt only if OPENAI_API_KEY changes
+_openai_client = None
+_openai_async_client = None
+_openai_client_key = None
+_openai_client_lock = threading.Lock()
+
+_token_encoding = None
 
 # --- Authentication Functions ---
 
 def _load_credentials_from_token_file() -> Optional[Credentials]:
-    """Loads credentials from the token file if it exists."""
+    """Loads credentials from the token file, re-parsing it only when its mtime changes."""
+    try:
+        mtime_ns = os.stat(TOKEN_FILE).st_mtime_ns
+    except FileNotFoundError:
+        _invalidate_token_cache()
+        return None
+
+    with _token_cache_lock:
+        if _token_cache['mtime'] == mtime_ns:
+            return _token_cache['creds']
+
     creds = None
-    if os.path.exists(TOKEN_FILE):
-        try:
-            with open(TOKEN_FILE, 'r') as token:
-                creds = Credentials.from_authorized_user_info(json.load(token), SCOPES)
-            logger.info(f"Loaded credentials from {TOKEN_FILE}")
-        except json.JSONDecodeError:
-            logger.error(f"Error decoding JSON from {TOKEN_FILE}. Token file might be corrupt.")
-            creds = None
-        except Exception as e:
-            logger.error(f"Error loading token file {TOKEN_FILE}: {e}")
-            creds = None
+    try:
+        with open(TOKEN_FILE, 'rb') as token:
+            creds = Credentials.from_authorized_user_info(orjson.loads(token.read()), SCOPES)
+        logger.info(f"Loaded credentials from {TOKEN_FILE}")
+    except orjson.JSONDecodeError:
+        logger.error(f"Error decoding JSON from {TOKEN_FILE}. Token file might be corrupt.")
+        creds = None
+    except Exception as e:
+        logger.error(f"Error loading token file {TOKEN_FILE}: {e}")
+        creds = None
+
+    with _token_cache_lock:
+        _token_cache['mtime'] = mtime_ns
+        _token_cache['creds'] = creds
     return creds
 
+def _invalidate_token_cache():
+    with _token_cache_lock:
+        _token_cache['mtime'] = 0
+        _token_cache['creds'] = None
+
+def reset_gmail_service():
+    """Drops the cached Gmail service and token so the next call re-reads credentials
+    (after logout or new client credentials). The OpenAI clients are left alone."""
+    global _gmail_service
+    with _service_lock:
+        _gmail_service = None
+    _invalidate_token_cache()
+
 def _save_credentials_to_token_file(creds: Credentials):
     """Saves credentials to the token file."""
+    tmp_path = None
     try:
         os.makedirs(os.path.dirname(TOKEN_FILE), exist_ok=True)
-        with open(TOKEN_FILE, 'w') as token:
+        # Write a temp file in the same directory and atomically swap it in, so other
+        # workers reading the token never see a truncated file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(TOKEN_FILE), prefix='.gmail_token.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as token:
             token.write(creds.to_json())
+            token.flush()
+            os.fsync(token.fileno())
+        os.replace(tmp_path, TOKEN_FILE)
+        tmp_path = None
         logger.info(f"Saved credentials to {TOKEN_FILE}")
     except Exception as e:
         logger.error(f"Could not save token file {TOKEN_FILE}: {e}")
+    finally:
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        # Coarse filesystem timestamps could leave the mtime unchanged after a rewrite
+        _invalidate_token_cache()
+
+def _get_client_config() -> Optional[Dict[str, Any]]:
+    """Returns the parsed OAuth client secrets, re-reading CREDENTIALS_FILE only when it changes."""
+    global _client_config_cache
+    try:
+        mtime_ns = os.stat(CREDENTIALS_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _client_config_lock:
+        if _client_config_cache is None or _client_config_cache[0] != mtime_ns:
+            with open(CREDENTIALS_FILE, 'rb') as credentials_file:
+                _client_config_cache = (mtime_ns, orjson.loads(credentials_file.read()))
+        return _client_config_cache[1]
 
 def get_authorization_url() -> Tuple[Optional[str], Optional[str]]:
     """Generates the Google OAuth 2.0 authorization URL and state."""
-    if not os.path.exists(CREDENTIALS_FILE):
-        logger.error(f"Credentials file not found at {CREDENTIALS_FILE}. Cannot start auth flow.")
-        # Indicate failure by returning None
-        return None, None 
-
     try:
-        flow = InstalledAppFlow.from_client_secrets_file(
-            CREDENTIALS_FILE, 
+        client_config = _get_client_config()
+        if client_config is None:
+            logger.error(f"Credentials file not found at {CREDENTIALS_FILE}. Cannot start auth flow.")
+            # Indicate failure by returning None
+            return None, None
+
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_config(
+            client_config,
             SCOPES,
             redirect_uri=REDIRECT_URI
         )
@@ -96,13 +247,15 @@ def get_authorization_url() -> Tuple[Optional[str], Optional[str]]:
 
 def handle_oauth_callback(code: str) -> bool:
     """Handles the OAuth callback, exchanging the code for tokens."""
-    if not os.path.exists(CREDENTIALS_FILE):
-        logger.error(f"Credentials file not found at {CREDENTIALS_FILE}. Cannot handle callback.")
-        return False # Indicate failure
-
     try:
-        flow = InstalledAppFlow.from_client_secrets_file(
-            CREDENTIALS_FILE, 
+        client_config = _get_client_config()
+        if client_config is None:
+            logger.error(f"Credentials file not found at {CREDENTIALS_FILE}. Cannot handle callback.")
+            return False # Indicate failure
+
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_config(
+            client_config,
             SCOPES,
             redirect_uri=REDIRECT_URI
         )
@@ -127,12 +280,45 @@ def handle_oauth_callback(code: str) -> bool:
         logger.error(f"OAuth callback failed: {e}", exc_info=True)
         return False # Indicate failure
 
+@contextmanager
+def _token_file_lock():
+    """Exclusive cross-process lock around token refresh; a no-op where fcntl is unavailable."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(CREDENTIALS_DIR, exist_ok=True)
+    with open(TOKEN_LOCK_FILE, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _expires_soon(creds: Credentials) -> bool:
+    """True if the access token expires within REFRESH_AHEAD (expiry is naive UTC in google-auth)."""
+    if not creds.expiry:
+        return False
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now < REFRESH_AHEAD
+
 def _refresh_credentials(creds: Credentials) -> Optional[Credentials]:
-    """Refreshes expired credentials using the refresh token."""
+    """
+    Refreshes credentials using the refresh token, single-flight across processes:
+    under the token file lock, a token another process already refreshed is adopted
+    instead of calling the token endpoint again.
+    """
     try:
-        creds.refresh(Request())
-        logger.info("Credentials refreshed successfully.")
-        _save_credentials_to_token_file(creds)
+        with _token_file_lock():
+            stored = _load_credentials_from_token_file()
+            if stored and stored.token and stored.token != creds.token and stored.valid and not _expires_soon(stored):
+                creds.token = stored.token
+                creds.expiry = stored.expiry
+                logger.info("Using credentials already refreshed by another worker.")
+                return creds
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+            logger.info("Credentials refreshed successfully.")
+            _save_credentials_to_token_file(creds)
         return creds
     except Exception as e:
         logger.error(f"Error refreshing credentials: {e}. Need re-authentication.")
@@ -140,19 +326,80 @@ def _refresh_credentials(creds: Credentials) -> Optional[Credentials]:
         # E.g., if os.path.exists(TOKEN_FILE): try: os.remove(TOKEN_FILE) ...
         return None
 
+class _OrjsonModel(JsonModel):
+    """JsonModel that parses API responses (full-format messages can be several MB) with orjson."""
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return content.decode('utf-8') if isinstance(content, bytes) else content
+        if self._data_wrapper and isinstance(body, dict) and 'data' in body:
+            body = body['data']
+        return body
+
+def _authorized_http(creds: Credentials) -> "google_auth_httplib2.AuthorizedHttp":
+    """Returns this thread's persistent authorized connection for creds, creating it on first use."""
+    import google_auth_httplib2
+    import httplib2
+
+    authed = getattr(_thread_http, 'authed', None)
+    # Credentials are refreshed in place, so the same object keeps working after a refresh
+    if authed is None or authed.credentials is not creds:
+        authed = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(cache=None))
+        _thread_http.authed = authed
+    return authed
+
+def _build_service(creds: Credentials) -> Any:
+    """Builds the Gmail client from the discovery document bundled with googleapiclient."""
+    import google_auth_httplib2
+    import httplib2
+    from googleapiclient.discovery import build
+    from googleapiclient.http import HttpRequest
+
+    def _request_builder(http, *args, **kwargs):
+        # Route every request (and batch, which uses its first request's http) through
+        # the calling thread's pooled connection instead of the shared service http
+        return HttpRequest(_authorized_http(creds), *args, **kwargs)
+
+    # static_discovery avoids fetching the discovery JSON over the network on each build;
+    # cache_discovery=False skips the file cache that static documents don't need
+    return build(
+        'gmail', 'v1',
+        http=google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(cache=None)),
+        requestBuilder=_request_builder,
+        model=_OrjsonModel(data_wrapper=False),
+        static_discovery=True,
+        cache_discovery=False
+    )
+
 def get_gmail_service() -> Optional[Any]:
     """Gets the authenticated Gmail service, using cached service if available/valid."""
     global _gmail_service
+    # Lock-free fast path: a single global read, so concurrent callers only
+    # serialize on _service_lock when the service must be rebuilt or refreshed
+    service = _gmail_service
+    if service is not None:
+        cached_creds = service._http.credentials
+        if cached_creds and cached_creds.valid and not _expires_soon(cached_creds):
+            return service
+
     with _service_lock:
         if _gmail_service:
-            # Heuristic check if cached credentials might be expired. 
+            cached_creds = _gmail_service._http.credentials
             # Real check happens implicitly on API call (HttpError 401).
-            if _gmail_service._http.credentials and _gmail_service._http.credentials.valid:
-                 # Removed debug log
-                 return _gmail_service
-            else:
-                 logger.info("Cached service credentials seem invalid/expired. Re-authenticating.")
-                 _gmail_service = None
+            if cached_creds and cached_creds.valid and not _expires_soon(cached_creds):
+                return _gmail_service
+            # Expired, or about to: refresh the cached client's credentials in place
+            # instead of discarding and rebuilding the whole service. _service_lock makes
+            # this single-flight within the process; other threads wait and reuse it.
+            if cached_creds and cached_creds.refresh_token:
+                logger.info("Cached service credentials expired or expiring, attempting refresh...")
+                # A failed early refresh is fine while the current token is still valid
+                if _refresh_credentials(cached_creds) or cached_creds.valid:
+                    return _gmail_service
+            logger.info("Cached service credentials seem invalid/expired. Re-authenticating.")
+            _gmail_service = None
 
         creds = _load_credentials_from_token_file()
 
@@ -160,7 +407,11 @@ def get_gmail_service() -> Optional[Any]:
             logger.warning("No credentials found in token file. Authentication required.")
             return None 
 
-        if not creds.valid:
+        if creds.valid and _expires_soon(creds) and creds.refresh_token:
+            logger.info("Credentials expiring soon, refreshing early...")
+            # A failed early refresh is fine while the current token is still valid
+            _refresh_credentials(creds)
+        elif not creds.valid:
             if creds.expired and creds.refresh_token:
                 logger.info("Credentials expired, attempting refresh...")
                 creds = _refresh_credentials(creds)
@@ -180,7 +431,7 @@ def get_gmail_service() -> Optional[Any]:
 
         # Build and cache the service if credentials are valid
         try:
-            service = build('gmail', 'v1', credentials=creds)
+            service = _build_service(creds)
             _gmail_service = service 
             logger.info("Gmail service built successfully.")
             return service
@@ -192,18 +443,142 @@ def get_gmail_service() -> Optional[Any]:
 # --- Email Interaction Functions ---
 
 # --- Helper Function --- 
+@functools.lru_cache(maxsize=4096)
+def _parse_from_header_cached(header_value: str) -> Tuple[str, str]:
+    # Repeat correspondents and mailing lists send identical From headers across an inbox
+    name, addr = email.utils.parseaddr(header_value)
+    # Use name if available, otherwise fallback to the address itself
+    return name if name else addr, addr if addr else "Unknown"
+
 def _parse_from_header(header_value: str) -> Tuple[str, str]:
     """Parses a 'From' header into (name, email)."""
     if not header_value:
         return "Unknown", "Unknown"
     try:
-        name, addr = email.utils.parseaddr(header_value)
-        # Use name if available, otherwise fallback to the address itself
-        return name if name else addr, addr if addr else "Unknown"
+        return _parse_from_header_cached(header_value)
     except Exception as e:
         logger.warning(f"Could not parse 'From' header '{header_value}': {e}")
         return header_value, "Unknown" # Fallback
 
+# Gmail bodies are URL-safe base64; translate to the standard alphabet in one pass
+_B64_URLSAFE_TRANS = bytes.maketrans(b'-_', b'+/')
+
+class _TextStripper(HTMLParser):
+    """Collects whitespace-separated words from HTML text nodes outside <script>/<style>."""
+
+    def __init__(self):
+        super().__init__()
+        self.words: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style') and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.words.extend(data.split())
+
+def _decode_body(data: str) -> str:
+    """Decodes a Gmail base64url body straight through binascii, restoring any stripped padding."""
+    raw = data.encode('ascii').translate(_B64_URLSAFE_TRANS)
+    padding = -len(raw) % 4
+    if padding:
+        raw += b'=' * padding
+    return binascii.a2b_base64(raw).decode('utf-8', errors='replace')
+
+def _walk_parts(payload: Dict[str, Any]):
+    """Yields (mime_type, body_data) for every MIME part with inline data, depth-first in document order."""
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        body_data = part.get('body', {}).get('data')
+        if body_data:
+            yield part.get('mimeType', '').lower(), body_data
+        stack.extend(reversed(part.get('parts', [])))
+
+def _html_to_text(html_body: str) -> str:
+    """Extracts visible text from an HTML body, dropping <script>/<style> content."""
+    if lxml_html is not None:
+        try:
+            # lxml parses in C; join text nodes with spaces so adjacent blocks don't run together
+            tree = lxml_html.fromstring(html_body)
+            for element in tree.xpath('//script|//style'):
+                element.drop_tree()
+            return ' '.join(' '.join(tree.itertext()).split())
+        except Exception as parse_err:
+            logger.warning(f"lxml could not parse HTML body, using html.parser stripping: {parse_err}")
+    # Stdlib fallback: stream text events and keep only the words, so a large
+    # marketing email isn't copied again by whole-body substitutions
+    stripper = _TextStripper()
+    stripper.feed(html_body)
+    stripper.close()
+    return ' '.join(stripper.words)
+
+def _fetch_summaries(service: Any, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fetches list-view metadata for one page of message stubs, in list() order."""
+    global _gmail_service
+    # Fetch all metadata in one batched HTTP call (Gmail caps a batch at 100 requests)
+    # instead of a round trip per message. Results are slotted by position so the
+    # list order matches the list() response.
+    summaries: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+    auth_errors: List[HttpError] = []
+
+    def _on_metadata(request_id: str, msg: Dict[str, Any], exception: Optional[Exception]):
+        index = int(request_id)
+        message_id = messages[index]['id']
+        if exception is not None:
+            if isinstance(exception, HttpError):
+                logger.warning(f"HttpError fetching metadata for message {message_id}: {exception}")
+                if exception.resp.status == 401:
+                    auth_errors.append(exception)
+            else:
+                logger.error(f"Unexpected error fetching message {message_id}: {exception}")
+            return # Skip this email
+        try:
+            headers = {header['name'].lower(): header['value'] for header in msg.get('payload', {}).get('headers', [])}
+            from_name, from_email = _parse_from_header(headers.get('from', ''))
+            labels = msg.get('labelIds', [])
+            is_unread = 'UNREAD' in labels
+
+            # Structure for list response model
+            summaries[index] = {
+                'id': message_id,
+                'thread_id': msg.get('threadId', ''),
+                'subject': headers.get('subject', '(No Subject)'),
+                'date': headers.get('date', ''),
+                'snippet': msg.get('snippet', ''), 
+                'from_name': from_name,
+                'from_email': from_email,
+                'unread': is_unread
+            }
+        except Exception as inner_e:
+            logger.error(f"Unexpected error processing message {message_id}: {inner_e}", exc_info=True)
+
+    for start in range(0, len(messages), GMAIL_BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=_on_metadata)
+        for index in range(start, min(start + GMAIL_BATCH_LIMIT, len(messages))):
+            # Fetch only metadata needed for list view
+            batch.add(
+                service.users().messages().get(userId='me', id=messages[index]['id'], format='metadata',
+                                               metadataHeaders=['Subject', 'From', 'Date'],
+                                               fields=EMAIL_SUMMARY_FIELDS),
+                request_id=str(index)
+            )
+        batch.execute()
+
+        if auth_errors:
+            logger.error("Received 401 Unauthorized, clearing cached service.")
+            with _service_lock:
+                _gmail_service = None
+            raise auth_errors[0] # Re-raise auth error
+
+    return [summary for summary in summaries if summary is not None]
+
 def get_emails(service: Any, max_results: int = 10, query: Optional[str] = None) -> List[Dict[str, Any]]:
     """Fetches email summaries (metadata) based on query."""
     global _gmail_service 
@@ -213,52 +588,35 @@ def get_emails(service: Any, max_results: int = 10, query: Optional[str] = None)
     
     effective_query = query if query else "is:unread"
     logger.info(f"Fetching emails with query: '{effective_query}', max_results: {max_results}")
+
+    def _list_page(page_token: Optional[str], page_size: int) -> Dict[str, Any]:
+        return service.users().messages().list(
+            userId='me', q=effective_query, maxResults=page_size, pageToken=page_token
+        ).execute()
     
     try:
-        result = service.users().messages().list(userId='me', q=effective_query, maxResults=max_results).execute()
-        messages = result.get('messages', [])
-        if not messages:
+        emails: List[Dict[str, Any]] = []
+        remaining = max_results
+        # Each thread has its own Gmail connection, so the next list() page can be
+        # requested while the current page's metadata batch is in flight
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            result = _list_page(None, min(remaining, GMAIL_LIST_PAGE_LIMIT))
+            while True:
+                messages = result.get('messages', [])[:remaining]
+                remaining -= len(messages)
+                next_token = result.get('nextPageToken')
+                next_page = None
+                if messages and remaining > 0 and next_token:
+                    next_page = prefetcher.submit(_list_page, next_token, min(remaining, GMAIL_LIST_PAGE_LIMIT))
+                emails.extend(_fetch_summaries(service, messages))
+                if next_page is None:
+                    break
+                result = next_page.result()
+
+        if not emails:
             logger.info("No messages found matching the query.")
             return []
         
-        emails = []
-        for message_info in messages:
-            message_id = message_info['id']
-            try:
-                # Fetch only metadata needed for list view
-                msg = service.users().messages().get(userId='me', id=message_id, format='metadata', 
-                                                   metadataHeaders=['Subject', 'From', 'Date']).execute()
-                
-                headers = {header['name'].lower(): header['value'] for header in msg.get('payload', {}).get('headers', [])}
-                from_name, from_email = _parse_from_header(headers.get('from', ''))
-                labels = msg.get('labelIds', [])
-                is_unread = 'UNREAD' in labels
-
-                # Structure for list response model
-                email_summary = {
-                    'id': message_id,
-                    'thread_id': msg.get('threadId', ''),
-                    'subject': headers.get('subject', '(No Subject)'),
-                    'date': headers.get('date', ''),
-                    'snippet': msg.get('snippet', ''), 
-                    'from_name': from_name,
-                    'from_email': from_email,
-                    'unread': is_unread
-                }
-                emails.append(email_summary)
-
-            except HttpError as inner_error:
-                logger.warning(f"HttpError fetching metadata for message {message_id}: {inner_error}") 
-                if inner_error.resp.status == 401: 
-                     logger.error("Received 401 Unauthorized, clearing cached service.")
-                     with _service_lock:
-                         _gmail_service = None
-                     raise # Re-raise auth error
-                continue # Skip this email on other HttpErrors
-            except Exception as inner_e:
-                logger.error(f"Unexpected error processing message {message_id}: {inner_e}", exc_info=True)
-                continue # Skip this email
-        
         logger.info(f"Successfully fetched {len(emails)} email summaries.")
         return emails
 
@@ -273,6 +631,116 @@ def get_emails(service: Any, max_results: int = 10, query: Optional[str] = None)
         logger.error(f"An unexpected error occurred fetching emails: {e}", exc_info=True)
         raise
 
+def get_history_id(service: Any) -> Optional[str]:
+    """Returns the mailbox's current historyId, to check for changes on a later refresh."""
+    try:
+        return service.users().getProfile(userId='me', fields='historyId').execute().get('historyId')
+    except HttpError as error:
+        logger.warning(f"Could not read mailbox historyId: {error}")
+        return None
+
+def mailbox_changed_since(service: Any, history_id: str) -> Tuple[Optional[bool], Optional[str]]:
+    """
+    Checks users.history for any change (new, deleted or relabelled messages) after
+    history_id, reading at most one record. Returns (changed, latest_history_id);
+    changed is None if the history ID has expired (Gmail keeps about a week) or the
+    check failed, in which case the caller should do a full fetch.
+    """
+    try:
+        response = service.users().history().list(
+            userId='me', startHistoryId=history_id, maxResults=1, fields='history/id,historyId'
+        ).execute()
+    except HttpError as error:
+        if error.resp.status == 404:
+            logger.info(f"History ID {history_id} has expired, a full fetch is needed.")
+        else:
+            logger.warning(f"Could not check mailbox history since {history_id}: {error}")
+        return None, None
+    return bool(response.get('history')), response.get('historyId', history_id)
+
+def _get_cached_details(email_id: str) -> Optional[Dict[str, Any]]:
+    with _details_cache_lock:
+        details = _details_cache.get(email_id)
+        if details is not None:
+            _details_cache.move_to_end(email_id)
+        return details
+
+def _cache_details(email_id: str, details: Dict[str, Any]):
+    if EMAIL_DETAILS_CACHE_SIZE <= 0:
+        return
+    with _details_cache_lock:
+        _details_cache[email_id] = dict(details)
+        _details_cache.move_to_end(email_id)
+        while len(_details_cache) > EMAIL_DETAILS_CACHE_SIZE:
+            _details_cache.popitem(last=False)
+
+def _parse_email_details(msg: Dict[str, Any], email_id: str) -> Dict[str, Any]:
+    """Builds the details dict (headers, decoded body, labels) from a format='full' message."""
+    headers_dict = {
+        header.get('name', '').lower(): header.get('value', '')
+        for header in msg.get('payload', {}).get('headers', ())
+    }
+
+    # --- Body Extraction (Plain Text Preferred, HTML Fallback) --- 
+    body = ''
+    html_body = '' 
+    found_plain = False
+    found_html = False
+    payload = msg.get('payload', {})
+
+    # 1. Walk the MIME tree depth-first (nested multipart/alternative inside
+    #    multipart/mixed included), stopping as soon as a text/plain body is found
+    for mime_type, body_data in _walk_parts(payload):
+        if mime_type == 'text/plain':
+            try:
+                body = _decode_body(body_data)
+            except Exception as decode_err:
+                logger.warning(f"[Email ID: {email_id}] Could not decode text/plain body: {decode_err}")
+                body = "[Could not decode body]"
+            found_plain = True
+            break
+        elif mime_type == 'text/html' and not found_html:
+            try:
+                html_body = _decode_body(body_data)
+                found_html = True
+            except Exception as decode_err:
+                logger.warning(f"[Email ID: {email_id}] Could not decode text/html body: {decode_err}")
+        
+    # 2. If still no plain text body, fall back to stripping HTML
+    if not found_plain and found_html:
+         logger.info(f"[Email ID: {email_id}] No text/plain body found, falling back to stripped HTML.")
+         try:
+             stripped_body = _html_to_text(html_body)
+             if stripped_body:
+                body = stripped_body
+             else:
+                logger.warning(f"[Email ID: {email_id}] Stripped HTML resulted in empty content.")
+                body = "" 
+         except Exception as strip_err:
+             logger.error(f"[Email ID: {email_id}] Error stripping HTML: {strip_err}")
+             body = "[Could not extract body content]" 
+    elif not found_plain and not found_html:
+         logger.warning(f"[Email ID: {email_id}] No text/plain or text/html body found or decoded successfully.")
+         body = "" 
+         
+    # --- End Body Extraction --- 
+         
+    return {
+        'id': msg.get('id'),
+        'thread_id': msg.get('threadId'),
+        'from': headers_dict.get('from', 'Unknown'),
+        'to': headers_dict.get('to', 'Unknown'),
+        'cc': headers_dict.get('cc'), 
+        'bcc': headers_dict.get('bcc'), 
+        'subject': headers_dict.get('subject', '(No Subject)'),
+        'date': headers_dict.get('date', ''),
+        'snippet': msg.get('snippet', ''),
+        'body': body,
+        'labels': msg.get('labelIds', []),
+        'message_id_header': headers_dict.get('message-id'), 
+        'references_header': headers_dict.get('references') 
+    }
+
 def get_email_details(service: Any, email_id: str) -> Optional[Dict[str, Any]]:
     """Fetches full details for a single email by its ID."""
     global _gmail_service 
@@ -283,109 +751,27 @@ def get_email_details(service: Any, email_id: str) -> Optional[Dict[str, Any]]:
     logger.info(f"Fetching details for email ID: {email_id}")
     
     try:
+        cached = _get_cached_details(email_id)
+        if cached is not None:
+            # Headers and body never change for a message id; only its labels do,
+            # so re-fetch just those instead of the full payload
+            msg = service.users().messages().get(
+                userId='me', id=email_id, format='minimal', fields='id,labelIds'
+            ).execute()
+            logger.info(f"Using cached details for email {email_id} (labels refreshed).")
+            return {**cached, 'labels': msg.get('labelIds', [])}
+
         # Request full format and specific headers for replying
         msg = service.users().messages().get(
             userId='me', 
             id=email_id, 
             format='full', 
-            metadataHeaders=['Message-ID', 'References', 'Subject', 'From', 'To', 'Cc', 'Bcc', 'Date']
+            metadataHeaders=['Message-ID', 'References', 'Subject', 'From', 'To', 'Cc', 'Bcc', 'Date'],
+            fields=EMAIL_DETAIL_FIELDS
         ).execute()
         
-        headers_dict = {}
-        raw_headers = {} # Store raw header values if needed later
-        if 'payload' in msg and 'headers' in msg['payload']:
-             for header in msg['payload']['headers']:
-                 name = header.get('name', '').lower()
-                 value = header.get('value', '')
-                 headers_dict[name] = value
-                 raw_headers[header.get('name')] = value
-
-        # --- Body Extraction (Plain Text Preferred, HTML Fallback) --- 
-        body = ''
-        html_body = '' 
-        found_plain = False
-        found_html = False
-        payload = msg.get('payload', {})
-
-        # 1. Traverse parts if they exist
-        if 'parts' in payload:
-            for i, part in enumerate(payload['parts']):
-                mime_type = part.get('mimeType', '').lower()
-                if mime_type == 'text/plain' and not found_plain:
-                    body_data = part.get('body', {}).get('data')
-                    if body_data:
-                        try:
-                            body = base64.urlsafe_b64decode(body_data).decode('utf-8', errors='replace')
-                            found_plain = True
-                        except Exception as decode_err:
-                             logger.warning(f"[Email ID: {email_id}] Could not decode text/plain body part {i}: {decode_err}")
-                             body = "[Could not decode body]"
-                             found_plain = True
-                elif mime_type == 'text/html' and not found_html:
-                     body_data = part.get('body', {}).get('data')
-                     if body_data:
-                          try:
-                              html_body = base64.urlsafe_b64decode(body_data).decode('utf-8', errors='replace')
-                              found_html = True
-                          except Exception as decode_err:
-                              logger.warning(f"[Email ID: {email_id}] Could not decode text/html body part {i}: {decode_err}")
-        
-        # 2. If no plain text found in parts, check top-level body
-        if not found_plain:
-            top_level_mime = payload.get('mimeType', '').lower()
-            top_level_body_data = payload.get('body', {}).get('data')
-            if top_level_body_data:
-                 if top_level_mime == 'text/plain':
-                     try:
-                         body = base64.urlsafe_b64decode(top_level_body_data).decode('utf-8', errors='replace')
-                         found_plain = True
-                     except Exception as decode_err:
-                         logger.warning(f"[Email ID: {email_id}] Could not decode top-level text/plain body: {decode_err}")
-                         body = "[Could not decode body]"
-                         found_plain = True
-                 elif top_level_mime == 'text/html' and not found_html:
-                     try:
-                         html_body = base64.urlsafe_b64decode(top_level_body_data).decode('utf-8', errors='replace')
-                         found_html = True
-                     except Exception as decode_err:
-                          logger.warning(f"[Email ID: {email_id}] Could not decode top-level text/html body: {decode_err}")
-            
-        # 3. If still no plain text body, fall back to stripping HTML
-        if not found_plain and found_html:
-             logger.info(f"[Email ID: {email_id}] No text/plain body found, falling back to stripped HTML.")
-             try:
-                 # Simple regex HTML stripping
-                 stripped_body = re.sub('<[^>]+>', ' ', html_body) # Replace tags with space
-                 stripped_body = re.sub(r'\s+', ' ', stripped_body).strip() # Clean up extra whitespace
-                 if stripped_body:
-                    body = stripped_body
-                 else:
-                    logger.warning(f"[Email ID: {email_id}] Stripped HTML resulted in empty content.")
-                    body = "" 
-             except Exception as strip_err:
-                 logger.error(f"[Email ID: {email_id}] Error stripping HTML: {strip_err}")
-                 body = "[Could not extract body content]" 
-        elif not found_plain and not found_html:
-             logger.warning(f"[Email ID: {email_id}] No text/plain or text/html body found or decoded successfully.")
-             body = "" 
-             
-        # --- End Body Extraction --- 
-             
-        email_details = {
-            'id': msg.get('id'),
-            'thread_id': msg.get('threadId'),
-            'from': headers_dict.get('from', 'Unknown'),
-            'to': headers_dict.get('to', 'Unknown'),
-            'cc': headers_dict.get('cc'), 
-            'bcc': headers_dict.get('bcc'), 
-            'subject': headers_dict.get('subject', '(No Subject)'),
-            'date': headers_dict.get('date', ''),
-            'snippet': msg.get('snippet', ''),
-            'body': body,
-            'labels': msg.get('labelIds', []),
-            'message_id_header': headers_dict.get('message-id'), 
-            'references_header': headers_dict.get('references') 
-        }
+        email_details = _parse_email_details(msg, email_id)
+        _cache_details(email_id, email_details)
         logger.info(f"Successfully fetched details for email {email_id}.")
         return email_details
 
@@ -403,6 +789,118 @@ def get_email_details(service: Any, email_id: str) -> Optional[Dict[str, Any]]:
         logger.error(f"Unexpected error fetching details for email {email_id}: {e}", exc_info=True)
         raise
 
+def _get_prefetch_executor() -> ThreadPoolExecutor:
+    global _prefetch_executor
+    with _prefetch_executor_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(max_workers=EMAIL_PREFETCH_WORKERS,
+                                                    thread_name_prefix='gmail-prefetch')
+        return _prefetch_executor
+
+def get_email_details_batch(service: Any, email_ids: List[str]) -> Dict[str, Any]:
+    """
+    Fetches full details for several emails with batched HTTP requests (up to 100
+    sub-requests per POST) instead of one request each. Returns a dict mapping each
+    ID to its details, None if the message no longer exists, or the exception raised
+    for it. A 401 clears the cached service and is raised.
+    """
+    global _gmail_service
+    if not service:
+        logger.error("Gmail service not available. Cannot fetch email details.")
+        raise ValueError("Gmail service not initialized.")
+
+    results: Dict[str, Any] = {}
+    cached: Dict[str, Dict[str, Any]] = {}
+    auth_errors: List[HttpError] = []
+
+    def _on_message(request_id: str, msg: Dict[str, Any], exception: Optional[Exception]):
+        if exception is not None:
+            if isinstance(exception, HttpError) and exception.resp.status == 404:
+                logger.warning(f"Email with ID {request_id} not found.")
+                results[request_id] = None
+                return
+            logger.error(f"Error fetching details for message {request_id}: {exception}")
+            if isinstance(exception, HttpError) and exception.resp.status == 401:
+                auth_errors.append(exception)
+            results[request_id] = exception
+            return
+        try:
+            if request_id in cached:
+                # Only labels change for a message id; the rest comes from the cache
+                results[request_id] = {**cached[request_id], 'labels': msg.get('labelIds', [])}
+            else:
+                email_details = _parse_email_details(msg, request_id)
+                _cache_details(request_id, email_details)
+                results[request_id] = email_details
+        except Exception as e:
+            logger.error(f"Unexpected error processing details for email {request_id}: {e}", exc_info=True)
+            results[request_id] = e
+
+    unique_ids = list(dict.fromkeys(email_ids))
+    for email_id in unique_ids:
+        details = _get_cached_details(email_id)
+        if details is not None:
+            cached[email_id] = details
+
+    for start in range(0, len(unique_ids), GMAIL_BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=_on_message)
+        for email_id in unique_ids[start:start + GMAIL_BATCH_LIMIT]:
+            if email_id in cached:
+                request = service.users().messages().get(
+                    userId='me', id=email_id, format='minimal', fields='id,labelIds'
+                )
+            else:
+                request = service.users().messages().get(
+                    userId='me',
+                    id=email_id,
+                    format='full',
+                    metadataHeaders=['Message-ID', 'References', 'Subject', 'From', 'To', 'Cc', 'Bcc', 'Date'],
+                    fields=EMAIL_DETAIL_FIELDS
+                )
+            batch.add(request, request_id=email_id)
+        batch.execute()
+
+        if auth_errors:
+            logger.error("Received 401 Unauthorized, clearing cached service.")
+            with _service_lock:
+                _gmail_service = None
+            raise auth_errors[0]
+
+    logger.info(f"Fetched details for {len(unique_ids)} emails in batched requests ({len(cached)} from cache).")
+    return results
+
+def _resolve_details_batch(service: Any, email_ids: List[str], futures: Dict[str, Future]):
+    try:
+        results = get_email_details_batch(service, email_ids)
+    except Exception as e:
+        for email_id in email_ids:
+            futures[email_id].set_exception(e)
+        return
+    for email_id in email_ids:
+        result = results.get(email_id)
+        if isinstance(result, Exception):
+            futures[email_id].set_exception(result)
+        else:
+            futures[email_id].set_result(result)
+
+def prefetch_email_details(service: Any, email_ids: Iterable[str]) -> Dict[str, "Future[Optional[Dict[str, Any]]]"]:
+    """
+    Starts fetching full details for the given messages in the background and returns
+    a future per ID. Each chunk of up to 100 IDs is one batched request on its own
+    worker thread (and Gmail connection), so chunks overlap as well.
+    """
+    unique_ids = list(dict.fromkeys(email_ids))
+    futures: Dict[str, Future] = {}
+    for email_id in unique_ids:
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+        futures[email_id] = future
+
+    executor = _get_prefetch_executor()
+    for start in range(0, len(unique_ids), GMAIL_BATCH_LIMIT):
+        executor.submit(_resolve_details_batch, service, unique_ids[start:start + GMAIL_BATCH_LIMIT], futures)
+    return futures
+
 def send_email(service: Any, to: str, subject: str, body: str, 
                thread_id: Optional[str] = None, 
                in_reply_to: Optional[str] = None, # Value of the Message-ID header of the email being replied to
@@ -419,23 +917,24 @@ def send_email(service: Any, to: str, subject: str, body: str,
         raise ValueError("Gmail service not initialized.")
         
     try:
-        headers = [
-            f"To: {to}",
-            f"Subject: {subject}",
-            "Content-Type: text/plain; charset=utf-8",
-            "MIME-Version: 1.0"
-        ]
+        # EmailMessage handles RFC 2047 encoding of non-ASCII headers and the body's
+        # transfer encoding; the generator writes straight into one bytes buffer
+        message = EmailMessage()
+        message['To'] = to
+        message['Subject'] = subject
         if in_reply_to:
-            headers.append(f"In-Reply-To: {in_reply_to}")
+            message['In-Reply-To'] = in_reply_to
             # Construct References header according to RFC 2822
             effective_references = references if references else ""
             if in_reply_to not in effective_references: 
                  effective_references = f"{effective_references} {in_reply_to}".strip()
             if effective_references: 
-                 headers.append(f"References: {effective_references}")
-        
-        message_text = "\r\n".join(headers) + f"\r\n\r\n{body}"
-        raw_message = base64.urlsafe_b64encode(message_text.encode('utf-8')).decode('utf-8')
+                 message['References'] = effective_references
+        message.set_content(body, subtype='plain', charset='utf-8')
+
+        buffer = io.BytesIO()
+        BytesGenerator(buffer, policy=policy.SMTP).flatten(message)
+        raw_message = base64.urlsafe_b64encode(buffer.getvalue()).decode('ascii')
         message_payload = {'raw': raw_message}
         
         if thread_id:
@@ -506,26 +1005,166 @@ def modify_email_labels(service: Any, message_id: str,
         logger.error(f"Unexpected error modifying labels for message {message_id}: {e}", exc_info=True)
         raise # Re-raise unexpected errors
 
+def modify_email_labels_bulk(service: Any, message_ids: Iterable[str],
+                             labels_to_add: Optional[List[str]] = None,
+                             labels_to_remove: Optional[List[str]] = None) -> bool:
+    """
+    Adds or removes labels on many messages with users.messages.batchModify,
+    one HTTP call per GMAIL_BATCH_MODIFY_LIMIT IDs instead of one per message.
+    Returns True on success, False on failure (logs warning).
+    Raises Exception on critical errors (like auth).
+    """
+    global _gmail_service 
+    if not service:
+        logger.error("Gmail service not available. Cannot modify labels.")
+        raise ValueError("Gmail service not initialized.")
+
+    modify_body = {}
+    if labels_to_add:
+        modify_body['addLabelIds'] = labels_to_add
+    if labels_to_remove:
+        modify_body['removeLabelIds'] = labels_to_remove
+    if not modify_body:
+        return True # Nothing to do
+
+    ids_iter = iter(message_ids)
+    modified = 0
+    try:
+        while True:
+            chunk = list(itertools.islice(ids_iter, GMAIL_BATCH_MODIFY_LIMIT))
+            if not chunk:
+                break
+            service.users().messages().batchModify(
+                userId='me',
+                body={'ids': chunk, **modify_body}
+            ).execute()
+            modified += len(chunk)
+        logger.info(f"Successfully modified labels for {modified} messages. Add: {labels_to_add}, Remove: {labels_to_remove}")
+        return True
+
+    except HttpError as error:
+        logger.warning(f"HttpError bulk-modifying labels after {modified} messages: {error}")
+        if error.resp.status == 401: 
+             logger.error("Received 401 Unauthorized, clearing cached service.")
+             with _service_lock:
+                 _gmail_service = None
+             raise 
+        return False
+    except Exception as e:
+        logger.error(f"Unexpected error bulk-modifying labels: {e}", exc_info=True)
+        raise
+
 # --- OpenAI Interaction Functions ---
 
-def classify_email(email_body: str, email_subject: str) -> str:
-    """Classifies email content using OpenAI."""
+def _get_openai_clients() -> Tuple[Optional["openai.OpenAI"], Optional["openai.AsyncOpenAI"]]:
+    """Returns the shared (sync, async) OpenAI clients, creating them on first use."""
+    global _openai_client, _openai_async_client, _openai_client_key
     openai_api_key = os.getenv("OPENAI_API_KEY")
     if not openai_api_key:
         logger.error("OpenAI API key (OPENAI_API_KEY) not found in environment variables.")
-        return "Error: OpenAI API key not configured" 
+        return None, None
+    with _openai_client_lock:
+        if _openai_client is None or _openai_client_key != openai_api_key:
+            import openai
+            _openai_client = openai.OpenAI(api_key=openai_api_key)
+            _openai_async_client = openai.AsyncOpenAI(api_key=openai_api_key)
+            _openai_client_key = openai_api_key
+        return _openai_client, _openai_async_client
+
+# System message and task instructions are fixed, so build them once instead of on every request
+_EMAIL_SYSTEM_MESSAGE = {"role": "system", "content": prompts.GMAIL_SYSTEM_PROMPT}
+_CLASSIFY_INSTRUCTION = {"role": "user", "content": prompts.GMAIL_CLASSIFY_PROMPT}
+_SUMMARIZE_INSTRUCTION = {"role": "user", "content": prompts.GMAIL_SUMMARIZE_PROMPT}
+_ANALYZE_INSTRUCTION = {"role": "user", "content": prompts.GMAIL_ANALYZE_PROMPT}
 
+def _email_request(email_body: str, email_subject: Optional[str], instruction: Dict[str, str],
+                   model: str = EMAIL_LLM_MODEL, **params: Any) -> Dict[str, Any]:
+    """
+    Builds a chat request as [system, email, task instruction]. The system message and
+    the email (body first, so even calls without a subject match) are identical for every
+    task on the same email, letting OpenAI's automatic prompt caching reuse that prefix;
+    prompt_cache_key routes those calls to the same cache.
+    """
+    email_content = f"Email Body:\n{email_body}"
+    if email_subject is not None:
+        email_content += f"\n\nSubject: {email_subject}"
+    digest = hashlib.blake2b(email_body.encode('utf-8'), digest_size=8).hexdigest()
+    return dict(
+        model=model,
+        messages=[
+            _EMAIL_SYSTEM_MESSAGE,
+            {"role": "user", "content": email_content},
+            instruction
+        ],
+        extra_body={"prompt_cache_key": f"email:{digest}"},
+        **params
+    )
+
+def _classify_request(email_body: str, email_subject: str) -> Dict[str, Any]:
+    return _email_request(email_body, email_subject, _CLASSIFY_INSTRUCTION, model=EMAIL_CLASSIFY_MODEL,
+                          max_tokens=50, temperature=0.1)
+
+def _reply_request(email_body: str, email_subject: str, sender_name: str,
+                   tone: str, style: str, length: str, user_context: str,
+                   previous_draft: Optional[str] = None) -> Dict[str, Any]:
+    instruction = prompts.GMAIL_GENERATE_REPLY_PROMPT.format(
+        sender_name=sender_name,
+        tone=tone,
+        style=style,
+        length=length,
+        user_context=user_context
+    )
+    if previous_draft:
+        # Predicted Outputs: the model verifies the previous draft's tokens in bulk instead
+        # of decoding each one, so redrafting in another tone/length mostly reuses it.
+        # The API doesn't allow a token limit together with a prediction.
+        return _email_request(email_body, email_subject, {"role": "user", "content": instruction},
+                              prediction={"type": "content", "content": previous_draft}, temperature=0.7)
+    return _email_request(email_body, email_subject, {"role": "user", "content": instruction},
+                          max_tokens=500, temperature=0.7)
+
+def _summarize_request(email_body: str) -> Dict[str, Any]:
+    return _email_request(email_body, None, _SUMMARIZE_INSTRUCTION, max_tokens=150, temperature=0.3)
+
+def _analyze_request(email_body: str, email_subject: str) -> Dict[str, Any]:
+    return _email_request(email_body, email_subject, _ANALYZE_INSTRUCTION,
+                          response_format={"type": "json_object"}, max_tokens=250, temperature=0.2)
+
+def _parse_analysis(content: str) -> Optional[Dict[str, str]]:
     try:
-        client = openai.OpenAI(api_key=openai_api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": prompts.GMAIL_CLASSIFY_PROMPT},
-                {"role": "user", "content": f"Subject: {email_subject}\n\nBody: {email_body}"}
-            ],
-            max_tokens=50,
-            temperature=0.1 
-        )
+        analysis = orjson.loads(content)
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(analysis, dict):
+        return None
+    category, summary = analysis.get('category'), analysis.get('summary')
+    if not isinstance(category, str) or not isinstance(summary, str) or not category.strip():
+        return None
+    return {'category': category.strip(), 'summary': summary.strip()}
+
+def classify_email(email_body: str, email_subject: str) -> str:
+    """Classifies email content using OpenAI."""
+    client, _ = _get_openai_clients()
+    if client is None:
+        return "Error: OpenAI API key not configured"
+
+    try:
+        response = client.chat.completions.create(**_classify_request(email_body, email_subject))
+        classification = response.choices[0].message.content.strip()
+        logger.info(f"Email classified as: {classification}")
+        return classification
+    except Exception as e:
+        logger.error(f"OpenAI API call failed during classification: {e}", exc_info=True)
+        return "Error: Classification failed"
+
+async def classify_email_async(email_body: str, email_subject: str) -> str:
+    """Async variant of classify_email; fan out over several emails with asyncio.gather."""
+    _, client = _get_openai_clients()
+    if client is None:
+        return "Error: OpenAI API key not configured"
+
+    try:
+        response = await client.chat.completions.create(**_classify_request(email_body, email_subject))
         classification = response.choices[0].message.content.strip()
         logger.info(f"Email classified as: {classification}")
         return classification
@@ -534,33 +1173,17 @@ def classify_email(email_body: str, email_subject: str) -> str:
         return "Error: Classification failed"
 
 def generate_reply(email_body: str, email_subject: str, sender_name: str, 
-                   tone: str, style: str, length: str, user_context: str = "N/A") -> str:
+                   tone: str, style: str, length: str, user_context: str = "N/A",
+                   previous_draft: Optional[str] = None) -> str:
     """Generates an email reply using OpenAI."""
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if not openai_api_key:
-        logger.error("OpenAI API key (OPENAI_API_KEY) not found in environment variables.")
+    client, _ = _get_openai_clients()
+    if client is None:
         return "Error: OpenAI API key not configured"
     
     try:
-        client = openai.OpenAI(api_key=openai_api_key)
-        prompt_content = prompts.GMAIL_GENERATE_REPLY_PROMPT.format(
-            sender_name=sender_name,
-            email_subject=email_subject,
-            email_body=email_body,
-            tone=tone,
-            style=style,
-            length=length,
-            user_context=user_context
-        )
-        
         response = client.chat.completions.create(
-            model="gpt-4o", 
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that drafts email replies."},
-                {"role": "user", "content": prompt_content}
-            ],
-            max_tokens=500, 
-            temperature=0.7
+            **_reply_request(email_body, email_subject, sender_name, tone, style, length, user_context,
+                             previous_draft)
         )
         reply = response.choices[0].message.content.strip()
         logger.info(f"Generated reply (length: {len(reply)} chars).")
@@ -569,27 +1192,201 @@ def generate_reply(email_body: str, email_subject: str, sender_name: str,
         logger.error(f"OpenAI API call failed during reply generation: {e}", exc_info=True)
         return "Error: Failed to generate reply"
 
+async def generate_reply_async(email_body: str, email_subject: str, sender_name: str,
+                               tone: str, style: str, length: str, user_context: str = "N/A",
+                               previous_draft: Optional[str] = None) -> str:
+    """Async variant of generate_reply."""
+    _, client = _get_openai_clients()
+    if client is None:
+        return "Error: OpenAI API key not configured"
+
+    try:
+        response = await client.chat.completions.create(
+            **_reply_request(email_body, email_subject, sender_name, tone, style, length, user_context,
+                             previous_draft)
+        )
+        reply = response.choices[0].message.content.strip()
+        logger.info(f"Generated reply (length: {len(reply)} chars).")
+        return reply
+    except Exception as e:
+        logger.error(f"OpenAI API call failed during reply generation: {e}", exc_info=True)
+        return "Error: Failed to generate reply"
+
+def generate_reply_stream(email_body: str, email_subject: str, sender_name: str,
+                          tone: str, style: str, length: str, user_context: str = "N/A",
+                          previous_draft: Optional[str] = None) -> Iterator[str]:
+    """
+    Streaming variant of generate_reply: yields reply text as the model produces it.
+    Pass the last draft for the same email as previous_draft to speed up redrafts.
+    """
+    client, _ = _get_openai_clients()
+    if client is None:
+        yield "Error: OpenAI API key not configured"
+        return
+
+    produced = 0
+    try:
+        stream = client.chat.completions.create(
+            **_reply_request(email_body, email_subject, sender_name, tone, style, length, user_context,
+                             previous_draft),
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                produced += len(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        logger.info(f"Streamed reply (length: {produced} chars).")
+    except Exception as e:
+        logger.error(f"OpenAI API call failed during reply generation: {e}", exc_info=True)
+        yield "\n\nError: Reply generation was interrupted" if produced else "Error: Failed to generate reply"
+
 def summarize_email(email_body: str) -> str:
     """Summarizes email content using OpenAI."""
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if not openai_api_key:
-        logger.error("OpenAI API key (OPENAI_API_KEY) not found in environment variables.")
+    client, _ = _get_openai_clients()
+    if client is None:
         return "Error: OpenAI API key not configured"
 
     try:
-        client = openai.OpenAI(api_key=openai_api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": prompts.GMAIL_SUMMARIZE_PROMPT},
-                {"role": "user", "content": email_body}
-            ],
-            max_tokens=150,
-            temperature=0.3
-        )
+        response = client.chat.completions.create(**_summarize_request(email_body))
+        summary = response.choices[0].message.content.strip()
+        logger.info(f"Generated summary (length: {len(summary)} chars).")
+        return summary
+    except Exception as e:
+        logger.error(f"OpenAI API call failed during summarization: {e}", exc_info=True)
+        return "Error: Failed to generate summary"
+
+async def summarize_email_async(email_body: str) -> str:
+    """Async variant of summarize_email; fan out over several emails with asyncio.gather."""
+    _, client = _get_openai_clients()
+    if client is None:
+        return "Error: OpenAI API key not configured"
+
+    try:
+        response = await client.chat.completions.create(**_summarize_request(email_body))
         summary = response.choices[0].message.content.strip()
         logger.info(f"Generated summary (length: {len(summary)} chars).")
         return summary
     except Exception as e:
         logger.error(f"OpenAI API call failed during summarization: {e}", exc_info=True)
         return "Error: Failed to generate summary"
+
+def _count_tokens(text: str) -> int:
+    """Token count under the gpt-4o encoding, or a chars/4 estimate if tiktoken is unavailable."""
+    global _token_encoding
+    if _token_encoding is None:
+        try:
+            import tiktoken
+            _token_encoding = tiktoken.encoding_for_model("gpt-4o")
+        except Exception as e:  # ImportError, or no network to fetch the encoding
+            logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+            _token_encoding = False
+    if _token_encoding is False:
+        return len(text) // 4
+    return len(_token_encoding.encode(text, disallowed_special=()))
+
+def bucketize(emails: List[Dict[str, Any]],
+              boundaries: Tuple[int, ...] = EMAIL_LENGTH_BUCKETS) -> List[List[Dict[str, Any]]]:
+    """
+    Groups emails by body token count into the buckets <= boundaries[0], <= boundaries[1], ...
+    and a final overflow bucket. Counts are cached on each dict as '_tokens'. Empty buckets
+    are dropped; the rest are returned shortest first.
+    """
+    buckets: List[List[Dict[str, Any]]] = [[] for _ in range(len(boundaries) + 1)]
+    for e in emails:
+        tokens = e.get('_tokens')
+        if tokens is None:
+            tokens = e['_tokens'] = _count_tokens(e['body'])
+        buckets[bisect.bisect_left(boundaries, tokens)].append(e)
+    return [bucket for bucket in buckets if bucket]
+
+def _pending_longest_first(emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Emails still missing a category or summary, longest bucket first so the slowest
+    requests start early instead of trailing at the end of the pool."""
+    pending = [e for e in emails if '_category' not in e or '_summary' not in e]
+    return [e for bucket in reversed(bucketize(pending)) for e in bucket]
+
+def analyze_email(email_body: str, email_subject: str) -> Dict[str, str]:
+    """
+    Classifies and summarizes an email in one OpenAI call (the two tasks share the whole
+    input). Falls back to separate classify/summarize calls if the joint response
+    can't be parsed. Returns {'category': ..., 'summary': ...}.
+    """
+    client, _ = _get_openai_clients()
+    if client is None:
+        error = "Error: OpenAI API key not configured"
+        return {'category': error, 'summary': error}
+
+    try:
+        response = client.chat.completions.create(**_analyze_request(email_body, email_subject))
+        analysis = _parse_analysis(response.choices[0].message.content or '')
+        if analysis is not None:
+            logger.info(f"Email analyzed as: {analysis['category']} (summary length: {len(analysis['summary'])} chars).")
+            return analysis
+        logger.warning("Could not parse joint email analysis, falling back to separate calls.")
+    except Exception as e:
+        logger.error(f"OpenAI API call failed during email analysis: {e}", exc_info=True)
+    return {'category': classify_email(email_body, email_subject), 'summary': summarize_email(email_body)}
+
+async def analyze_email_async(email_body: str, email_subject: str) -> Dict[str, str]:
+    """Async variant of analyze_email."""
+    _, client = _get_openai_clients()
+    if client is None:
+        error = "Error: OpenAI API key not configured"
+        return {'category': error, 'summary': error}
+
+    try:
+        response = await client.chat.completions.create(**_analyze_request(email_body, email_subject))
+        analysis = _parse_analysis(response.choices[0].message.content or '')
+        if analysis is not None:
+            logger.info(f"Email analyzed as: {analysis['category']} (summary length: {len(analysis['summary'])} chars).")
+            return analysis
+        logger.warning("Could not parse joint email analysis, falling back to separate calls.")
+    except Exception as e:
+        logger.error(f"OpenAI API call failed during email analysis: {e}", exc_info=True)
+    category, summary = await asyncio.gather(
+        classify_email_async(email_body, email_subject), summarize_email_async(email_body)
+    )
+    return {'category': category, 'summary': summary}
+
+async def batch_classify_and_summarize_async(emails: List[Dict[str, Any]],
+                                             concurrency: int = EMAIL_LLM_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Classifies and summarizes every email (one joint call each) in one concurrent fan-out,
+    storing the results on each dict as '_category' and '_summary'. Emails that already
+    have both are skipped.
+    """
+    pending = _pending_longest_first(emails)
+    if not pending:
+        return emails
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    results = await asyncio.gather(*(bounded(analyze_email_async(e['body'], e['subject'])) for e in pending))
+    for e, analysis in zip(pending, results):
+        e['_category'] = analysis['category']
+        e['_summary'] = analysis['summary']
+    logger.info(f"Prepared classification and summary for {len(pending)} emails.")
+    return emails
+
+def batch_classify_and_summarize(emails: List[Dict[str, Any]],
+                                 concurrency: int = EMAIL_LLM_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Sync counterpart of batch_classify_and_summarize_async. Fans out over the sync client
+    on a thread pool: the shared async client can't be reused across asyncio.run loops.
+    """
+    pending = _pending_longest_first(emails)
+    if not pending:
+        return emails
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        analyses = [executor.submit(analyze_email, e['body'], e['subject']) for e in pending]
+        for e, analysis in zip(pending, analyses):
+            result = analysis.result()
+            e['_category'] = result['category']
+            e['_summary'] = result['summary']
+    logger.info(f"Prepared classification and summary for {len(pending)} emails.")
+    return emails
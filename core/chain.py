@@ -1,9 +1,33 @@
-from langchain_groq import ChatGroq
+import functools
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 import config.settings as settings
 import config.prompts as prompts
 
+# Parsed once; the template is immutable and shared by every chain
+_PROMPT = ChatPromptTemplate.from_template(prompts.RAG_SYSTEM_PROMPT)
+
+@functools.lru_cache(maxsize=16)
+def _build_chain(model_name, temperature, streaming):
+    """
+    Composes the RAG chain for one (model, temperature, streaming) combination.
+    Cached so every request reuses the same ChatGroq client and its connection pool;
+    initialization errors propagate and are not cached.
+    """
+    # Imported on first use so modules that only need the prompt/parsing pieces
+    # don't load the Groq client stack
+    from langchain_groq import ChatGroq
+    lama = ChatGroq(
+        temperature=temperature,
+        groq_api_key=settings.GROQ_API_KEY,
+        model_name=model_name,
+        streaming=streaming,
+    )
+    if streaming:
+        # Note: we don't add StrOutputParser for streaming as it's handled differently
+        return _PROMPT | lama
+    return _PROMPT | lama | StrOutputParser()
+
 def get_chain(model_name=None, temperature=None):
     """
     Creates a RAG chain with the specified model and temperature, using defaults from settings if not provided.
@@ -17,20 +41,11 @@ def get_chain(model_name=None, temperature=None):
         return None
         
     try:
-        lama = ChatGroq(
-            temperature=effective_temperature,
-            groq_api_key=settings.GROQ_API_KEY,
-            model_name=effective_model_name,
-        )
+        return _build_chain(effective_model_name, effective_temperature, False)
     except Exception as e:
         print(f"Error initializing ChatGroq: {e}")
         return None
 
-    parser = StrOutputParser()
-    prompt_template = ChatPromptTemplate.from_template(prompts.RAG_SYSTEM_PROMPT)
-    chain = prompt_template | lama | parser
-    return chain
-
 def get_streaming_chain(model_name=None, temperature=None):
     """
     Creates a streaming-capable RAG chain with the specified model and temperature.
@@ -45,21 +60,11 @@ def get_streaming_chain(model_name=None, temperature=None):
         return None
         
     try:
-        lama = ChatGroq(
-            temperature=effective_temperature,
-            groq_api_key=settings.GROQ_API_KEY,
-            model_name=effective_model_name,
-            streaming=True,  # Enable streaming mode
-        )
+        return _build_chain(effective_model_name, effective_temperature, True)
     except Exception as e:
         print(f"Error initializing ChatGroq with streaming: {e}")
         return None
 
-    prompt_template = ChatPromptTemplate.from_template(prompts.RAG_SYSTEM_PROMPT)
-    chain = prompt_template | lama 
-    # Note: we don't add StrOutputParser for streaming as it's handled differently
-    return chain
-
 def ask_question(chain, question, context, conversation_history: list = None):
     """
     Generate a response using the provided chain, context, and history.
@@ -1,12 +1,17 @@
-import fitz
-from newspaper import Article
-from time import sleep
+import asyncio
 import hashlib
-from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.proxies import WebshareProxyConfig
 import os
+import re
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from tenacity import retry, stop_after_attempt, wait_fixed
 
+# fitz, newspaper, aiohttp and youtube_transcript_api are imported inside the functions
+# that use them, so a PDF-only request doesn't load the web/YouTube stacks (and
+# spawned PDF workers stay light)
+
 # Try to import the C++ implementations first, fall back to Python if not available
 try:
     from core.cpp_modules import hash_generator
@@ -24,6 +29,40 @@ except ImportError:
     USE_CPP_PDF = False
     print("C++ PDF extractor not available, using Python implementation")
 
+# Large PDFs are split into page ranges across worker processes. PyMuPDF documents
+# aren't thread-safe, so each worker opens its own copy from the bytes
+PDF_PARALLEL_MIN_PAGES = 200
+PDF_MAX_WORKERS = min(os.cpu_count() or 1, 8)
+
+def _extract_page_range(pdf_path, start, stop):
+    import fitz
+    with fitz.open(pdf_path) as pdf_document:
+        return "".join(pdf_document[page_number].get_text() for page_number in range(start, stop))
+
+def _extract_pdf_text(file_content):
+    import fitz
+    with fitz.open("pdf", file_content) as pdf_document:
+        page_count = pdf_document.page_count
+        if page_count < PDF_PARALLEL_MIN_PAGES or PDF_MAX_WORKERS < 2:
+            # Collect page texts and join once instead of growing one string per page
+            return "".join(page.get_text() for page in pdf_document)
+
+    # Workers open the PDF from a temp file rather than each receiving a pickled copy
+    # of the whole document
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as pdf_file:
+        pdf_file.write(file_content)
+    try:
+        step = -(-page_count // PDF_MAX_WORKERS)
+        # spawn, not fork: this runs inside a threaded server
+        with ProcessPoolExecutor(max_workers=PDF_MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [
+                executor.submit(_extract_page_range, pdf_file.name, start, min(start + step, page_count))
+                for start in range(0, page_count, step)
+            ]
+            return "".join(future.result() for future in futures)
+    finally:
+        os.remove(pdf_file.name)
+
 def extract_text_from_pdf(file):
     try:
         file_content = file.read()
@@ -35,9 +74,8 @@ def extract_text_from_pdf(file):
                 return text, pdf_hash
             except Exception as e:
                 print(f"C++ PDF extraction failed, falling back to Python: {e}")
-                # Fall back to Python implementation on error
-                file.seek(0)  # Reset file pointer
-                file_content = file.read()
+                # Fall back to Python implementation on error; file_content still
+                # holds the bytes, so there's no need to read the file again
         
         # Python implementation
         if USE_CPP_HASH:
@@ -48,22 +86,33 @@ def extract_text_from_pdf(file):
             pdf_hash = hashlib.sha256(file_content).hexdigest()
             
         # Use Python implementation for PDF extraction
-        pdf_document = fitz.open("pdf", file_content)
-        all_text = ""
-        for page_number in range(pdf_document.page_count):
-            page = pdf_document[page_number]
-            all_text += page.get_text()
-        pdf_document.close()
-        return all_text, pdf_hash
+        return _extract_pdf_text(file_content), pdf_hash
     except Exception as e:
         return f"Error reading PDF: {e}", None
 
-def extract_text_from_url(url, retries=3):
+URL_FETCH_TIMEOUT_SECONDS = 30
+URL_BATCH_CONCURRENCY = 8
+
+async def _fetch_article(session, url):
+    from newspaper import Article
+    article = Article(url)
+    async with session.get(url, headers={"User-Agent": article.config.browser_user_agent}) as response:
+        response.raise_for_status()
+        html = await response.text(errors="replace")
+    # newspaper's parse is CPU-only once the HTML is in hand
+    article.download(input_html=html)
+    article.parse()
+    return article
+
+async def extract_text_from_url_async(url, retries=3, session=None):
+    if session is None:
+        import aiohttp
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=URL_FETCH_TIMEOUT_SECONDS)) as own_session:
+            return await extract_text_from_url_async(url, retries, own_session)
+
     for attempt in range(retries):
         try:
-            article = Article(url)
-            article.download()
-            article.parse()
+            article = await _fetch_article(session, url)
 
             if len(article.text.strip()) == 0:
                 raise ValueError("No text extracted. The article might be behind a paywall or inaccessible.")
@@ -71,42 +120,80 @@ def extract_text_from_url(url, retries=3):
             return article.text, url
         except Exception as e:
             if attempt < retries - 1:
-                sleep(2)
+                await asyncio.sleep(2)
                 continue
             return f"Error processing URL after {retries} attempts: {e}", None
 
-def extract_transcript_details(youtube_video_url):
-    try:
-        if "v=" in youtube_video_url:
-            video_id = youtube_video_url.split("v=")[1].split("&")[0]
-        elif "youtu.be/" in youtube_video_url:
-            video_id = youtube_video_url.split("youtu.be/")[1].split("?")[0]
-        else:
-            return "Error: Invalid YouTube URL format.", None
+async def extract_urls_batch(urls, retries=3, concurrency=URL_BATCH_CONCURRENCY):
+    """Fetch many URLs over one connection pool, at most `concurrency` at a time, in input order"""
+    import aiohttp
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=URL_FETCH_TIMEOUT_SECONDS)) as session:
+        async def _extract(url):
+            async with semaphore:
+                return await extract_text_from_url_async(url, retries, session)
+        return await asyncio.gather(*(_extract(url) for url in urls))
 
-        # Get Webshare credentials from environment variables
-        proxy_username = os.environ.get("WEBSHARE_USERNAME")
-        proxy_password = os.environ.get("WEBSHARE_PASSWORD")
-        
-        if proxy_username and proxy_password:
-            # Use Webshare's dedicated integration with retries
-            @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-            def fetch_with_retry():
+def extract_text_from_url(url, retries=3):
+    return asyncio.run(extract_text_from_url_async(url, retries))
+
+TRANSCRIPT_BATCH_CONCURRENCY = 8
+
+# Video ID from watch?v=... / &v=..., /embed/..., /shorts/... or youtu.be/... links
+_YT_ID_RE = re.compile(r"(?:v=|/embed/|/shorts/|youtu\.be/)([A-Za-z0-9_-]{11})")
+
+# One transcript client per process, so its HTTP session (and proxy connections)
+# are reused across videos
+_ytt_api = None
+_ytt_api_uses_proxy = False
+_ytt_api_lock = threading.Lock()
+
+def _get_transcript_api():
+    global _ytt_api, _ytt_api_uses_proxy
+    with _ytt_api_lock:
+        if _ytt_api is None:
+            from youtube_transcript_api import YouTubeTranscriptApi
+            from youtube_transcript_api.proxies import WebshareProxyConfig
+            # Get Webshare credentials from environment variables
+            proxy_username = os.environ.get("WEBSHARE_USERNAME")
+            proxy_password = os.environ.get("WEBSHARE_PASSWORD")
+            if proxy_username and proxy_password:
                 proxy_config = WebshareProxyConfig(
                     proxy_username=proxy_username,
                     proxy_password=proxy_password
                 )
-                ytt_api = YouTubeTranscriptApi(proxy_config=proxy_config)
-                return ytt_api.fetch(video_id)
-            
-            transcript_list = fetch_with_retry()
+                _ytt_api = YouTubeTranscriptApi(proxy_config=proxy_config)
+                _ytt_api_uses_proxy = True
+            else:
+                _ytt_api = YouTubeTranscriptApi()
+        return _ytt_api, _ytt_api_uses_proxy
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
+def _fetch_transcript_with_retry(ytt_api, video_id):
+    return ytt_api.fetch(video_id)
+
+def extract_video_id(youtube_video_url):
+    """Return the 11-character video ID from a YouTube URL, or None if there isn't one"""
+    match = _YT_ID_RE.search(youtube_video_url)
+    return match.group(1) if match else None
+
+
+def extract_transcript_details(youtube_video_url):
+    try:
+        video_id = extract_video_id(youtube_video_url)
+        if not video_id:
+            return "Error: Invalid YouTube URL format.", None
+
+        ytt_api, uses_proxy = _get_transcript_api()
+        if uses_proxy:
+            # Use Webshare's dedicated integration with retries
+            transcript_list = _fetch_transcript_with_retry(ytt_api, video_id)
         else:
             # Fall back to direct connection (might fail on Heroku)
-            ytt_api = YouTubeTranscriptApi()
             transcript_list = ytt_api.fetch(video_id)
 
         # The returned object is a FetchedTranscript, convert to the format expected by the rest of the code
-        transcript = " ".join([snippet.text for snippet in transcript_list])
+        transcript = " ".join(snippet.text for snippet in transcript_list)
 
         if not transcript:
             return "Error: Could not retrieve transcript (may be disabled for this video).", f"youtube_{video_id}"
@@ -117,4 +204,18 @@ def extract_transcript_details(youtube_video_url):
         video_id_on_error = None
         if 'video_id' in locals():
             video_id_on_error = f"youtube_{video_id}"
-        return f"Error retrieving transcript: {e}", video_id_on_error
\ No newline at end of file
+        return f"Error retrieving transcript: {e}", video_id_on_error
+
+async def extract_transcript_details_async(youtube_video_url):
+    # youtube_transcript_api is blocking; run it in a thread so many videos can overlap
+    return await asyncio.to_thread(extract_transcript_details, youtube_video_url)
+
+async def extract_transcripts_batch(youtube_video_urls, concurrency=TRANSCRIPT_BATCH_CONCURRENCY):
+    """Fetch many transcripts concurrently (bounded for proxy rate limits), in input order"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _extract(url):
+        async with semaphore:
+            return await extract_transcript_details_async(url)
+
+    return await asyncio.gather(*(_extract(url) for url in youtube_video_urls))
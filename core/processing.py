@@ -1,6 +1,5 @@
+import re
 import time
-from urllib.parse import urlparse
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
 # Try to import the C++ chunker first, fall back to Python if not available
@@ -12,73 +11,113 @@ except ImportError:
     USE_CPP_CHUNKER = False
     print("C++ text chunker not available, using Python implementation")
 
+# scheme://[www.]host — the host (netloc, without a leading "www.") becomes the domain
+_URL_RE = re.compile(r"^[a-z][a-z0-9+.-]*://(?:www\.)?(?P<host>[^/?#]+)", re.IGNORECASE)
+
+# Fixed per-type metadata, merged with the per-source fields in process_content
+_YOUTUBE_METADATA = {"source_type": "youtube", "display_name": "YouTube"}
+_URL_METADATA = {"source_type": "url"}
+_IMAGE_METADATA = {"source_type": "image"}
+_PDF_METADATA = {"source_type": "pdf", "display_name": "PDF document"}
+
+# Preferred break points for the Python splitter, strongest first
+_SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+def split_text_by_offsets(text, chunk_size, chunk_overlap):
+    """
+    Split text into chunks of at most chunk_size characters, breaking at the strongest
+    separator inside each window and stepping back chunk_overlap characters between chunks.
+    
+    Break points are found with str.rfind over the window, so only the final chunk
+    strings are ever materialized.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+
+    chunks = []
+    text_length = len(text)
+    start = 0
+    while start < text_length:
+        end = min(start + chunk_size, text_length)
+        if end < text_length:
+            for separator in _SEPARATORS:
+                cut = text.rfind(separator, start + 1, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= text_length:
+            break
+
+        # Step back for the overlap, starting the next chunk on a word boundary
+        next_start = max(end - chunk_overlap, start + 1)
+        if next_start < end:
+            space = text.find(" ", next_start, end)
+            if space != -1:
+                next_start = space + 1
+        start = next_start
+    return chunks
+
 # Function to split content into chunks and add metadata/IDs
 def process_content(content, chunk_size, chunk_overlap, source_id):
     if not source_id:  # Don't process if we don't have a source identifier
         return [], []
 
     # Extract domain from URL if applicable
-    domain_name = None
-    if "://" in source_id:
-        try:
-            parsed_url = urlparse(source_id)
-            domain_name = parsed_url.netloc
-            if domain_name.startswith('www.'):
-                domain_name = domain_name[4:]
-        except:
-            domain_name = source_id.split("://")[1].split("/")[0]
+    url_match = _URL_RE.match(source_id)
+    domain_name = url_match.group("host") if url_match else None
 
-    # Determine source type and create rich metadata
-    source_metadata = {
+    # Source-level fields shared by every chunk of this source
+    base_metadata = {
         "source_id": source_id,
-        "source_type": "unknown",
-        "title": "Untitled Document",
         "ingestion_timestamp": time.time(),  # timestamp for potential sorting/filtering later
     }
     
     # Set source_type and specific metadata based on source_id pattern
     if source_id.startswith("youtube_"):
-        video_id = source_id.replace("youtube_", "")
-        source_metadata.update({
-            "source_type": "youtube",
+        video_id = source_id[len("youtube_"):]
+        source_metadata = {
+            **_YOUTUBE_METADATA,
+            **base_metadata,
             "title": f"YouTube Video: {video_id}",
             "url": f"https://www.youtube.com/watch?v={video_id}",
             "citation_text": f"YouTube video ({video_id})",
-            "display_name": "YouTube"
-        })
+        }
     elif domain_name:  # Handle URLs where a domain was successfully extracted
-        source_metadata.update({
-            "source_type": "url",
-            "title": source_id.split("/")[-1] if "/" in source_id else source_id,
+        source_metadata = {
+            **_URL_METADATA,
+            **base_metadata,
+            "title": source_id.rsplit("/", 1)[-1],
             "url": source_id,
             "domain": domain_name,
             "citation_text": f"Web article at {source_id}",
-            "display_name": domain_name
-        })
+            "display_name": domain_name,
+        }
     # Check if content starts with image source marker
-    elif isinstance(content, str) and content.lstrip().startswith("IMAGE SOURCE:"):
-        # Extract image filename from marker
-        first_line = content.lstrip().split("\n")[0]
-        filename = first_line.replace("IMAGE SOURCE:", "").strip()
-        short_id = source_id[:8] + "..." if len(source_id) > 8 else source_id
-        source_metadata.update({
-            "source_type": "image",
+    elif isinstance(content, str) and (stripped_content := content.lstrip()).startswith("IMAGE SOURCE:"):
+        # Extract image filename from marker (only the first line, not the whole OCR text)
+        filename = stripped_content.partition("\n")[0][len("IMAGE SOURCE:"):].strip()
+        source_metadata = {
+            **_IMAGE_METADATA,
+            **base_metadata,
             "title": f"Image: {filename}",
             "citation_text": f"Image: {filename}",
-            "display_name": filename
-        })
+            "display_name": filename,
+        }
     else:  # Assume PDF (or other document types) identified by hash
         short_id = source_id[:8] + "..." if len(source_id) > 8 else source_id
-        source_metadata.update({
-            "source_type": "pdf",
+        source_metadata = {
+            **_PDF_METADATA,
+            **base_metadata,
             "title": f"PDF Document (ID: {short_id})",
             "citation_text": f"PDF document ({short_id})",
-            "display_name": "PDF document"
-        })
-
-    base_document = Document(page_content=content, metadata=source_metadata)
+        }
 
     # Use the C++ chunker if available, otherwise fall back to Python
+    raw_chunks = None
     if USE_CPP_CHUNKER:
         try:
             # Ensure content is treated as a string.
@@ -86,41 +125,29 @@ def process_content(content, chunk_size, chunk_overlap, source_id):
 
             # Use C++ implementation for text chunking
             raw_chunks = text_chunker.split_text_with_word_count(content_str, chunk_size, chunk_overlap)
-
-            # Create Document objects with metadata
-            split_chunks = []
-            for chunk_text in raw_chunks:
-                doc = Document(
-                    page_content=chunk_text,
-                    metadata=base_document.metadata.copy() # Use metadata from base_document
-                )
-                split_chunks.append(doc)
         except Exception as e:
             print(f"C++ text chunking failed, falling back to Python: {e}")
             # Fall back to Python implementation on error
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            split_chunks = text_splitter.split_documents([base_document])
-    else:
-        # Use the original Python implementation
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        split_chunks = text_splitter.split_documents([base_document])
+    if raw_chunks is None:
+        raw_chunks = split_text_by_offsets(str(content), chunk_size, chunk_overlap)
 
-    # Process each chunk: add sequence info and generate final Pinecone IDs
+    # Build each chunk's metadata in one dict literal from the shared source-level
+    # fields plus its sequence info, and generate final Pinecone IDs
+    chunk_total = len(raw_chunks)
+    citation_prefix = source_metadata.get("citation_text")
     chunk_ids = []
     processed_chunks = []
     
-    for i, chunk in enumerate(split_chunks):
-        chunk.metadata["chunk_sequence"] = i
-        chunk.metadata["chunk_total"] = len(split_chunks)
+    for i, chunk_text in enumerate(raw_chunks):
+        metadata = {**source_metadata, "chunk_sequence": i, "chunk_total": chunk_total}
         
         # Augment citation text with chunk info for more precise referencing
-        if "citation_text" in chunk.metadata:
+        if citation_prefix is not None:
             # Keep original citation, but add sequence info to a separate field for backend use
-            chunk.metadata["citation_text_full"] = f"{chunk.metadata['citation_text']} (section {i+1} of {len(split_chunks)})"
+            metadata["citation_text_full"] = f"{citation_prefix} (section {i+1} of {chunk_total})"
         
         # Create a unique ID for Pinecone upsert (source + chunk index)
-        pinecone_id = f"{source_id}_{i}"
-        chunk_ids.append(pinecone_id)
-        processed_chunks.append(chunk)
+        chunk_ids.append(f"{source_id}_{i}")
+        processed_chunks.append(Document(page_content=chunk_text, metadata=metadata))
 
-    return processed_chunks, chunk_ids
\ No newline at end of file
+    return processed_chunks, chunk_ids
@@ -1,11 +1,31 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import Pinecone
 import os
+import asyncio
 import logging
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+def get_source_chunk_count(vector_store, source_id):
+    """
+    Look up how many chunks are stored for a source by fetching its first chunk by ID.
+    
+    Chunk IDs are "{source_id}_{index}" (see process_content), so this is a direct ID
+    lookup with no query embedding.
+    
+    Args:
+        vector_store: A Pinecone vector store instance
+        source_id: The source ID to check for
+        
+    Returns:
+        int: The stored chunk_total for the source, or 0 if it isn't stored
+    """
+    first_chunk_id = f"{source_id}_0"
+    response = vector_store._index.fetch(ids=[first_chunk_id], namespace=vector_store._namespace)
+    vector = response.vectors.get(first_chunk_id)
+    if vector is None:
+        return 0
+    return int((vector.metadata or {}).get("chunk_total", 1))
+
 def check_document_exists(vector_store, source_id):
     """
     Check if documents with the given source_id already exist in the vector store.
@@ -22,20 +42,44 @@ def check_document_exists(vector_store, source_id):
         return False
     
     try:
-        filter_query = {"source_id": source_id}
-        # Try to get one document matching the filter
-        retriever = vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"filter": filter_query, "k": 1}
-        )
-        # Use a generic query - we only care about the filter
-        docs = retriever.invoke("test")
-        # Return True if any docs were found
-        return len(docs) > 0
+        return get_source_chunk_count(vector_store, source_id) > 0
     except Exception as e:
         logger.error(f"Error checking existing documents in Pinecone: {e}")
         return False
 
+# text-embedding-3-large can return shortened (Matryoshka) vectors; the Pinecone index
+# dimension must match. None keeps the model's full 3072 dimensions
+EMBEDDING_DIMENSIONS = int(os.environ["EMBEDDING_DIMENSIONS"]) if os.environ.get("EMBEDDING_DIMENSIONS") else None
+
+UPSERT_BATCH_SIZE = 96
+UPSERT_CONCURRENCY = 8
+
+async def add_chunks_to_vector_store_async(vector_store, chunks, chunk_ids,
+                                           batch_size=UPSERT_BATCH_SIZE, concurrency=UPSERT_CONCURRENCY):
+    """
+    Embed and upsert chunks in batches, several batches in flight at once.
+    
+    Args:
+        vector_store: A Pinecone vector store instance
+        chunks: List of document chunks to add
+        chunk_ids: List of IDs corresponding to the chunks
+        batch_size: Chunks per embedding/upsert request
+        concurrency: Maximum number of batches in flight
+        
+    Raises:
+        Exception: The first batch failure, so callers can report it
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _add_batch(start):
+        async with semaphore:
+            await vector_store.aadd_documents(
+                documents=chunks[start:start + batch_size],
+                ids=chunk_ids[start:start + batch_size]
+            )
+
+    await asyncio.gather(*(_add_batch(start) for start in range(0, len(chunks), batch_size)))
+
 def add_chunks_to_vector_store(vector_store, chunks, chunk_ids):
     """
     Add document chunks to the vector store.
@@ -59,8 +103,8 @@ def add_chunks_to_vector_store(vector_store, chunks, chunk_ids):
         source_info = chunks[0].metadata.get('source_id', 'N/A') if chunks else 'N/A'
         logger.info(f"Adding/updating {len(chunks)} chunks in Pinecone for source ID associated with first chunk: {source_info}")
         
-        # Add the documents to the vector store
-        vector_store.add_documents(documents=chunks, ids=chunk_ids)
+        # Embed and upsert the documents in concurrent batches
+        asyncio.run(add_chunks_to_vector_store_async(vector_store, chunks, chunk_ids))
         logger.info("Successfully added/updated chunks in Pinecone.")
         return True
     except Exception as e:
@@ -93,8 +137,13 @@ def get_pinecone_vector_store():
         return None
 
     try:
-        # Initialize OpenAI Embeddings - 3072 for text-embedding-3-large
-        embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+        # Only this constructor needs the client libraries; the other helpers work on
+        # an already-built store
+        from langchain_openai import OpenAIEmbeddings
+        from langchain_pinecone import Pinecone
+
+        # Initialize OpenAI Embeddings - 3072 for text-embedding-3-large unless shortened
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-large", dimensions=EMBEDDING_DIMENSIONS)
         
         logger.info(f"Initializing Pinecone connection for index: {index_name}")
         # Connect to existing index for retrieval/adding
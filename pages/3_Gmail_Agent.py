@@ -2,23 +2,35 @@ import streamlit as st
 import os
 import time
 import base64
+import hashlib
 import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 from core.agents.gmail_logic import (
     gmail_authenticate,
     get_gmail_service,
+    reset_gmail_service,
     save_credentials,
     get_emails,
-    classify_email,
-    generate_reply,
+    get_history_id,
+    mailbox_changed_since,
+    prefetch_email_details,
+    EMAIL_PREFETCH_BODIES,
+    analyze_email,
+    generate_reply_stream,
     send_email,
-    summarize_email,
+    batch_classify_and_summarize,
     modify_email_labels,
     TOKEN_FILE
 )
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # App configuration
 st.set_page_config(
     page_title="Gmail Response Assistant",
@@ -26,6 +38,213 @@ st.set_page_config(
     layout="wide"
 )
 
+class _LLMCallFailed(Exception):
+    """Raised from the cached wrappers so st.cache_data doesn't keep error results"""
+
+
+# One model call yields both the category and the summary. Keyed on the message ID as
+# well as the content, so identical bodies from different accounts don't share entries.
+# Survives reruns, not process restarts.
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def _analyze(email_id, body, subject):
+    analysis = analyze_email(body, subject)
+    if analysis['category'].startswith("Error:") or analysis['summary'].startswith("Error:"):
+        raise _LLMCallFailed(analysis)
+    return analysis
+
+
+def _ensure_analysis(selected_email):
+    """Fills in '_category' and '_summary' on the email from the cached joint analysis"""
+    try:
+        analysis = _analyze(selected_email['id'], selected_email['body'], selected_email['subject'])
+    except _LLMCallFailed as e:
+        analysis = e.args[0]
+    selected_email['_category'] = analysis['category']
+    selected_email['_summary'] = analysis['summary']
+
+
+# Replies previously generated for the selected email, kept for instant swapping
+REPLY_VARIANTS_KEPT = 4
+
+
+def _short_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+# Replies are streamed, which st.cache_data can't wrap, so finished replies go into a
+# process-wide LRU keyed on the message, reply settings and hashes of body and context
+REPLY_CACHE_ENTRIES = 128
+
+
+@st.cache_resource
+def _reply_cache():
+    return OrderedDict(), threading.Lock()
+
+
+def _get_cached_reply(key):
+    cache, lock = _reply_cache()
+    with lock:
+        reply = cache.get(key)
+        if reply is not None:
+            cache.move_to_end(key)
+        return reply
+
+
+def _store_reply(key, reply):
+    cache, lock = _reply_cache()
+    with lock:
+        cache[key] = reply
+        cache.move_to_end(key)
+        if len(cache) > REPLY_CACHE_ENTRIES:
+            cache.popitem(last=False)
+
+
+@st.cache_resource
+def _background_executor():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="gmail-page")
+
+
+def _prepare_emails(futures):
+    """Waits for the prefetched details, then classifies and summarizes all of them"""
+    details = []
+    for email_id, future in futures.items():
+        try:
+            email_details = future.result()
+        except Exception as e:
+            logger.warning(f"Skipping email {email_id} in background preparation: {e}")
+            continue
+        if email_details:
+            details.append(email_details)
+    batch_classify_and_summarize(details)
+
+
+# Scope reruns from the analysis buttons and reply widgets to their own panel instead
+# of the whole page (st.fragment on Streamlit >= 1.37, experimental before that)
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+
+@_fragment
+def _analysis_panel(selected_email):
+    # Email analysis actions
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("Classify Email"):
+            category = selected_email.get('_category')
+            if category is None or category.startswith("Error:"):
+                with st.spinner("Classifying..."):
+                    _ensure_analysis(selected_email)
+                category = selected_email['_category']
+            st.info(f"Email classified as: **{category}**")
+
+    with col2:
+         if st.button("Summarize Email"):
+            summary = selected_email.get('_summary')
+            if summary is None or summary.startswith("Error:"):
+                with st.spinner("Generating summary..."):
+                    _ensure_analysis(selected_email)
+                summary = selected_email['_summary']
+            st.session_state['email_summary'] = summary
+
+    # Display summary if available
+    if st.session_state.get('email_summary'):
+        st.subheader("Email Summary")
+        st.markdown(st.session_state['email_summary'])
+
+
+@_fragment
+def _reply_panel(selected_email, service):
+    st.divider()
+    st.subheader("Generate Reply")
+
+    # Reply configuration options
+    reply_col1, reply_col2, reply_col3 = st.columns(3)
+    with reply_col1:
+        tone = st.selectbox("Tone", ["Friendly", "Formal", "Direct", "Empathetic"], index=0)
+    with reply_col2:
+        style = st.selectbox("Style", ["Concise", "Detailed", "Professional", "Casual"], index=0)
+    with reply_col3:
+        length = st.selectbox("Length", ["Brief", "Standard", "Comprehensive"], index=1)
+
+    # Context for reply generation
+    user_context_input = st.text_area(
+        "Optional Context for Reply:", 
+        placeholder="e.g., I had a fever; Please reschedule the meeting; Ask for clarification on point 3.",
+        help="Provide brief context, keywords, or sentences to guide the reply generation. Leave blank if not needed."
+    )
+
+    if st.button("Generate Draft Reply"):
+        variants = st.session_state.setdefault('reply_variants', OrderedDict())
+        reply_key = (selected_email['id'], _short_hash(selected_email['body']), tone, style, length,
+                     _short_hash(user_context_input))
+        generated_reply = variants.get(reply_key) or _get_cached_reply(reply_key)
+        if generated_reply is None:
+            # The draft currently shown for this email (reset when another is selected) is
+            # a close prediction for a redraft in another tone/length
+            previous_draft = st.session_state.get('generated_reply')
+            if not previous_draft or "Error:" in previous_draft:
+                previous_draft = None
+            # Render tokens as they arrive, then hand the full reply to the
+            # editable text area below
+            placeholder = st.empty()
+            generated_reply = placeholder.write_stream(generate_reply_stream(
+                selected_email['body'],
+                selected_email['subject'],
+                selected_email['from'],
+                tone,
+                style,
+                length,
+                user_context=user_context_input,
+                previous_draft=previous_draft
+            ))
+            placeholder.empty()
+            if "Error:" not in generated_reply:
+                _store_reply(reply_key, generated_reply)
+        if "Error:" not in generated_reply:
+            variants[reply_key] = generated_reply
+            variants.move_to_end(reply_key)
+            if len(variants) > REPLY_VARIANTS_KEPT:
+                variants.popitem(last=False)
+        st.session_state['generated_reply'] = generated_reply
+
+    # Edit and send reply
+    if 'generated_reply' in st.session_state and st.session_state['generated_reply']:
+        edited_reply = st.text_area("Edit Reply:", value=st.session_state['generated_reply'], height=250)
+
+        if st.button("Send Reply"):
+            if service:
+                reply_subject = selected_email['subject']
+                if not reply_subject.lower().startswith("re:"):
+                    reply_subject = "Re: " + reply_subject
+
+                send_status = send_email(
+                    service, 
+                    selected_email['from'],
+                    reply_subject,
+                    edited_reply,
+                    thread_id=selected_email['thread_id'],
+                    original_message_id=selected_email['id']
+                )
+
+                if send_status:
+                    st.success(f"Reply sent successfully to {selected_email['from']}!")
+                    modify_success = modify_email_labels(service, selected_email['id'], labels_to_remove=['UNREAD'])
+                    if modify_success:
+                        st.info("Marked email as read.")
+                    else:
+                        st.warning(f"Could not mark email as read.")
+
+                    st.session_state['generated_reply'] = ""
+                    st.session_state['email_summary'] = ""
+                    st.session_state['selected_email_id'] = None
+                    st.session_state['emails'] = None
+                    st.session_state['email_futures'] = {}
+                    st.rerun()
+                else:
+                    st.error("Failed to send the reply.")
+            else:
+                st.error("Authentication error. Cannot send email.")
+
+
 st.title("📧 Gmail Response Assistant")
 st.write("Automate email responses with customized AI-generated replies")
 
@@ -41,7 +260,7 @@ with st.sidebar:
         if uploaded_file is not None:
             if save_credentials(uploaded_file):
                 st.success("Credentials file uploaded successfully!")
-                st.cache_resource.clear()
+                reset_gmail_service()
                 st.rerun()
             else:
                 st.error("Failed to save credentials file.")
@@ -56,14 +275,16 @@ with st.sidebar:
             if os.path.exists(TOKEN_FILE):
                 try:
                     os.remove(TOKEN_FILE)
-                    st.cache_resource.clear()
+                    reset_gmail_service()
+                    _reply_cache.clear()
                     st.success("Logged out successfully!")
                     st.rerun()
                 except OSError as e:
                     st.error(f"Error removing token file: {e}")
             else:
                  st.info("Already logged out (token file not found).")
-                 st.cache_resource.clear()
+                 reset_gmail_service()
+                 _reply_cache.clear()
                  st.rerun()
     else:
         st.warning("⚠️ Not connected to Gmail")
@@ -71,7 +292,7 @@ with st.sidebar:
         
         if st.button("Connect to Gmail"):
             with st.spinner("Attempting to authenticate..."):
-                st.cache_resource.clear()
+                reset_gmail_service()
                 new_service = get_gmail_service()
                 if new_service:
                     st.success("Authentication successful!")
@@ -89,22 +310,50 @@ with st.sidebar:
     max_results = st.slider("Max Emails to Load", min_value=1, max_value=50, value=10)
     
     if st.button("Fetch Emails"):
-        if service:
+        fetch_params = (email_query, max_results)
+        unchanged = False
+        if service and st.session_state.get('emails') is not None and st.session_state.get('history_id') \
+                and st.session_state.get('fetch_params') == fetch_params:
+            # Same search as last time: one history lookup tells whether anything in the
+            # mailbox changed since, in which case the current list is still accurate
+            changed, latest_history_id = mailbox_changed_since(service, st.session_state['history_id'])
+            if changed is False:
+                st.session_state['history_id'] = latest_history_id
+                unchanged = True
+        if unchanged:
+            st.info("No new changes in the mailbox since the last fetch.")
+        elif service:
             with st.spinner("Fetching emails..."):
+                # Read before listing so changes made during the fetch show up next time
+                st.session_state['history_id'] = get_history_id(service)
                 st.session_state['emails'] = get_emails(service, max_results=max_results, query=email_query or None)
+            st.session_state['fetch_params'] = fetch_params
+            # Built once per fetch rather than on every rerun
+            st.session_state['email_options'] = {
+                f"{email['subject']} (From: {email['from_name'] or email['from_email']})": email['id']
+                for email in st.session_state['emails']
+            }
+            # The list itself is metadata only. With GMAIL_PREFETCH_BODIES on, bodies download
+            # in the background while the user picks an email and the whole list is then
+            # classified and summarized; otherwise only the selected body is fetched.
+            futures = {}
+            if EMAIL_PREFETCH_BODIES:
+                futures = prefetch_email_details(service, [email['id'] for email in st.session_state['emails']])
+                if futures:
+                    _background_executor().submit(_prepare_emails, futures)
+            st.session_state['email_futures'] = futures
             st.session_state['selected_email_id'] = None
             st.session_state['generated_reply'] = ""
             st.session_state['email_summary'] = ""
+            st.session_state['reply_variants'] = OrderedDict()
             st.rerun()
         else:
             st.warning("Please connect to Gmail first.")
 
 # Email listing and processing
 if 'emails' in st.session_state and st.session_state['emails']:
-    emails = st.session_state['emails']
-    
     # Email selection sidebar
-    email_options = {f"{email['subject']} (From: {email['from']})": email['id'] for email in emails}
+    email_options = st.session_state.get('email_options', {})
     selected_email_key = st.sidebar.selectbox("Select Email to Process", options=list(email_options.keys()))
     
     if selected_email_key:
@@ -113,11 +362,22 @@ if 'emails' in st.session_state and st.session_state['emails']:
             st.session_state['selected_email_id'] = selected_id_candidate
             st.session_state['generated_reply'] = ""
             st.session_state['email_summary'] = ""
+            st.session_state['reply_variants'] = OrderedDict()
 
     # Email details and actions
     selected_id = st.session_state.get('selected_email_id')
     if selected_id:
-        selected_email = next((email for email in emails if email['id'] == selected_id), None)
+        # Fetched bodies stay in session_state['email_futures'] for the rest of the session
+        future = st.session_state.get('email_futures', {}).get(selected_id)
+        if future is None:
+            future = prefetch_email_details(service, [selected_id])[selected_id]
+            st.session_state.setdefault('email_futures', {})[selected_id] = future
+        try:
+            with st.spinner("Loading email..."):
+                selected_email = future.result()
+        except Exception as e:
+            st.error(f"Could not load email: {e}")
+            selected_email = None
         
         if selected_email:
             st.subheader(f"Subject: {selected_email['subject']}")
@@ -126,94 +386,9 @@ if 'emails' in st.session_state and st.session_state['emails']:
             with st.expander("View Full Email Body", expanded=False):
                 st.text(selected_email['body'])
                 
-            # Email analysis actions
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                if st.button("Classify Email"):
-                    with st.spinner("Classifying..."):
-                        category = classify_email(selected_email['body'], selected_email['subject'])
-                    st.info(f"Email classified as: **{category}**")
-            
-            with col2:
-                 if st.button("Summarize Email"):
-                    with st.spinner("Generating summary..."):
-                        summary = summarize_email(selected_email['body'])
-                    st.session_state['email_summary'] = summary
-
-            # Display summary if available
-            if st.session_state.get('email_summary'):
-                st.subheader("Email Summary")
-                st.markdown(st.session_state['email_summary'])
-                
-            st.divider()
-            st.subheader("Generate Reply")
-            
-            # Reply configuration options
-            reply_col1, reply_col2, reply_col3 = st.columns(3)
-            with reply_col1:
-                tone = st.selectbox("Tone", ["Friendly", "Formal", "Direct", "Empathetic"], index=0)
-            with reply_col2:
-                style = st.selectbox("Style", ["Concise", "Detailed", "Professional", "Casual"], index=0)
-            with reply_col3:
-                length = st.selectbox("Length", ["Brief", "Standard", "Comprehensive"], index=1)
-
-            # Context for reply generation
-            user_context_input = st.text_area(
-                "Optional Context for Reply:", 
-                placeholder="e.g., I had a fever; Please reschedule the meeting; Ask for clarification on point 3.",
-                help="Provide brief context, keywords, or sentences to guide the reply generation. Leave blank if not needed."
-            )
-            
-            if st.button("Generate Draft Reply"):
-                with st.spinner("Generating draft reply..."):
-                    generated_reply = generate_reply(
-                        selected_email['body'],
-                        selected_email['subject'],
-                        selected_email['from'],
-                        tone, 
-                        style, 
-                        length,
-                        user_context=user_context_input
-                    )
-                st.session_state['generated_reply'] = generated_reply
-            
-            # Edit and send reply
-            if 'generated_reply' in st.session_state and st.session_state['generated_reply']:
-                edited_reply = st.text_area("Edit Reply:", value=st.session_state['generated_reply'], height=250)
-                
-                if st.button("Send Reply"):
-                    if service:
-                        reply_subject = selected_email['subject']
-                        if not reply_subject.lower().startswith("re:"):
-                            reply_subject = "Re: " + reply_subject
-                        
-                        send_status = send_email(
-                            service, 
-                            selected_email['from'],
-                            reply_subject,
-                            edited_reply,
-                            thread_id=selected_email['thread_id'],
-                            original_message_id=selected_email['id']
-                        )
-                        
-                        if send_status:
-                            st.success(f"Reply sent successfully to {selected_email['from']}!")
-                            modify_success = modify_email_labels(service, selected_id, labels_to_remove=['UNREAD'])
-                            if modify_success:
-                                st.info("Marked email as read.")
-                            else:
-                                st.warning(f"Could not mark email as read.")
-                                
-                            st.session_state['generated_reply'] = ""
-                            st.session_state['email_summary'] = ""
-                            st.session_state['selected_email_id'] = None
-                            st.session_state['emails'] = None
-                            st.rerun()
-                        else:
-                            st.error("Failed to send the reply.")
-                    else:
-                        st.error("Authentication error. Cannot send email.")
-            
+            _analysis_panel(selected_email)
+            _reply_panel(selected_email, service)
+
 # No emails message
 elif 'emails' in st.session_state and not st.session_state['emails']:
     st.info("No emails found matching your query or no unread emails.")